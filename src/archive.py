@@ -0,0 +1,271 @@
+"""
+Cold archive of old appointments in compressed columnar segment files.
+
+Months that ended more than ARCHIVE_AFTER_DAYS ago are moved out of
+Postgres into ARCHIVE_DIR: one segment file per month, then the month
+partition is detached and dropped (stray rows are deleted from
+appointments_default). The hot table keeps only recent months, so its
+indexes stay small.
+
+A segment stores each column separately, zlib-compressed, with rows sorted
+by date. segments.json records the min/max date of every segment, so a
+range read opens only the overlapping segments and, inside a segment,
+decodes the other columns only for the matching date slice.
+
+Appointments of soft-deleted doctors/users are not archived; the
+archived month is removed from the table together with them.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import struct
+import zlib
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from pathlib import Path
+from uuid import UUID
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import database
+import metrics
+from config import settings
+from database import AppointmentORM
+from partitions import (
+    DEFAULT_PARTITION,
+    PARENT,
+    add_months,
+    month_start,
+    partition_name,
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"APSEG1\n"
+INDEX_FILE = "segments.json"
+# Порядок колонок в сегменте; UUID хранятся по 16 байт, NULL — нулевой UUID
+COLUMNS = ("date", "id", "doctor_id", "user_id", "room_id")
+_NIL = UUID(int=0)
+# Один воркер архивирует, остальные пропускают запуск
+LOCK_ID = 0x61707061
+
+rows_total = metrics.counter("archive_rows_total", "Appointments moved to the cold archive")
+segments_read_total = metrics.counter("archive_segments_read_total", "Archive segments opened by range reads")
+
+
+def _encode_column(name: str, values: list) -> bytes:
+    if name == "date":
+        raw = struct.pack(f"<{len(values)}i", *(value.toordinal() for value in values))
+    else:
+        raw = b"".join((value or _NIL).bytes for value in values)
+    return zlib.compress(raw, settings.ARCHIVE_COMPRESSION_LEVEL)
+
+
+def _decode_column(name: str, block: bytes) -> list:
+    raw = zlib.decompress(block)
+    if name == "date":
+        return [date.fromordinal(value) for value in struct.unpack(f"<{len(raw) // 4}i", raw)]
+    values = [UUID(bytes=raw[offset:offset + 16]) for offset in range(0, len(raw), 16)]
+    return [None if value == _NIL else value for value in values]
+
+
+def encode_segment(rows: list[dict]) -> bytes:
+    """Serialize rows (dicts with COLUMNS keys) into a segment; rows are sorted by date first."""
+    rows = sorted(rows, key=lambda row: (row["date"], str(row["doctor_id"]), str(row["id"])))
+    blocks = [_encode_column(name, [row[name] for row in rows]) for name in COLUMNS]
+    header = json.dumps({
+        "rows": len(rows),
+        "min_date": rows[0]["date"].isoformat() if rows else None,
+        "max_date": rows[-1]["date"].isoformat() if rows else None,
+        "columns": [[name, len(block)] for name, block in zip(COLUMNS, blocks, strict=True)],
+    }).encode()
+    return MAGIC + struct.pack("<I", len(header)) + header + b"".join(blocks)
+
+
+def decode_segment(data: bytes, date_from: date | None = None, date_to: date | None = None) -> list[dict]:
+    """Rows of a segment with date_from <= date <= date_to (all rows without bounds)."""
+    if not data.startswith(MAGIC):
+        raise ValueError("Not an appointment archive segment")
+    offset = len(MAGIC)
+    (header_size,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + header_size])
+    offset += header_size
+    blocks = {}
+    for name, size in header["columns"]:
+        blocks[name] = data[offset:offset + size]
+        offset += size
+
+    # Сначала только даты: строки отсортированы, нужный срез находится бинарным поиском
+    dates = _decode_column("date", blocks["date"])
+    start = bisect_left(dates, date_from) if date_from else 0
+    stop = bisect_right(dates, date_to) if date_to else len(dates)
+    if start >= stop:
+        return []
+    columns = {"date": dates[start:stop]}
+    for name in COLUMNS[1:]:
+        columns[name] = _decode_column(name, blocks[name])[start:stop]
+    return [{name: columns[name][i] for name in COLUMNS} for i in range(stop - start)]
+
+
+class ArchiveStore:
+    """Segment files plus the min/max date index in one directory."""
+
+    def __init__(self, directory: str | Path | None = None):
+        self._directory = Path(directory) if directory else None
+        self._index: list[dict] = []
+        self._index_key: tuple[Path, int] | None = None
+
+    @property
+    def directory(self) -> Path:
+        return self._directory or Path(settings.ARCHIVE_DIR)
+
+    def segment_name(self, month: date) -> str:
+        return f"{partition_name(month)}.seg"
+
+    def index(self) -> list[dict]:
+        """Cached segments.json; re-read when another worker has rewritten it."""
+        path = self.directory / INDEX_FILE
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if (path, mtime) != self._index_key:
+            self._index = json.loads(path.read_text())["segments"]
+            self._index_key = (path, mtime)
+        return self._index
+
+    def segments_for(self, date_from: date, date_to: date) -> list[dict]:
+        return [
+            segment for segment in self.index()
+            if segment["min_date"] <= date_to.isoformat() and segment["max_date"] >= date_from.isoformat()
+        ]
+
+    def read(self, date_from: date, date_to: date) -> list[dict]:
+        """Archived appointments with date_from <= date <= date_to, ordered by date."""
+        rows = []
+        for segment in self.segments_for(date_from, date_to):
+            segments_read_total.inc()
+            rows.extend(decode_segment((self.directory / segment["file"]).read_bytes(), date_from, date_to))
+        rows.sort(key=lambda row: row["date"])
+        return rows
+
+    def write_month(self, month: date, rows: list[dict]) -> dict | None:
+        """Write (or extend) the segment of `month` and update the index; returns the index entry."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = self.segment_name(month)
+        path = self.directory / name
+        if path.exists():
+            # Повторный запуск после сбоя: строки уже могли попасть в сегмент
+            merged = {row["id"]: row for row in decode_segment(path.read_bytes())}
+            merged.update((row["id"], row) for row in rows)
+            rows = list(merged.values())
+        if not rows:
+            return None
+        _write_atomic(path, encode_segment(rows))
+
+        entry = {
+            "file": name,
+            "min_date": min(row["date"] for row in rows).isoformat(),
+            "max_date": max(row["date"] for row in rows).isoformat(),
+            "rows": len(rows),
+        }
+        segments = [segment for segment in self.index() if segment["file"] != name] + [entry]
+        segments.sort(key=lambda segment: segment["min_date"])
+        _write_atomic(self.directory / INDEX_FILE, json.dumps({"segments": segments}, indent=1).encode())
+        return entry
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+store = ArchiveStore()
+
+
+async def archive_month(month: date) -> int:
+    """Move one month of appointments into the archive; returns the number of rows archived."""
+    lower, upper = month, add_months(month, 1)
+    name = partition_name(month)
+    async with database.async_session() as db:
+        # Запись в архивируемый месяц блокируется до конца транзакции
+        exists = (await db.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar() is not None
+        tables = [DEFAULT_PARTITION] + ([name] if exists else [])
+        await db.execute(text(f"LOCK TABLE {', '.join(tables)} IN EXCLUSIVE MODE"))
+        result = await db.execute(
+            select(AppointmentORM.id, AppointmentORM.date, AppointmentORM.doctor_id,
+                   AppointmentORM.user_id, AppointmentORM.room_id)
+            .where(AppointmentORM.date >= lower, AppointmentORM.date < upper)
+        )
+        rows = [row._asdict() for row in result]
+        # Сегмент пишется до commit: при сбое строки останутся в таблице и попадут в сегмент повторно
+        await asyncio.to_thread(store.write_month, month, rows)
+
+        bounds = {"lower": lower, "upper": upper}
+        await db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper"), bounds)
+        if exists:
+            await db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            await db.execute(text(f"DROP TABLE {name}"))
+        await db.commit()
+    rows_total.inc(amount=len(rows))
+    return len(rows)
+
+
+async def archive_old(engine: AsyncEngine, today: date | None = None) -> list[str]:
+    """Archive every month that ended more than ARCHIVE_AFTER_DAYS before `today`."""
+    cutoff = (today or date.today()) - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    archived = []
+    async with engine.connect() as conn:
+        locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": LOCK_ID})).scalar()
+        await conn.commit()
+        if not locked:
+            return archived
+        try:
+            async with database.async_session() as db:
+                oldest = (await db.execute(text(f"SELECT min(date) FROM {PARENT}"))).scalar()
+            month = month_start(oldest) if oldest else None
+            while month is not None and add_months(month, 1) <= cutoff:
+                count = await archive_month(month)
+                archived.append(partition_name(month))
+                logger.info("Archived %d appointments of %s", count, month.strftime("%Y-%m"))
+                month = add_months(month, 1)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": LOCK_ID})
+            await conn.commit()
+    return archived
+
+
+class ArchiveWorker:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self, engine: AsyncEngine) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(engine))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def run(self, engine: AsyncEngine) -> None:
+        while True:
+            try:
+                await archive_old(engine)
+            except Exception:
+                logger.exception("Appointment archiving failed")
+            await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
+
+worker = ArchiveWorker()
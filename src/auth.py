@@ -1,42 +1,57 @@
-import os
 from datetime import datetime, timedelta, timezone
+from functools import cache
 from typing import Annotated, Any, Union
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from config import Settings
+from uuid import UUID
 
 import jwt
-from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError
-from passlib.context import CryptContext
+from pydantic import ValidationError
+from sqlalchemy import bindparam, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import UserORM, get_session
+import jwks
+import tracing
+from config import settings
+from database import UserORM, get_session, reusable
 from model import CurrentUser
 
-load_dotenv()
 
 class AuthConfig:
-    SECRET_KEY = os.getenv("SECRET_KEY")
+    SECRET_KEY = settings.SECRET_KEY
     if not SECRET_KEY:
         raise ValueError("SECRET_KEY not set in environment variables")
 
-    ALGORITHM = os.getenv("ALGORITHM", "HS256")
-    ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    ALGORITHM = settings.ALGORITHM
+    ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Claims, из которых строится пользователь без запроса к БД (AUTH_CLAIMS_ONLY)
+CLAIMS_USER_FIELDS = frozenset({"sub", "role", "email", "name", "disabled"})
+
+# Собран один раз, как горячие поиски в crud (см. database.reusable)
+_USER_BY_ID = reusable(select(UserORM).where(UserORM.id == bindparam("user_id")))
+
+
+@cache
+def pwd_context():
+    """Lazily built bcrypt context; passlib is only imported on first use."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    with tracing.span("bcrypt.verify"):
+        return pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password) -> str:
     """Generate a password hash."""
-    return pwd_context.hash(password)
+    with tracing.span("bcrypt.hash"):
+        return pwd_context().hash(password)
 
 
 def create_access_token(
@@ -70,67 +85,132 @@ def create_access_token(
     )
     payload["exp"] = expire
 
-    return jwt.encode(
-        payload,
-        AuthConfig.SECRET_KEY,
-        algorithm=AuthConfig.ALGORITHM
-    )
+    return encode_token(payload)
 
 
-async def get_current_user(
-        token: str = Depends(oauth2_scheme),
-        db: AsyncSession = Depends(get_session)
-) -> CurrentUser:
-    """Получает пользователя из JWT токена с проверкой структуры"""
-    credentials_exception = HTTPException(
+def encode_token(payload: dict) -> str:
+    """Подписывает токен активным ключом (с заголовком kid) или, без ключей, SECRET_KEY"""
+    key = jwks.keyring().active
+    if key is None:
+        return jwt.encode(payload, AuthConfig.SECRET_KEY, algorithm=AuthConfig.ALGORITHM)
+    return jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
+def decode_token(token: str) -> dict:
+    """
+    Проверяет подпись и срок действия токена.
+
+    Токен с kid проверяется публичным ключом из jwks.keyring() с алгоритмом этого
+    ключа; токен без kid — SECRET_KEY, пока это разрешено JWT_ACCEPT_SHARED_SECRET.
+    """
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is None:
+        if jwks.keyring().active is not None and not settings.JWT_ACCEPT_SHARED_SECRET:
+            raise jwt.InvalidTokenError("Token is not signed with a published key")
+        return jwt.decode(token, AuthConfig.SECRET_KEY, algorithms=[AuthConfig.ALGORITHM])
+    key = jwks.keyring().get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown signing key {kid!r}")
+    return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+async def get_token_claims(token: Annotated[str, Depends(oauth2_scheme)]) -> dict:
+    """Проверяет подпись и срок действия JWT и возвращает его claims, без обращения к БД"""
     try:
-        payload = jwt.decode(token, AuthConfig.SECRET_KEY, algorithms=[AuthConfig.ALGORITHM])
-
-        # Обязательная проверка наличия sub
-        user_id = payload.get("sub")
-        if not user_id:
-            raise credentials_exception
-
-        # Ищем пользователя по ID
-        user = await db.get(UserORM, user_id)
-        if not user:
-            raise credentials_exception
-
-        # Проверяем роль (если есть в токене)
-        if "role" in payload and payload["role"] != user.role:
-            raise credentials_exception
-
-        return CurrentUser(
-            id=user.id,
-            email=user.email,
-            name=user.name,
-            role=user.role,
-            disabled=user.disabled,
-            access_token=token,
-            token_type="bearer"
-        )
-
-    except JWTError:
-        raise credentials_exception
-    except AttributeError:
-        # Отдельная обработка для AttributeError
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid user attributes",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) from None
+        with tracing.span("auth.jwt_decode"):
+            payload = decode_token(token)
+        # Обязательная проверка sub: это id пользователя
+        UUID(payload["sub"])
+    except (jwt.PyJWTError, KeyError, TypeError, ValueError, AttributeError):
+        raise _credentials_exception() from None
+    return payload
+
+
+async def get_verified_user(
+        token: Annotated[str, Depends(oauth2_scheme)],
+        claims: Annotated[dict, Depends(get_token_claims)],
+        db: Annotated[AsyncSession, Depends(get_session)],
+) -> CurrentUser:
+    """Пользователь из БД: учетная запись существует (не удалена) и роль совпадает с токеном"""
+    with tracing.span("auth.user_lookup"):
+        result = await db.execute(_USER_BY_ID, {"user_id": UUID(claims["sub"])})
+        user = result.scalars().first()
+    if not user:
+        raise _credentials_exception()
+
+    # Проверяем роль (если есть в токене)
+    if "role" in claims and claims["role"] != user.role:
+        raise _credentials_exception()
+
+    return CurrentUser(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        role=user.role,
+        disabled=user.disabled,
+        access_token=token,
+        token_type="bearer"
+    )
+
+
+async def get_current_user(
+        token: Annotated[str, Depends(oauth2_scheme)],
+        claims: Annotated[dict, Depends(get_token_claims)],
+        db: Annotated[AsyncSession, Depends(get_session)],
+) -> CurrentUser:
+    """
+    Текущий пользователь.
+
+    При AUTH_CLAIMS_ONLY берется из подписанных claims токена без запроса к БД:
+    роль, данные и disabled считаются верными до истечения токена. Токены без этих claims
+    (выданные до включения режима) проверяются по БД, как в get_verified_user.
+    """
+    if settings.AUTH_CLAIMS_ONLY and claims.keys() >= CLAIMS_USER_FIELDS:
+        try:
+            return CurrentUser(
+                id=claims["sub"],
+                email=claims["email"],
+                name=claims["name"],
+                role=claims["role"],
+                disabled=claims["disabled"],
+                access_token=token,
+                token_type="bearer"
+            )
+        except ValidationError:
+            raise _credentials_exception() from None
+    return await get_verified_user(token, claims, db)
 
 
 class RoleChecker:
-    def __init__(self, allowed_roles: list[str]):
-        self.allowed_roles = allowed_roles
+    """
+    Проверка роли текущего пользователя.
 
-    async def __call__(self, current_user: Annotated[dict, Depends(get_current_user)]):
+    verified=True — роль и учетная запись всегда сверяются с БД, даже при
+    AUTH_CLAIMS_ONLY (для чувствительных операций).
+    """
+
+    def __init__(self, allowed_roles: list[str], verified: bool = False):
+        self.allowed_roles = allowed_roles
+        self.verified = verified
+
+    async def __call__(
+            self,
+            token: Annotated[str, Depends(oauth2_scheme)],
+            claims: Annotated[dict, Depends(get_token_claims)],
+            db: Annotated[AsyncSession, Depends(get_session)],
+    ):
+        if self.verified:
+            current_user = await get_verified_user(token, claims, db)
+        else:
+            current_user = await get_current_user(token, claims, db)
         if current_user.role not in self.allowed_roles:
             raise HTTPException(
                 status_code=403,
@@ -152,15 +232,17 @@ def verify_reset_token(token: str) -> str:
     try:
         payload = jwt.decode(token, AuthConfig.SECRET_KEY, algorithms=["HS256"])
         return payload["sub"]
-    except JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(status_code=400, detail="Invalid token")
 
 
 async def send_reset_email(email: str, token: str):
+    from fastapi_mail import FastMail, MessageSchema
+
     reset_link = f"https://yourapp.com/reset-password?token={token}"
     message = MessageSchema(
         subject="Password Reset",
         recipients=[email],
         body=f"Click to reset: {reset_link}",
     )
-    await FastMail(Settings.email_conf).send_message(message)
\ No newline at end of file
+    await FastMail(settings.email_conf).send_message(message)
\ No newline at end of file
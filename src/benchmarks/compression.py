@@ -0,0 +1,98 @@
+"""
+Bytes saved vs CPU time per route and codec for the compression middleware.
+
+Payloads are synthetic but shaped like real responses of the list routes,
+so the numbers can be reproduced without a database:
+
+    cd src && python -m benchmarks.compression [--repeat N]
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from uuid import uuid4
+
+from compression import _brotli, _gzip, _zstd, brotli, zstandard
+
+SPECIALIZATIONS = ["therapist", "surgeon", "cardiologist", "dentist", "neurologist"]
+CATEGORIES = ["first", "second", "highest", "no_category"]
+
+
+def _doctors(n: int) -> list[dict]:
+    return [
+        {
+            "id": str(uuid4()),
+            "name": f"Name{i % 50}",
+            "surname": f"Surname{i % 70}",
+            "age": 30 + i % 35,
+            "specialization": SPECIALIZATIONS[i % len(SPECIALIZATIONS)],
+            "category": CATEGORIES[i % len(CATEGORIES)],
+        }
+        for i in range(n)
+    ]
+
+
+def _calendar(n: int) -> list[dict]:
+    rooms = [str(uuid4()) for _ in range(10)]
+    start = date(2026, 1, 1)
+    return [
+        {"date": (start + timedelta(days=i // 8)).isoformat(), "room_id": rooms[i % 10], "user_id": str(uuid4())}
+        for i in range(n)
+    ]
+
+
+def _appointments(n: int) -> dict:
+    start = date(2026, 1, 1)
+    return {
+        "items": [
+            {
+                "id": str(uuid4()),
+                "date": (start + timedelta(days=i)).isoformat(),
+                "doctor_id": str(uuid4()),
+                "room_id": str(uuid4()),
+                "user_id": str(uuid4()),
+            }
+            for i in range(n)
+        ],
+        "next_cursor": "MjAyNi0wMi0wMXw2YjQ0",
+    }
+
+
+ROUTES = {
+    "GET /doctors/{id}": lambda: _doctors(1)[0],
+    "GET /doctors/?size=50": lambda: _doctors(50),
+    "GET /doctors/?size=500": lambda: _doctors(500),
+    "GET /doctors/{id}/appointments": lambda: _calendar(300),
+    "GET /users/me/appointments": lambda: _appointments(50),
+}
+
+
+def codecs() -> dict:
+    result = {f"gzip-{level}": (lambda level=level: _gzip(level)) for level in (1, 6, 9)}
+    if brotli is not None:
+        result.update({f"br-{q}": (lambda q=q: _brotli(q)) for q in (1, 4, 11)})
+    if zstandard is not None:
+        result.update({f"zstd-{level}": (lambda level=level: _zstd(level)) for level in (1, 3, 9)})
+    return result
+
+
+def run(repeat: int) -> None:
+    print(f"{'route':<32}{'codec':<10}{'raw':>9}{'comp':>9}{'saved':>8}{'us/resp':>10}{'MB/s':>9}")
+    for route, build in ROUTES.items():
+        body = json.dumps(build()).encode()
+        for name, factory in codecs().items():
+            start = time.process_time()
+            for _ in range(repeat):
+                compressor = factory()
+                out = compressor.compress(body) + compressor.finish()
+            cpu = (time.process_time() - start) / repeat
+            saved = 1 - len(out) / len(body)
+            throughput = len(body) / cpu / 1e6 if cpu else float("inf")
+            print(f"{route:<32}{name:<10}{len(body):>9}{len(out):>9}{saved:>7.0%}{cpu * 1e6:>10.1f}{throughput:>9.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    run(parser.parse_args().repeat)
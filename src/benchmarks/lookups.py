@@ -0,0 +1,82 @@
+"""
+Per-call overhead of the lookup-by-id path: a select() built per call vs
+the statement built once (database.reusable).
+
+Without a database, it measures what every execute() pays before the
+compiled-statement cache lookup: building the statement, adding the
+soft-delete filter and computing the cache key. With --database-url, it
+times the whole lookup through an ORM session (a nonexistent id, so
+almost all the time is overhead), with and without the asyncpg
+prepared-statement cache:
+
+    cd src && python -m benchmarks.lookups [--repeat N] [--database-url URL]
+"""
+import argparse
+import asyncio
+import time
+from uuid import UUID, uuid4
+
+from sqlalchemy import select
+
+import crud
+from database import (
+    DoctorORM,
+    _with_tombstone_filter,
+    async_session,
+    dispose_engine,
+    init_engine,
+)
+
+
+def _per_call(doctor_id: UUID):
+    return select(DoctorORM).filter(DoctorORM.id == doctor_id), {}
+
+
+def _reusable(doctor_id: UUID):
+    return crud._DOCTOR_BY_ID, {"doctor_id": doctor_id}
+
+
+STYLES = {"select()": _per_call, "reusable": _reusable}
+
+
+def run_offline(repeat: int) -> None:
+    print(f"{'statement':<14}{'us/call':>10}")
+    for name, build in STYLES.items():
+        ids = [uuid4() for _ in range(repeat)]
+        _with_tombstone_filter(build(ids[0])[0])._generate_cache_key()
+        start = time.process_time()
+        for doctor_id in ids:
+            _with_tombstone_filter(build(doctor_id)[0])._generate_cache_key()
+        print(f"{name:<14}{(time.process_time() - start) / repeat * 1e6:>10.1f}")
+
+
+async def _lookup(url: str, cache_size: int, build, repeat: int) -> float:
+    init_engine(url, connect_args={"prepared_statement_cache_size": cache_size})
+    try:
+        async with async_session() as db:
+            await db.execute(*build(UUID(int=0)))
+            start = time.perf_counter()
+            for _ in range(repeat):
+                (await db.execute(*build(UUID(int=0)))).scalars().first()
+            return (time.perf_counter() - start) / repeat
+    finally:
+        await dispose_engine()
+
+
+def run_database(url: str, repeat: int) -> None:
+    print(f"{'statement':<14}{'prepared cache':>16}{'us/call':>10}")
+    for name, build in STYLES.items():
+        for cache_size in (0, 500):
+            per_call = asyncio.run(_lookup(url, cache_size, build, repeat))
+            print(f"{name:<14}{cache_size:>16}{per_call * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--database-url", help="postgresql+asyncpg:// URL of a migrated database")
+    args = parser.parse_args()
+    run_offline(args.repeat * 10)
+    if args.database_url:
+        print()
+        run_database(args.database_url, args.repeat)
@@ -0,0 +1,203 @@
+"""
+Appointment change feed: one LISTEN connection per worker fanned out to SSE clients.
+
+Changes are written to the appointment_changes table and announced with
+pg_notify in the same transaction (see crud.record_appointment_change).
+`hub` holds a single listening connection and copies every notification
+into the bounded queue of each subscriber. A client that falls too far
+behind is disconnected; it reconnects with `Last-Event-ID` (or `since=`)
+and catches up from the table, so nothing is lost.
+"""
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+import crud
+import database
+import metrics
+from config import settings
+from model import AppointmentChange
+
+logger = logging.getLogger(__name__)
+
+# Сигнал подписчику: очередь переполнена или воркер останавливается
+_CLOSED = None
+
+
+class Subscription:
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue[AppointmentChange | None] = asyncio.Queue(maxsize)
+
+    def push(self, change: AppointmentChange) -> bool:
+        try:
+            self.queue.put_nowait(change)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self) -> None:
+        # Освобождаем место под сигнал закрытия: старые события клиент дочитает из таблицы
+        while self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_CLOSED)
+
+
+class ChangeHub:
+    def __init__(self):
+        self.subscribers: set[Subscription] = set()
+        self.last_seq = 0
+        self._engine: AsyncEngine | None = None
+        self._conn: AsyncConnection | None = None
+        self._reconnect: asyncio.Task | None = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._conn is not None
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(settings.CHANGEFEED_QUEUE_SIZE)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def publish(self, change: AppointmentChange) -> None:
+        if change.seq <= self.last_seq:
+            return  # уже разослано (повтор после переподключения)
+        self.last_seq = change.seq
+        events_total.inc()
+        for subscription in list(self.subscribers):
+            if not subscription.push(change):
+                dropped_total.inc()
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    async def start(self, engine: AsyncEngine) -> None:
+        self._engine = engine
+        self._stopping = False
+        try:
+            await self._listen()
+        except Exception:
+            # Как и прогрев, не мешаем старту воркера: подключимся в фоне, клиенты догонят по since
+            logger.warning("Change feed listener failed to start, retrying in background", exc_info=True)
+            self._schedule_reconnect()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect is not None:
+            self._reconnect.cancel()
+            self._reconnect = None
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                await conn.close()
+            except Exception:
+                logger.warning("Failed to close change feed listener", exc_info=True)
+        self.close_subscribers()
+
+    def close_subscribers(self) -> None:
+        """End every open stream; clients reconnect and catch up by Last-Event-ID."""
+        for subscription in list(self.subscribers):
+            subscription.close()
+        self.subscribers.clear()
+
+    async def _listen(self) -> None:
+        conn = await self._engine.connect()
+        try:
+            driver = (await conn.get_raw_connection()).driver_connection
+            await driver.add_listener(crud.CHANGES_CHANNEL, self._on_notify)
+            driver.add_termination_listener(self._on_terminated)
+            # Догоняем то, что закоммитили до начала LISTEN (или пока соединения не было)
+            async with database.async_session() as db:
+                if self.last_seq == 0:
+                    self.last_seq = await crud.get_last_appointment_change_seq(db)
+                else:
+                    for row in await crud.get_appointment_changes(db, self.last_seq):
+                        self.publish(AppointmentChange.model_validate(row))
+        except BaseException:
+            await conn.close()
+            raise
+        self._conn = conn
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        self.publish(AppointmentChange.model_validate_json(payload))
+
+    def _on_terminated(self, connection) -> None:
+        if self._stopping:
+            return
+        logger.warning("Change feed listener connection lost, reconnecting")
+        self._conn = None
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        self._reconnect = asyncio.get_running_loop().create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        delay = 0.5
+        while not self._stopping:
+            try:
+                await self._listen()
+                return
+            except Exception:
+                logger.warning("Change feed reconnect failed, retrying in %.1fs", delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+hub = ChangeHub()
+
+events_total = metrics.counter("changefeed_events_total", "Appointment changes fanned out to subscribers")
+dropped_total = metrics.counter("changefeed_dropped_subscribers_total", "Subscribers disconnected for falling behind")
+metrics.gauge("changefeed_subscribers", "Connected change feed clients", callback=lambda: len(hub.subscribers))
+
+
+def format_event(change: AppointmentChange) -> str:
+    return f"id: {change.seq}\nevent: {change.op}\ndata: {change.model_dump_json()}\n\n"
+
+
+async def event_stream(since: int | None = None, doctor_id: UUID | None = None) -> AsyncIterator[str]:
+    """
+    SSE stream of appointment changes, optionally filtered by doctor.
+
+    With `since`, changes after that token are first replayed from the table;
+    live changes received meanwhile are buffered and de-duplicated by seq.
+    """
+    subscription = hub.subscribe()
+    try:
+        yield f"retry: {settings.CHANGEFEED_RETRY_MS}\n\n"
+        if since is None:
+            last_seq = hub.last_seq
+        else:
+            last_seq = since
+            while True:
+                async with database.async_session() as db:
+                    rows = await crud.get_appointment_changes(db, last_seq, settings.CHANGEFEED_CATCHUP_BATCH)
+                    changes = [AppointmentChange.model_validate(row) for row in rows]
+                for change in changes:
+                    last_seq = change.seq
+                    if doctor_id is None or change.doctor_id == doctor_id:
+                        yield format_event(change)
+                if len(changes) < settings.CHANGEFEED_CATCHUP_BATCH:
+                    break
+
+        while True:
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), settings.CHANGEFEED_KEEPALIVE_SECONDS)
+            except TimeoutError:
+                # Комментарий не дает прокси закрыть "молчащее" соединение
+                yield ": keepalive\n\n"
+                continue
+            if change is _CLOSED:
+                return
+            if change.seq <= last_seq:
+                continue
+            last_seq = change.seq
+            if doctor_id is None or change.doctor_id == doctor_id:
+                yield format_event(change)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,175 @@
+"""
+Response compression negotiated from Accept-Encoding: zstd, brotli and gzip.
+
+brotli and zstandard are optional: when a package is missing its codec is
+simply not offered. Small complete bodies are sent as is; streaming bodies
+are compressed chunk by chunk and flushed so clients receive data as it is
+produced.
+"""
+import zlib
+from collections.abc import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "text/",
+)
+# SSE должен доходить до клиента без буферизации в прокси и декодерах
+EXCLUDED_TYPES = ("text/event-stream",)
+
+
+class Compressor:
+    """Streaming compressor: `compress(chunk)` returns flushed output, `finish()` closes the stream."""
+
+    def __init__(self, compress: Callable[[bytes], bytes], finish: Callable[[], bytes]):
+        self.compress = compress
+        self.finish = finish
+
+
+def _gzip(level: int) -> Compressor:
+    obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip-заголовок
+    return Compressor(lambda chunk: obj.compress(chunk) + obj.flush(zlib.Z_SYNC_FLUSH), obj.flush)
+
+
+def _brotli(quality: int) -> Compressor:
+    obj = brotli.Compressor(quality=quality)
+    return Compressor(lambda chunk: obj.process(chunk) + obj.flush(), obj.finish)
+
+
+def _zstd(level: int) -> Compressor:
+    obj = zstandard.ZstdCompressor(level=level).compressobj()
+    return Compressor(lambda chunk: obj.compress(chunk) + obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), obj.flush)
+
+
+def available_codecs() -> dict[str, Callable[[], Compressor]]:
+    """Codec factories in server preference order, limited to installed packages."""
+    factories = {
+        "zstd": (zstandard, lambda: _zstd(settings.COMPRESSION_ZSTD_LEVEL)),
+        "br": (brotli, lambda: _brotli(settings.COMPRESSION_BROTLI_QUALITY)),
+        "gzip": (zlib, lambda: _gzip(settings.COMPRESSION_GZIP_LEVEL)),
+    }
+    enabled = [name.strip() for name in settings.COMPRESSION_CODECS.split(",")]
+    return {name: factories[name][1] for name in enabled if name in factories and factories[name][0] is not None}
+
+
+def negotiate(accept_encoding: str, codecs: dict) -> str | None:
+    """Pick the codec with the highest client q-value; ties go to server preference."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for name in codecs:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int | None = None) -> None:
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+        self.codecs = available_codecs()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codec = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.codecs)
+        if codec is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponder(self.app, codec, self.codecs[codec], self.minimum_size)(scope, receive, send)
+
+
+class _CompressedResponder:
+    def __init__(self, app: ASGIApp, codec: str, factory: Callable[[], Compressor], minimum_size: int) -> None:
+        self.app = app
+        self.codec = codec
+        self.factory = factory
+        self.minimum_size = minimum_size
+        self.send: Send
+        self.start_message: Message | None = None
+        self.compressor: Compressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _compressible(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        if content_type.startswith(EXCLUDED_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send_wrapper(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._compressible(Headers(raw=message["headers"]))
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if not more_body and len(body) < self.minimum_size:
+                # Маленький ответ целиком: сжатие не окупает CPU
+                await self.send(self.start_message)
+                await self.send(message)
+                self.start_message = None
+                self.passthrough = True
+                return
+            self.compressor = self.factory()
+            headers["Content-Encoding"] = self.codec
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                body = self.compressor.compress(body)
+            else:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+            await self.send(self.start_message)
+            self.start_message = None
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        body = self.compressor.compress(body) if more_body else self.compressor.compress(body) + self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
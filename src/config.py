@@ -1,17 +1,125 @@
-from pydantic_settings import BaseSettings
-from fastapi_mail import ConnectionConfig
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
     # ... ваши текущие настройки
-    SECRET_KEY: str = "your-secret-key"
+    DATABASE_URL: str | None = None
+    SECRET_KEY: str | None = None
+    ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Роль из подписанного токена без запроса к БД; удаление, блокировка (disabled) и смена роли
+    # вступают в силу с истечением токена (ACCESS_TOKEN_EXPIRE_MINUTES)
+    AUTH_CLAIMS_ONLY: bool = False
+    # Асимметричная подпись токенов (см. jwks.py): PEM-ключи Ed25519/RSA, первым подписываются новые токены
+    JWT_SIGNING_KEY_FILES: list[str] = []
+    JWT_ACCEPT_SHARED_SECRET: bool = True  # принимать HS256-токены без kid; выключить после перехода на ключи
+    JWKS_CACHE_SECONDS: int = 300
     RESET_TOKEN_EXPIRE_HOURS: int = 1
-    SMTP_USER: str
-    SMTP_PASSWORD: str
-    SMTP_HOST: str
-    SMTP_PORT: int
+    SMTP_USER: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_HOST: str = ""
+    SMTP_PORT: int = 587
+
+    # Сервер (см. server.py)
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    WEB_CONCURRENCY: int | None = None  # None -> по числу доступных CPU
+    MAX_WORKERS: int = 16
+    MAX_REQUESTS: int | None = 10000  # перезапуск воркера после N запросов
+    MAX_REQUESTS_JITTER: int = 1000
+    GRACEFUL_TIMEOUT: int = 30
+    SHUTDOWN_DRAIN_DELAY_SECONDS: float = 5  # после SIGTERM воркер еще принимает запросы, но не готов
+    KEEPALIVE_TIMEOUT: int = 5
+    FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+
+    # Пул соединений с БД (прогревается до DB_POOL_SIZE при старте воркера)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Подготовленные запросы asyncpg на соединение (LRU); 0 — без кэша, нужно за pgbouncer в режиме transaction
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+
+    # Каталог специализаций (см. specializations.py)
+    SPECIALIZATIONS_CACHE_SECONDS: float = 30  # за столько другие воркеры увидят новые счетчики
+
+    # Сжатие ответов (см. compression.py)
+    COMPRESSION_CODECS: str = "zstd,br,gzip"  # порядок = предпочтение сервера
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # меньшие ответы отдаются без сжатия
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 11 слишком дорого для динамических ответов
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # Объединение одинаковых параллельных чтений (см. singleflight.py)
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    # SSE-лента изменений записей (см. changefeed.py)
+    CHANGEFEED_ENABLED: bool = True
+    CHANGEFEED_QUEUE_SIZE: int = 1000  # отставший клиент отключается и догоняет по since
+    CHANGEFEED_CATCHUP_BATCH: int = 500
+    CHANGEFEED_KEEPALIVE_SECONDS: float = 15
+    CHANGEFEED_RETRY_MS: int = 3000
+
+    # Idempotency-Key для POST (см. idempotency.py)
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    IDEMPOTENCY_WAIT_SECONDS: float = 10  # сколько дубликат ждет завершения первого запроса
+    IDEMPOTENCY_POLL_SECONDS: float = 0.05
+    IDEMPOTENCY_LOCK_TIMEOUT_SECONDS: int = 60  # брошенный "в процессе" ключ можно занять заново
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 300
+
+    # Физическое удаление мягко удаленных врачей/пациентов (см. purger.py)
+    PURGE_ENABLED: bool = True
+    PURGE_BATCH_SIZE: int = 500
+    PURGE_BATCH_DELAY_SECONDS: float = 0.2
+    PURGE_IDLE_SECONDS: float = 30
+
+    # Помесячные партиции appointments (см. partitions.py)
+    APPOINTMENT_PARTITIONS_AHEAD: int = 3  # месяцев вперед от текущего
+    PARTITION_CHECK_INTERVAL_SECONDS: int = 6 * 60 * 60
+
+    # Лог SQL (см. slowquery.py)
+    SQL_ECHO: bool = False  # каждый запрос в stdout — только для отладки
+    SLOW_QUERY_MS: float = 200
+    SLOW_QUERY_LOG_FILE: str | None = None  # None -> stderr
+
+    # Подсчет SQL-запросов на запрос и поиск N+1 (см. querycount.py)
+    QUERY_COUNT_ENABLED: bool = True
+    QUERY_REPEAT_THRESHOLD: int = 5  # столько одинаковых запросов за один HTTP-запрос — вероятный N+1
+
+    # Холодный архив старых записей (см. archive.py)
+    ARCHIVE_ENABLED: bool = False  # включать, только если ARCHIVE_DIR на постоянном томе
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_AFTER_DAYS: int = 365  # в архив уходят месяцы, закончившиеся раньше
+    ARCHIVE_INTERVAL_SECONDS: int = 24 * 60 * 60
+    ARCHIVE_COMPRESSION_LEVEL: int = 9  # пишется один раз, читается редко
+
+    # Трассировка запросов (см. tracing.py)
+    TRACING_SAMPLE_RATIO: float = 0.0  # доля записываемых трасс; 0 — выключено
+    TRACING_EXPORTER: str = "file"  # file | otlp
+    TRACING_FILE: str = "traces.jsonl"  # OTLP/JSON, по строке на пакет спанов
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SERVICE_NAME: str = "co-working"
+    TRACING_BATCH_SIZE: int = 512
+    TRACING_EXPORT_INTERVAL_SECONDS: float = 2
+
+    # Профилировщик POST /debug/profile (см. profiler.py)
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5
+
+    # Задержка цикла событий (см. looplag.py)
+    LOOP_LAG_MONITOR_ENABLED: bool = True
+    LOOP_LAG_INTERVAL_MS: float = 100
+    LOOP_LAG_THRESHOLD_MS: float = 250  # дольше — в лог пишется стек блокирующего кода
+
+    # Проба готовности /readyz (см. health.py)
+    READY_CACHE_SECONDS: float = 1
+    READY_DB_TIMEOUT_SECONDS: float = 2
+    READY_MAX_POOL_SATURATION: float = 0.9  # доля занятых соединений пула
+    READY_MAX_LOOP_LAG_MS: float = 500
 
     @property
     def email_conf(self):
+        # fastapi_mail тяжелый и нужен только при сбросе пароля
+        from fastapi_mail import ConnectionConfig
+
         return ConnectionConfig(
             MAIL_USERNAME=self.SMTP_USER,
             MAIL_PASSWORD=self.SMTP_PASSWORD,
@@ -20,4 +128,7 @@ class Settings(BaseSettings):
             MAIL_SERVER=self.SMTP_HOST,
             MAIL_STARTTLS=True,
             MAIL_SSL_TLS=False,
-        )
\ No newline at end of file
+        )
+
+
+settings = Settings()
@@ -1,14 +1,27 @@
+import base64
+from collections.abc import Sequence
+from datetime import date, datetime
 from uuid import UUID
 
 from fastapi import HTTPException
+from sqlalchemy import any_, bindparam, func, text, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import load_only, raiseload
 
+import purger
 from auth import get_password_hash
-from database import AppointmentORM, DoctorORM, RoomORM, UserORM
+from singleflight import coalesce
+from tracing import traced
+from database import AppointmentChangeORM, AppointmentORM, DoctorORM, RoomORM, UserORM, reusable
 # from main import request_password_reset
 from model import (
+    AppointmentChange,
+    AppointmentChangeOp,
+    AppointmentScope,
     DoctorItemCreate,
     DoctorItemUpdate,
     RoomItemCreate,
@@ -17,6 +30,7 @@ from model import (
 )
 
 
+@traced
 async def create_doctor(db: AsyncSession, data: DoctorItemCreate) -> DoctorORM:
     """
         Create a new doctor in the database.
@@ -55,7 +69,24 @@ async def create_doctor(db: AsyncSession, data: DoctorItemCreate) -> DoctorORM:
     return doctor
 
 
-async def get_doctors(db: AsyncSession, page: int, size: int) -> list[DoctorORM]:
+# Горячие поиски собираются один раз: значения передаются связанными параметрами,
+# фильтр удаленных и ключ кэша компиляции тоже считаются один раз (см. database.reusable)
+_DOCTOR_BY_ID = reusable(select(DoctorORM).where(DoctorORM.id == bindparam("doctor_id")))
+_USER_BY_ID = reusable(select(UserORM).where(UserORM.id == bindparam("user_id")))
+_USER_BY_EMAIL = reusable(select(UserORM).where(UserORM.email == bindparam("email")))
+
+
+def _project(query, orm, fields: frozenset[str] | None):
+    """Restrict a SELECT of `orm` to the requested columns (sparse fieldsets)."""
+    if not fields:
+        return query
+    columns = [getattr(orm, name) for name in sorted(fields | {"id"})]
+    return query.options(load_only(*columns, raiseload=True), raiseload("*"))
+
+
+@traced
+@coalesce
+async def get_doctors(db: AsyncSession, page: int, size: int, fields: frozenset[str] | None = None) -> list[DoctorORM]:
     """
         Retrieve a paginated list of doctors from the database.
 
@@ -63,6 +94,7 @@ async def get_doctors(db: AsyncSession, page: int, size: int) -> list[DoctorORM]
             db (AsyncSession): The asynchronous database session.
             page (int): The page number to retrieve (starting from 1).
             size (int): The number of records per page.
+            fields (frozenset[str] | None): Columns to load; all columns when None.
 
         Returns:
             List[DoctorORM]: A list of DoctorORM objects corresponding to the requested page.
@@ -70,27 +102,54 @@ async def get_doctors(db: AsyncSession, page: int, size: int) -> list[DoctorORM]
         Example:
             doctors = await get_doctors(db_session, page=2, size=10)
         """
-    result = await db.execute(select(DoctorORM).order_by(DoctorORM.name.asc()).offset((page - 1) * size).limit(size))
+    query = _project(select(DoctorORM), DoctorORM, fields)
+    result = await db.execute(query.order_by(DoctorORM.name.asc()).offset((page - 1) * size).limit(size))
     doctors = result.scalars().all()
     return doctors
 
 
-async def get_doctor(db: AsyncSession, doctor_id: UUID) -> DoctorORM:
+@traced
+@coalesce
+async def get_doctor(db: AsyncSession, doctor_id: UUID, fields: frozenset[str] | None = None) -> DoctorORM:
     """
         Retrieve a doctor by their ID from the database.
 
         Args:
             db: Async database session
             doctor_id: UUID of the doctor to retrieve
+            fields: Columns to load; all columns when None
 
         Returns:
             DoctorORM instance if found, None otherwise
         """
-    result = await db.execute(select(DoctorORM).filter(DoctorORM.id == doctor_id))
+    if fields:
+        result = await db.execute(_project(select(DoctorORM), DoctorORM, fields).filter(DoctorORM.id == doctor_id))
+    else:
+        result = await db.execute(_DOCTOR_BY_ID, {"doctor_id": doctor_id})
     doctor = result.scalars().first()
     return doctor
 
 
+async def _get_by_ids(db: AsyncSession, orm, ids: list[UUID]) -> list:
+    """
+        Fetch rows of `orm` by primary key with a single `id = ANY(:ids)` query.
+
+        The ids travel as one array parameter, so the statement text (and the
+        prepared statement on the server) is the same for any batch size.
+        Relationships are not loaded.
+        """
+    ids_param = bindparam("ids", ids, type_=ARRAY(PG_UUID(as_uuid=True)))
+    result = await db.execute(select(orm).options(raiseload("*")).where(orm.id == any_(ids_param)))
+    return result.scalars().all()
+
+
+@traced
+async def get_doctors_by_ids(db: AsyncSession, ids: list[UUID]) -> list[DoctorORM]:
+    """Retrieve doctors by a list of IDs in one query (unordered, missing IDs skipped)."""
+    return await _get_by_ids(db, DoctorORM, ids)
+
+
+@traced
 async def update_doctor_dump(db: AsyncSession, doctor_id: UUID, doctor_update: DoctorItemUpdate) -> DoctorORM | None:
     """
         Update a doctor's information in the database.
@@ -120,9 +179,13 @@ async def update_doctor_dump(db: AsyncSession, doctor_id: UUID, doctor_update: D
     return db_doctor
 
 
+@traced
 async def delete_doctor(db: AsyncSession, doctor_id: UUID)-> DoctorORM | None:
     """
-        Delete a doctor record from the database by ID.
+        Soft-delete a doctor by ID.
+
+        The row is tombstoned and hidden from all reads at once; the doctor
+        and their appointments are physically removed later by the purger.
 
         Args:
             db: Async database session
@@ -140,11 +203,17 @@ async def delete_doctor(db: AsyncSession, doctor_id: UUID)-> DoctorORM | None:
     doctor = await get_doctor(db, doctor_id)
     if not doctor:
         return None
-    await db.delete(doctor)
+    # Мгновенное "надгробие" вместо каскадного удаления записей в транзакции запроса
+    doctor.deleted_at = datetime.utcnow()
+    await db.flush()
+    # Как и при настоящем удалении, объект покидает сессию: commit его не экспайрит
+    db.expunge(doctor)
     await db.commit()
+    purger.wake()
     return doctor
 
 
+@traced
 async def create_user(db: AsyncSession, data: UserItemCreate):
     hashed_password = get_password_hash(data.password)
     user = UserORM(name=data.name, surname=data.surname, email=data.email, age=data.age,
@@ -169,24 +238,54 @@ async def create_user(db: AsyncSession, data: UserItemCreate):
     return user
 
 
-async def get_users(db: AsyncSession, page: int, size: int) -> list[UserORM]:
-    result = await db.execute(select(UserORM).order_by(UserORM.name.asc()).offset((page - 1) * size).limit(size))
+@traced
+async def get_users(db: AsyncSession, page: int, size: int, fields: frozenset[str] | None = None) -> list[UserORM]:
+    query = _project(select(UserORM), UserORM, fields)
+    result = await db.execute(query.order_by(UserORM.name.asc()).offset((page - 1) * size).limit(size))
     users = result.scalars().all()
     return users
 
 
-async def get_user(db: AsyncSession, user_id: UUID):
-    result = await db.execute(select(UserORM).filter(UserORM.id == user_id))
+@traced
+@coalesce
+async def get_user(db: AsyncSession, user_id: UUID, fields: frozenset[str] | None = None):
+    if fields:
+        result = await db.execute(_project(select(UserORM), UserORM, fields).filter(UserORM.id == user_id))
+    else:
+        result = await db.execute(_USER_BY_ID, {"user_id": user_id})
     user = result.scalars().first()
     return user
 
 
+@traced
+async def get_users_by_ids(db: AsyncSession, ids: list[UUID]) -> list[UserORM]:
+    return await _get_by_ids(db, UserORM, ids)
+
+
+@traced
 async def get_user_by_email(db: AsyncSession, user_email: str):
-    result = await db.execute(select(UserORM).filter(UserORM.email == user_email))
+    result = await db.execute(_USER_BY_EMAIL, {"email": user_email})
     user = result.scalars().first()
     return user
 
 
+@traced
+async def get_user_by_phone(db: AsyncSession, phone: str) -> UserORM | None:
+    """
+        Retrieve a user by phone number using the unique index on users.phone.
+
+        Args:
+            db: Async database session
+            phone: Phone number already normalized by model.normalize_phone
+
+        Returns:
+            UserORM instance if found, None otherwise
+        """
+    result = await db.execute(select(UserORM).filter(UserORM.phone == phone))
+    return result.scalars().first()
+
+
+@traced
 async def update_user_dump(db: AsyncSession, user_id: UUID, user_update: UserItemUpdate):
     db_user = await get_user(db, user_id)
     if not db_user:
@@ -202,15 +301,20 @@ async def update_user_dump(db: AsyncSession, user_id: UUID, user_update: UserIte
     return db_user
 
 
+@traced
 async def delete_user(db: AsyncSession, user_id: UUID):
     user = await get_user(db, user_id)
     if not user:
         return None
-    await db.delete(user)
+    user.deleted_at = datetime.utcnow()
+    await db.flush()
+    db.expunge(user)
     await db.commit()
+    purger.wake()
     return user
 
 
+@traced
 async def create_room(db: AsyncSession, data: RoomItemCreate):
     room = RoomORM(number=data.number)
     try:
@@ -233,6 +337,12 @@ async def create_room(db: AsyncSession, data: RoomItemCreate):
     return room
 
 
+@traced
+async def get_rooms_by_ids(db: AsyncSession, ids: list[UUID]) -> list[RoomORM]:
+    return await _get_by_ids(db, RoomORM, ids)
+
+
+@traced
 async def get_appointments(db: AsyncSession, page: int, size: int) -> list[AppointmentORM]:
     """
         Retrieve a paginated list of doctors from the database.
@@ -251,3 +361,169 @@ async def get_appointments(db: AsyncSession, page: int, size: int) -> list[Appoi
     result = await db.execute(select(AppointmentORM).order_by(AppointmentORM.date.asc()).offset((page - 1) * size).limit(size))
     appointments = result.scalars().all()
     return appointments
+
+
+@traced
+@coalesce
+async def get_doctor_calendar(db: AsyncSession, doctor_id: UUID, date_from: date, date_to: date) -> list[dict]:
+    """
+        Retrieve a doctor's appointments within a date range (inclusive).
+
+        Only columns of the covering index ix_appointments_doctor_id_date are
+        selected, so PostgreSQL answers with an index-only scan.
+
+        Args:
+            db (AsyncSession): The asynchronous database session.
+            doctor_id (UUID): The doctor whose calendar is requested.
+            date_from (date): First day of the range.
+            date_to (date): Last day of the range.
+
+        Returns:
+            List[dict]: Rows with date, room_id and user_id ordered by date.
+        """
+    result = await db.execute(
+        select(AppointmentORM.date, AppointmentORM.room_id, AppointmentORM.user_id)
+        .where(
+            AppointmentORM.doctor_id == doctor_id,
+            AppointmentORM.date >= date_from,
+            AppointmentORM.date <= date_to,
+        )
+        .order_by(AppointmentORM.date.asc())
+    )
+    return result.mappings().all()
+
+
+def encode_cursor(appointment_date: date, appointment_id: UUID) -> str:
+    """Opaque keyset cursor pointing at the last returned appointment."""
+    raw = f"{appointment_date.isoformat()}|{appointment_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[date, UUID]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    try:
+        raw_date, raw_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(raw_date), UUID(raw_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+@traced
+async def get_user_appointments(db: AsyncSession, user_id: UUID, scope: AppointmentScope, size: int,
+                                cursor: tuple[date, UUID] | None = None, today: date | None = None) -> list[dict]:
+    """
+        Retrieve one keyset page of a user's appointments.
+
+        Upcoming appointments are returned soonest first, past ones most recent
+        first. The (date, id) row comparison walks ix_appointments_user_id_date_id,
+        so every page costs the same regardless of how deep it is; the plain
+        date bounds let PostgreSQL skip monthly partitions outside the page.
+
+        Args:
+            db (AsyncSession): The asynchronous database session.
+            user_id (UUID): Owner of the appointments.
+            scope (AppointmentScope): Upcoming (today and later) or past appointments.
+            size (int): Maximum number of rows to return.
+            cursor (tuple[date, UUID] | None): Position after which the page starts.
+            today (date | None): Boundary between past and upcoming, defaults to today.
+
+        Returns:
+            List[dict]: Appointment rows (id, date, doctor_id, room_id).
+        """
+    today = today or date.today()
+    position = tuple_(AppointmentORM.date, AppointmentORM.id)
+    query = select(AppointmentORM.id, AppointmentORM.date, AppointmentORM.doctor_id, AppointmentORM.room_id).where(
+        AppointmentORM.user_id == user_id)
+
+    if scope == AppointmentScope.upcoming:
+        query = query.where(AppointmentORM.date >= today).order_by(AppointmentORM.date.asc(), AppointmentORM.id.asc())
+        if cursor:
+            # Дублирующее условие по date: по сравнению кортежей планировщик партиции не отсекает
+            query = query.where(position > tuple_(*cursor), AppointmentORM.date >= cursor[0])
+    else:
+        query = query.where(AppointmentORM.date < today).order_by(AppointmentORM.date.desc(), AppointmentORM.id.desc())
+        if cursor:
+            query = query.where(position < tuple_(*cursor), AppointmentORM.date <= cursor[0])
+
+    result = await db.execute(query.limit(size))
+    return result.mappings().all()
+
+
+CHANGES_CHANNEL = "appointment_changes"
+# Ключ advisory-блокировки: пишущие в журнал транзакции коммитятся в порядке seq,
+# иначе клиент, продолжающий с since=N, мог бы пропустить изменение N-1
+CHANGES_LOCK_ID = 0x61707063
+
+
+@traced
+async def record_appointment_change(db: AsyncSession, appointment: AppointmentORM, op: AppointmentChangeOp) -> int:
+    """
+        Append a change to the appointment feed within the caller's transaction.
+
+        pg_notify is transactional too: listeners receive the change only when
+        the caller commits, and never if it rolls back.
+
+        Args:
+            db: Async database session with the appointment already added
+            appointment: The created or deleted appointment
+            op: Kind of change
+
+        Returns:
+            Sequence number of the change (the feed's resume token)
+        """
+    return (await record_appointment_changes(db, [appointment], op))[0]
+
+
+@traced
+async def record_appointment_changes(db: AsyncSession, appointments: Sequence, op: AppointmentChangeOp) -> list[int]:
+    """
+        Append several changes at once, e.g. for rows returned by DELETE ... RETURNING.
+
+        Args:
+            db: Async database session
+            appointments: Objects with id, doctor_id, user_id, room_id and date
+            op: Kind of change
+
+        Returns:
+            Sequence numbers of the changes, in the order of `appointments`
+        """
+    await db.execute(select(func.pg_advisory_xact_lock(CHANGES_LOCK_ID)))
+    await db.flush()
+    changes = [
+        AppointmentChangeORM(
+            op=op.value,
+            appointment_id=appointment.id,
+            doctor_id=appointment.doctor_id,
+            user_id=appointment.user_id,
+            room_id=appointment.room_id,
+            date=appointment.date,
+        )
+        for appointment in appointments
+    ]
+    db.add_all(changes)
+    await db.flush()
+    payloads = [AppointmentChange.model_validate(change).model_dump_json() for change in changes]
+    # Одним запросом; unnest отдает элементы по порядку, так что уведомления идут в порядке seq
+    await db.execute(
+        text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+        {"channel": CHANGES_CHANNEL, "payloads": payloads},
+    )
+    return [change.seq for change in changes]
+
+
+@traced
+async def get_appointment_changes(db: AsyncSession, since: int, limit: int = 1000) -> list[AppointmentChangeORM]:
+    """Changes with seq greater than `since`, oldest first (catch-up for the change feed)."""
+    result = await db.execute(
+        select(AppointmentChangeORM)
+        .where(AppointmentChangeORM.seq > since)
+        .order_by(AppointmentChangeORM.seq.asc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+@traced
+async def get_last_appointment_change_seq(db: AsyncSession) -> int:
+    result = await db.execute(select(func.coalesce(func.max(AppointmentChangeORM.seq), 0)))
+    return result.scalar_one()
@@ -1,26 +1,58 @@
-import os
 import uuid
-from datetime import date
+from datetime import date, datetime
 
-from dotenv import load_dotenv
-from sqlalchemy import UUID, Boolean, Date, ForeignKey
+from sqlalchemy import DDL, UUID, BigInteger, Boolean, Date, DateTime, ForeignKey, Identity, Index, LargeBinary, String, event, exists, func, text
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, ORMExecuteState, Session, declared_attr, mapped_column, relationship, with_loader_criteria
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.hybrid import hybrid_property
 
+import querycount
+import slowquery
+import tracing
+from config import settings
 from model import CategoryEnum, UserRole
 
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_async_engine(DATABASE_URL, echo=True)
-
-async_session = async_sessionmaker(engine)
+# Движок создается в lifespan приложения (init_engine), а не при импорте
+engine: AsyncEngine | None = None
+
+async_session = async_sessionmaker()
+
+
+def init_engine(url: str | None = None, **kwargs) -> AsyncEngine:
+    """Create the engine and bind the session factory to it."""
+    global engine
+    # Echo пишет каждый запрос синхронно; медленные запросы логирует slowquery
+    kwargs.setdefault("echo", settings.SQL_ECHO)
+    engine_url = make_url(url or settings.DATABASE_URL)
+    if engine_url.get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            **kwargs.get("connect_args", {}),
+        }
+    if "poolclass" not in kwargs:
+        kwargs.setdefault("pool_size", settings.DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", settings.DB_MAX_OVERFLOW)
+    engine = create_async_engine(engine_url, **kwargs)
+    querycount.instrument(engine)
+    slowquery.instrument(engine)
+    tracing.instrument(engine)
+    async_session.configure(bind=engine)
+    return engine
+
+
+async def dispose_engine() -> None:
+    """Close all pooled connections of the current engine."""
+    global engine
+    if engine is not None:
+        await engine.dispose()
+        engine = None
 
 
 async def get_session() -> AsyncSession:
@@ -33,7 +65,35 @@ class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
-class DoctorORM(Base):
+class SoftDeleteMixin:
+    """Tombstone flag: rows with deleted_at set are hidden from ORM reads and purged later (see purger.py)."""
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        # Частичный индекс: ищем только надгробия, живые строки в него не попадают
+        return (
+            Index(f"ix_{cls.__tablename__}_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+        )
+
+
+class SpecializationORM(Base):
+    """Catalog of doctor specializations; `key` is the normalized name (see specializations.py)."""
+    __tablename__ = "specializations"
+    id: Mapped[int] = mapped_column(Identity(), primary_key=True)
+    key: Mapped[str] = mapped_column(unique=True)
+    name: Mapped[str]
+
+
+class SpecializationCountORM(Base):
+    """Live doctors per specialization and category, kept up to date on every doctor write."""
+    __tablename__ = "specialization_counts"
+    specialization_id: Mapped[int] = mapped_column(ForeignKey("specializations.id"), primary_key=True)
+    category: Mapped[CategoryEnum] = mapped_column(primary_key=True)
+    doctors: Mapped[int] = mapped_column(server_default="0")
+
+
+class DoctorORM(SoftDeleteMixin, Base):
     """Doctor database model representing medical professionals."""
     __tablename__ = "doctors"
 
@@ -42,13 +102,15 @@ class DoctorORM(Base):
     surname: Mapped[str] = mapped_column(unique=True)
     age: Mapped[int]
     specialization: Mapped[str]
+    # Заполняется из specialization при записи (см. specializations.py)
+    specialization_id: Mapped[int] = mapped_column(ForeignKey("specializations.id"), index=True)
     category: Mapped[CategoryEnum]
     password: Mapped[str]
 
     appointments: Mapped["AppointmentORM"] = relationship(back_populates="doctor", cascade="all, delete", passive_deletes=True, lazy="joined")
 
 
-class UserORM(Base):
+class UserORM(SoftDeleteMixin, Base):
     """User database model representing system users with authentication."""
     __tablename__ = "users"
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -56,13 +118,13 @@ class UserORM(Base):
     surname: Mapped[str]
     email: Mapped [str | None] = mapped_column(unique=True)
     age: Mapped[int]
-    phone: Mapped[str] = mapped_column(unique=True)
+    phone: Mapped[str] = mapped_column(unique=True)  # E.164, см. model.normalize_phone
     role: Mapped[UserRole] = mapped_column(nullable=False, server_default="user")
     password: Mapped[str]
     disabled: Mapped [bool] = mapped_column(Boolean, default=False)
 
     reset_token: Mapped [str | None] = mapped_column(nullable=True)
-    reset_token_expires: Mapped[date] = mapped_column(Date)
+    reset_token_expires: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     appointments: Mapped["AppointmentORM"] = relationship(back_populates="user", cascade="all, delete", passive_deletes=True, lazy="joined")
 
@@ -79,11 +141,111 @@ class RoomORM(Base):
 class AppointmentORM(Base):
     """ORM model representing an appointment in the database."""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Календарь врача читается index-only scan'ом, без обращения к heap
+        Index("ix_appointments_doctor_id_date", "doctor_id", "date", postgresql_include=["room_id", "user_id"]),
+        # Keyset-пагинация записей пациента: WHERE user_id = ? AND (date, id) > (?, ?)
+        Index("ix_appointments_user_id_date_id", "user_id", "date", "id"),
+        # Помесячные партиции создает partitions.py; ключ партиционирования входит в PK
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
     id: Mapped[UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    date: Mapped[date] = mapped_column(Date)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
     doctor_id = mapped_column(ForeignKey('doctors.id', ondelete="CASCADE"))
     doctor: Mapped["DoctorORM"] = relationship( back_populates="appointments", cascade="all, delete", passive_deletes=True, lazy="joined")
     user_id = mapped_column(ForeignKey('users.id', ondelete="CASCADE"))
     user: Mapped["UserORM"] = relationship( back_populates="appointments", cascade="all, delete", passive_deletes=True, lazy="joined")
     room_id = mapped_column(ForeignKey('rooms.id', ondelete="CASCADE"))
     room: Mapped["RoomORM"] = relationship( back_populates="appointments", cascade="all, delete", passive_deletes=True, lazy="joined")
+
+
+# Партиция по умолчанию нужна сразу: без нее вставка в месяц без партиции упадет
+event.listen(
+    AppointmentORM.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS appointments_default PARTITION OF appointments DEFAULT"),
+)
+
+
+class AppointmentChangeORM(Base):
+    """Append-only log of appointment changes; `seq` is the resume token of the change feed."""
+    __tablename__ = "appointment_changes"
+    seq: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    op: Mapped[str] = mapped_column(String(16))
+    # Без внешних ключей: запись о удалении должна пережить саму запись на прием
+    appointment_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True))
+    doctor_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True))
+    user_id: Mapped[UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    room_id: Mapped[UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    date: Mapped[date] = mapped_column(Date)
+    changed_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class IdempotencyKeyORM(Base):
+    """Stored response of a POST made with an Idempotency-Key (see idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    user_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    # NULL, пока первый запрос еще выполняется
+    status_code: Mapped[int | None] = mapped_column(nullable=True)
+    content_type: Mapped[str | None] = mapped_column(nullable=True)
+    body: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+def _tombstone_criteria() -> tuple:
+    return (
+        with_loader_criteria(SoftDeleteMixin, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+        # Записи удаленных врача/пациента скрываются сразу, физически их удалит purger.
+        # Подзапросы по таблицам (не по ORM-классам), чтобы на них не наложился фильтр выше
+        with_loader_criteria(
+            AppointmentORM,
+            lambda cls: ~exists().where(
+                DoctorORM.__table__.c.id == cls.doctor_id, DoctorORM.__table__.c.deleted_at.is_not(None)
+            ).correlate_except(DoctorORM.__table__)
+            & ~exists().where(
+                UserORM.__table__.c.id == cls.user_id, UserORM.__table__.c.deleted_at.is_not(None)
+            ).correlate_except(UserORM.__table__),
+            include_aliases=True,
+        ),
+    )
+
+
+# Запрос из reusable() -> он же с фильтром удаленных. Не очищается: только для констант модулей
+_filtered: dict = {}
+
+
+def reusable(statement):
+    """Mark a module-level statement executed many times with different bound parameters.
+
+    The tombstone filter is then applied to it once instead of on every
+    execution, and its compiled-cache key is computed once too.
+    """
+    return statement.execution_options(reusable=True)
+
+
+def _with_tombstone_filter(statement):
+    if not statement.get_execution_options().get("reusable", False):
+        return statement.options(*_tombstone_criteria())
+    filtered = _filtered.get(statement)
+    if filtered is None:
+        filtered = _filtered[statement] = statement.options(*_tombstone_criteria())
+    return filtered
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_tombstones(execute_state: ORMExecuteState) -> None:
+    """Filter soft-deleted rows (and appointments of soft-deleted doctors/users) out of every ORM SELECT.
+
+    Pass `execution_options(include_deleted=True)` to see them, e.g. in the purger.
+    """
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get("include_deleted", False)
+    ):
+        return
+    execute_state.statement = _with_tombstone_filter(execute_state.statement)
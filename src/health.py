@@ -0,0 +1,110 @@
+"""
+Liveness and readiness of the worker.
+
+/livez only shows that the event loop answers. /readyz tells the load
+balancer whether to send traffic here. It is not ready when:
+
+- the worker is shutting down (see `mark_shutting_down()`);
+- the database does not answer `SELECT 1` within READY_DB_TIMEOUT_SECONDS;
+- the connection pool is at least READY_MAX_POOL_SATURATION busy; the DB
+  probe is then skipped, since it would only queue for a connection;
+- the event loop lags by READY_MAX_LOOP_LAG_MS or more (see looplag.py).
+
+The result is cached for READY_CACHE_SECONDS, and concurrent probes share
+one in-flight check, so a probe storm costs at most one query per interval.
+"""
+import asyncio
+import time
+
+from sqlalchemy import text
+
+import database
+import looplag
+from config import settings
+
+
+def pool_usage() -> tuple[int, int] | None:
+    """Checked-out connections and pool capacity; None for pools without a limit."""
+    pool = database.engine.pool if database.engine is not None else None
+    if pool is None or not hasattr(pool, "checkedout"):
+        return None
+    # Те же лимиты, что init_engine передает пулу; max_overflow=-1 — пул растет без ограничений
+    if settings.DB_POOL_SIZE <= 0 or settings.DB_MAX_OVERFLOW < 0:
+        return None
+    return pool.checkedout(), settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+
+
+async def _check_database() -> str:
+    try:
+        async with asyncio.timeout(settings.READY_DB_TIMEOUT_SECONDS):
+            async with database.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    except TimeoutError:
+        return "timeout"
+    except Exception as error:
+        return f"error: {type(error).__name__}"
+    return "ok"
+
+
+async def _check() -> tuple[bool, dict]:
+    checks: dict = {}
+    ready = True
+
+    usage = pool_usage()
+    saturated = False
+    if usage is not None:
+        checked_out, capacity = usage
+        saturated = checked_out >= capacity * settings.READY_MAX_POOL_SATURATION
+        checks["pool"] = {"checked_out": checked_out, "capacity": capacity, "status": "saturated" if saturated else "ok"}
+        ready = not saturated
+
+    if saturated:
+        checks["database"] = "skipped"
+    else:
+        checks["database"] = await _check_database()
+        ready = ready and checks["database"] == "ok"
+
+    lag_ms = looplag.monitor.lag * 1000
+    lagging = lag_ms >= settings.READY_MAX_LOOP_LAG_MS
+    checks["loop_lag"] = {"ms": round(lag_ms, 1), "status": "lagging" if lagging else "ok"}
+    return ready and not lagging, checks
+
+
+class Readiness:
+    def __init__(self):
+        self.shutting_down = False
+        self._result: tuple[bool, dict] | None = None
+        self._checked_at = 0.0
+        self._inflight: asyncio.Task | None = None
+
+    def reset(self) -> None:
+        self.shutting_down = False
+        self._result = None
+        self._inflight = None
+
+    async def check(self) -> tuple[bool, dict]:
+        """(ready, details); cached for READY_CACHE_SECONDS."""
+        if self.shutting_down:
+            return False, {"shutdown": True}
+        if self._result is not None and time.monotonic() - self._checked_at < settings.READY_CACHE_SECONDS:
+            return self._result
+        if self._inflight is None:
+            self._inflight = asyncio.get_running_loop().create_task(self._refresh())
+        # shield: отмена одного зонда не отменяет проверку, которую ждут остальные
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self) -> tuple[bool, dict]:
+        try:
+            self._result = await _check()
+            self._checked_at = time.monotonic()
+            return self._result
+        finally:
+            self._inflight = None
+
+
+readiness = Readiness()
+
+
+def mark_shutting_down() -> None:
+    """Report not-ready from now on so the load balancer stops sending requests."""
+    readiness.shutting_down = True
@@ -0,0 +1,221 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+The first request with a given key claims a row in idempotency_keys (scoped
+by the caller's user id from the bearer token, "anonymous" otherwise) and
+its response is stored there for IDEMPOTENCY_TTL_SECONDS. Retries with the
+same key replay the stored response without calling the endpoint, so no
+second insert and no second bcrypt hash. Duplicates that arrive while the
+first request is still running wait for it. Reusing a key with a different
+body is rejected with 422.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+from datetime import timedelta
+
+import jwt
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import database
+from auth import decode_token
+from config import settings
+from database import IdempotencyKeyORM
+
+HEADER = "idempotency-key"
+ANONYMOUS = "anonymous"
+
+
+def _caller(headers: Headers) -> str:
+    """User id from a valid bearer token; the endpoint itself still enforces auth."""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return ANONYMOUS
+    try:
+        payload = decode_token(token)
+    except jwt.PyJWTError:
+        return ANONYMOUS
+    return str(payload.get("sub") or ANONYMOUS)
+
+
+def _fingerprint(scope: Scope, body: bytes) -> str:
+    digest = hashlib.sha256(f"{scope['method']} {scope['path']}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def _claim(user_key: str, key: str, fingerprint: str) -> bool:
+    """Insert an in-progress row; take over expired rows and abandoned claims."""
+    now = func.now()
+    stale = IdempotencyKeyORM.status_code.is_(None) & (
+        IdempotencyKeyORM.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS))
+    statement = insert(IdempotencyKeyORM).values(
+        user_key=user_key,
+        key=key,
+        fingerprint=fingerprint,
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[IdempotencyKeyORM.user_key, IdempotencyKeyORM.key],
+        set_={
+            "fingerprint": statement.excluded.fingerprint,
+            "status_code": None,
+            "content_type": None,
+            "body": None,
+            "created_at": statement.excluded.created_at,
+            "expires_at": statement.excluded.expires_at,
+        },
+        where=or_(IdempotencyKeyORM.expires_at < now, stale),
+    ).returning(IdempotencyKeyORM.key)
+    async with database.async_session() as db:
+        claimed = (await db.execute(statement)).first() is not None
+        await db.commit()
+    return claimed
+
+
+async def _load(user_key: str, key: str) -> IdempotencyKeyORM | None:
+    async with database.async_session() as db:
+        return await db.get(IdempotencyKeyORM, (user_key, key))
+
+
+async def _store(user_key: str, key: str, status_code: int, content_type: str | None, body: bytes) -> None:
+    async with database.async_session() as db:
+        await db.execute(
+            update(IdempotencyKeyORM)
+            .where(IdempotencyKeyORM.user_key == user_key, IdempotencyKeyORM.key == key)
+            .values(status_code=status_code, content_type=content_type, body=body)
+        )
+        await db.commit()
+
+
+async def _release(user_key: str, key: str) -> None:
+    # Ошибка сервера не запоминается: повтор с тем же ключом выполнится заново
+    async with database.async_session() as db:
+        await db.execute(
+            delete(IdempotencyKeyORM).where(IdempotencyKeyORM.user_key == user_key, IdempotencyKeyORM.key == key)
+        )
+        await db.commit()
+
+
+async def purge_expired() -> int:
+    """Delete expired keys; returns the number of rows removed."""
+    async with database.async_session() as db:
+        result = await db.execute(delete(IdempotencyKeyORM).where(IdempotencyKeyORM.expires_at < func.now()))
+        await db.commit()
+    return result.rowcount
+
+
+async def _send_json(send: Send, status_code: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send: Send, row: IdempotencyKeyORM) -> None:
+    headers = [(b"content-length", str(len(row.body)).encode()), (b"idempotent-replayed", b"true")]
+    if row.content_type:
+        headers.append((b"content-type", row.content_type.encode()))
+    await send({"type": "http.response.start", "status": row.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": row.body})
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app: ASGIApp, paths: tuple[str, ...] = ("/appointments", "/users/", "/doctors/")) -> None:
+        self.app = app
+        self.paths = paths
+        # Ожидающие дубликаты в этом воркере просыпаются сразу, остальные опрашивают таблицу
+        self._local: dict[tuple[str, str], asyncio.Event] = {}
+        self._next_purge = 0.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= 255:
+            await _send_json(send, 400, "Idempotency-Key must be 1-255 characters")
+            return
+
+        body = await _read_body(receive)
+        user_key = _caller(headers)
+        fingerprint = _fingerprint(scope, body)
+        deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_SECONDS
+
+        while not await _claim(user_key, key, fingerprint):
+            row = await _load(user_key, key)
+            if row is None:
+                continue  # строку только что освободили — пробуем занять снова
+            if row.fingerprint != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used with a different request")
+                return
+            if row.status_code is not None:
+                await _replay(send, row)
+                return
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                await _send_json(send, 409, "A request with this Idempotency-Key is still in progress")
+                return
+            event = self._local.get((user_key, key))
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(
+                    event.wait() if event else asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS),
+                    min(remaining, settings.IDEMPOTENCY_POLL_SECONDS * 10),
+                )
+
+        await self._run(scope, body, send, user_key, key)
+
+        now = asyncio.get_running_loop().time()
+        if now >= self._next_purge:
+            self._next_purge = now + settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS
+            await purge_expired()
+
+    async def _run(self, scope: Scope, body: bytes, send: Send, user_key: str, key: str) -> None:
+        done = self._local[(user_key, key)] = asyncio.Event()
+        start: Message = {}
+        chunks: list[bytes] = []
+
+        async def replay_receive() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            status_code = start.get("status", 500)
+            if status_code < 500:
+                content_type = Headers(raw=start["headers"]).get("content-type")
+                await _store(user_key, key, status_code, content_type, b"".join(chunks))
+                stored = True
+        finally:
+            if not stored:
+                await asyncio.shield(_release(user_key, key))
+            self._local.pop((user_key, key), None)
+            done.set()
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
@@ -0,0 +1,81 @@
+"""
+Asymmetric signing keys for access tokens.
+
+With JWT_SIGNING_KEY_FILES set (PEM private keys, Ed25519 or RSA), access
+tokens are signed with the first key — EdDSA or RS256 — and carry its
+`kid` header. The other keys only verify, so a key is rotated in three
+deploys:
+
+1. append the new key: it is published in /.well-known/jwks.json, but
+   nothing is signed with it yet;
+2. after JWKS_CACHE_SECONDS, when downstream caches have it, move it first;
+3. after ACCESS_TOKEN_EXPIRE_MINUTES, drop the old key.
+
+The `kid` is the RFC 7638 thumbprint of the public key, so it needs no
+configuration and is the same on every worker. Keys are parsed once per
+process (`keyring()`); verifying a token is a dict lookup by `kid` plus the
+signature check. Downstream services verify the same way with the public
+JWKS, e.g. `jwt.PyJWKClient(url, cache_keys=True)`, and only refetch it on
+an unknown `kid`.
+
+Without keys, tokens stay HS256 with the shared SECRET_KEY.
+"""
+import base64
+import hashlib
+import json
+from functools import cache
+from pathlib import Path
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+from config import settings
+
+# Поля JWK, из которых считается thumbprint (RFC 7638)
+_THUMBPRINT_MEMBERS = {"OKP": ("crv", "kty", "x"), "RSA": ("e", "kty", "n")}
+
+
+def thumbprint(jwk: dict) -> str:
+    members = {name: jwk[name] for name in _THUMBPRINT_MEMBERS[jwk["kty"]]}
+    digest = hashlib.sha256(json.dumps(members, separators=(",", ":"), sort_keys=True).encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+class SigningKey:
+    __slots__ = ("kid", "algorithm", "private_key", "public_key", "jwk")
+
+    def __init__(self, private_key: Ed25519PrivateKey | RSAPrivateKey):
+        if isinstance(private_key, Ed25519PrivateKey):
+            self.algorithm, to_jwk = "EdDSA", OKPAlgorithm.to_jwk
+        elif isinstance(private_key, RSAPrivateKey):
+            self.algorithm, to_jwk = "RS256", RSAAlgorithm.to_jwk
+        else:
+            raise ValueError(f"Unsupported signing key type: {type(private_key).__name__}")
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        jwk = to_jwk(self.public_key, as_dict=True)
+        self.kid = thumbprint(jwk)
+        self.jwk = {**jwk, "kid": self.kid, "alg": self.algorithm, "use": "sig"}
+
+    @classmethod
+    def from_file(cls, path: str) -> "SigningKey":
+        return cls(load_pem_private_key(Path(path).read_bytes(), password=None))
+
+
+class KeyRing:
+    def __init__(self, keys: list[SigningKey]):
+        self.active = keys[0] if keys else None
+        self.keys = {key.kid: key for key in keys}
+        # Документ JWKS не меняется до перезапуска — сериализуется один раз
+        self.document = json.dumps({"keys": [key.jwk for key in keys]}).encode()
+
+    def get(self, kid: str) -> SigningKey | None:
+        return self.keys.get(kid)
+
+
+@cache
+def keyring() -> KeyRing:
+    """Keys from JWT_SIGNING_KEY_FILES, parsed once per process."""
+    return KeyRing([SigningKey.from_file(path) for path in settings.JWT_SIGNING_KEY_FILES])
@@ -0,0 +1,117 @@
+"""
+Event loop lag monitor.
+
+A task on the loop sleeps LOOP_LAG_INTERVAL_MS and measures how late it
+wakes up. Delays are exported as event_loop_lag_seconds (the last
+measurement) and event_loop_lag_max_seconds (the worst since the last
+scrape).
+
+The task cannot report while the loop is blocked, so a watchdog thread
+checks its heartbeat. When the loop has not come back for
+LOOP_LAG_THRESHOLD_MS, the watchdog takes the loop thread's stack (the
+blocking code: bcrypt, a regex, a sync call in a handler) and logs it
+together with the route being served. Each blocked episode is logged
+once and counted in event_loop_blocked_total{route}.
+"""
+import asyncio
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import metrics
+from config import settings
+from querycount import route_name
+
+logger = logging.getLogger(__name__)
+
+blocked_total = metrics.counter("event_loop_blocked_total", "Event loop stalls longer than LOOP_LAG_THRESHOLD_MS", ("route",))
+
+
+def _route(frame) -> str | None:
+    """Route of the ASGI request whose code is on the stack (the innermost frame with an HTTP scope)."""
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") == "http" and "method" in scope:
+            return route_name(scope)
+        frame = frame.f_back
+    return None
+
+
+class LoopMonitor:
+    def __init__(self):
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._heartbeat = 0.0
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        self._stopping.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await asyncio.to_thread(self._watchdog.join)
+        self._watchdog = None
+
+    def take_max(self) -> float:
+        """Worst lag since the previous call."""
+        value, self.max_lag = self.max_lag, self.lag
+        return value
+
+    async def run(self) -> None:
+        interval = settings.LOOP_LAG_INTERVAL_MS / 1000
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.lag = max(now - started - interval, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            self._heartbeat = now
+
+    def _watch(self) -> None:
+        interval = settings.LOOP_LAG_INTERVAL_MS / 1000
+        threshold = settings.LOOP_LAG_THRESHOLD_MS / 1000
+        reported = None
+        while not self._stopping.wait(min(interval, threshold) / 2):
+            heartbeat = self._heartbeat
+            # Следующий тик ожидается через interval после предыдущего
+            stalled = time.monotonic() - heartbeat - interval
+            if stalled >= threshold and heartbeat != reported:
+                reported = heartbeat
+                self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        route = _route(frame)
+        stack = "".join(traceback.format_stack(frame))
+        del frame
+        blocked_total.inc(route or "<none>")
+        logger.warning("Event loop blocked for %.0f ms while serving %s:\n%s",
+                       stalled * 1000, route or "no request", stack)
+
+
+monitor = LoopMonitor()
+
+metrics.gauge("event_loop_lag_seconds", "Event loop scheduling delay, last measurement", callback=lambda: monitor.lag)
+metrics.gauge("event_loop_lag_max_seconds", "Worst event loop scheduling delay since the previous scrape",
+              callback=monitor.take_max)
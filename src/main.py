@@ -1,15 +1,35 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from typing import Annotated
 from uuid import UUID
-from datetime import datetime, timedelta
-from jose import JWTError
+from datetime import date, datetime, timedelta
 
-from fastapi import Depends, FastAPI, HTTPException, Query, status
+import jwt
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import archive
+import changefeed
 import crud
-from auth import RoleChecker, create_access_token, get_current_user, verify_password, generate_reset_token, verify_reset_token, send_reset_email, get_password_hash
+import health
+import jwks
+import looplag
+import metrics
+import partitions
+import profiler
+import purger
+import shutdown
+import slowquery
+import specializations
+import tracing
+from auth import RoleChecker, create_access_token, get_current_user, get_verified_user, verify_password, generate_reset_token, verify_reset_token, send_reset_email, get_password_hash
+from compression import CompressionMiddleware
 from crud import (
     create_doctor,
     create_room,
@@ -18,43 +38,189 @@ from crud import (
     delete_user,
     get_appointments,
     get_doctor,
+    get_doctor_calendar,
     get_doctors,
     get_user,
     get_users,
-    get_user_by_email
+    get_user_appointments,
+    get_user_by_email,
+    get_user_by_phone
 )
-from database import AppointmentORM, DoctorORM, UserORM, get_session
+from config import settings
+from database import AppointmentORM, DoctorORM, UserORM, dispose_engine, get_session, init_engine
+from idempotency import IdempotencyMiddleware
+from querycount import QueryCountMiddleware
 from model import (
+    AppointmentChangeOp,
     AppointmentItem,
     AppointmentItemCreate,
+    AppointmentPage,
+    AppointmentScope,
+    ArchivedAppointment,
+    BatchResponse,
+    CurrentUser,
+    DoctorCalendarItem,
     DoctorItem,
     DoctorItemCreate,
     DoctorItemUpdate,
+    RoomItem,
     RoomItemCreate,
+    SpecializationItem,
     UserItem,
     UserItemCreate,
     UserItemUpdate,
     UserRole,
     PasswordResetRequest,
+    PhoneNumber,
+    dump_partial,
     PasswordResetConfirm
 )
+from warmup import warm_up
+
+CALENDAR_MAX_DAYS = 62
+ARCHIVE_MAX_DAYS = 366
+BATCH_MAX_IDS = 100
+PROFILE_MAX_SECONDS = 60
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health.readiness.reset()
+    # Ключи подписи читаются при старте: ошибка в JWT_SIGNING_KEY_FILES не дает воркеру подняться
+    jwks.keyring()
+    slowquery.start()
+    tracing.start()
+    if settings.LOOP_LAG_MONITOR_ENABLED:
+        looplag.monitor.start()
+    engine = init_engine()
+    # Пул открывается до DB_POOL_SIZE соединений до первого запроса
+    await warm_up(app, engine)
+    await partitions.maintainer.start(engine)
+    if settings.CHANGEFEED_ENABLED:
+        await changefeed.hub.start(engine)
+    if settings.PURGE_ENABLED:
+        purger.worker.start()
+    if settings.ARCHIVE_ENABLED:
+        archive.worker.start(engine)
+    shutdown.install_signal_handler()
+    try:
+        yield
+    finally:
+        # Без SIGTERM (перезапуск по MAX_REQUESTS, Ctrl+C) дренирование начинается здесь
+        shutdown.begin_drain()
+        await shutdown.requests.wait_idle(settings.GRACEFUL_TIMEOUT)
+        await archive.worker.stop()
+        await purger.worker.stop()
+        await partitions.maintainer.stop()
+        await changefeed.hub.stop()
+        await dispose_engine()
+        await looplag.monitor.stop()
+        slowquery.stop()
+        tracing.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+# Последний добавленный — внешний: повторы хранятся несжатыми
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Самый внешний: в счет запроса входят и запросы IdempotencyMiddleware
+app.add_middleware(QueryCountMiddleware)
+# Спан запроса охватывает все остальные слои
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(shutdown.InFlightMiddleware)
+
+
+def batch_ids(ids: Annotated[list[str], Query(description="UUIDs, repeated or comma-separated")]) -> list[UUID]:
+    """Parse `?ids=a,b&ids=c` into unique UUIDs, keeping the request order."""
+    try:
+        parsed = [UUID(part) for value in ids for part in value.split(",") if part]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be valid UUIDs") from None
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed or len(parsed) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"ids must contain from 1 to {BATCH_MAX_IDS} values")
+    return parsed
+
+
+class FieldSelector:
+    """`?fields=name,surname` -> frozenset of fields allowed for the response model."""
+
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+        self.allowed = frozenset(model.model_fields) - {"password"}
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     print("Starting up...")
-#     async with engine.begin() as conn:
-#         await conn.run_sync(Base.metadata.create_all)
-#     yield
-#     print("Shutting down...")
-#     async with engine.begin() as conn:
-#         await conn.run_sync(Base.metadata.drop_all)
+    def __call__(self, fields: str | None = Query(default=None, description="Comma-separated fields to return")) -> frozenset[str] | None:
+        if not fields:
+            return None
+        selected = frozenset(name.strip() for name in fields.split(",") if name.strip())
+        unknown = selected - self.allowed
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return selected
 
-app = FastAPI()#lifespan=lifespan)
+
+doctor_fields = FieldSelector(DoctorItem)
+user_fields = FieldSelector(UserItem)
+
+
+def sparse_response(model: type[BaseModel], fields: frozenset[str], data) -> Response:
+    return Response(content=dump_partial(model, fields, data), media_type="application/json")
+
+
+def batch_response(ids: list[UUID], rows: list) -> dict:
+    """Order rows as requested and report ids that were not found."""
+    by_id = {row.id: row for row in rows}
+    return {
+        "items": [by_id[item_id] for item_id in ids if item_id in by_id],
+        "missing": [item_id for item_id in ids if item_id not in by_id],
+    }
 
 @app.get("/healthcheck/")
 async def healthcheck():
     return {"status": "ok"}
 
+
+@app.get("/livez", include_in_schema=False)
+async def livez():
+    """The worker's event loop answers; no dependencies are checked."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz() -> JSONResponse:
+    """503 while the database, the pool or the event loop is unhealthy, or during shutdown."""
+    ready, checks = await health.readiness.check()
+    return JSONResponse({"status": "ready" if ready else "not ready", "checks": checks},
+                        status_code=200 if ready else 503)
+
+
+@app.get("/.well-known/jwks.json", include_in_schema=False)
+async def read_jwks() -> Response:
+    """Public keys that verify access tokens, by `kid`; empty while tokens are HS256."""
+    return Response(jwks.keyring().document, media_type="application/json",
+                    headers={"Cache-Control": f"public, max-age={settings.JWKS_CACHE_SECONDS}"})
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics() -> Response:
+    """Worker metrics in the Prometheus text format."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/debug/profile", dependencies=[Depends(RoleChecker([UserRole.admin], verified=True))], tags=["debug"])
+async def profile_worker(
+        seconds: float = Query(default=10, gt=0, le=PROFILE_MAX_SECONDS),
+        output: str = Query(default="collapsed", alias="format", pattern="^(collapsed|speedscope)$"),
+) -> Response:
+    """Sample the event loop of the worker serving this request; collapsed stacks or a speedscope profile."""
+    try:
+        result = await profiler.profile(seconds)
+    except profiler.ProfilerBusy as error:
+        raise HTTPException(status_code=409, detail=str(error)) from None
+    if output == "speedscope":
+        return JSONResponse(result.speedscope(name=f"worker {os.getpid()}"))
+    return Response(result.collapsed(), media_type="text/plain")
+
 # async def get_session() -> AsyncSession:
 #     """Asynchronous generator that yields database sessions."""
 #     async with async_session() as session:
@@ -67,19 +233,53 @@ async def doctor_create(data: DoctorItemCreate, db: Annotated[AsyncSession, Depe
 
 
 @app.get("/doctors/", response_model=list[DoctorItem], tags=["doctor"])
-async def read_doctors(db: Annotated[AsyncSession, Depends(get_session)], page: int = Query(ge=0, default=1), size: int = Query(ge=1, le=100, default=10)) -> list[DoctorORM]:
+async def read_doctors(db: Annotated[AsyncSession, Depends(get_session)], page: int = Query(ge=0, default=1), size: int = Query(ge=1, le=100, default=10), fields: frozenset[str] | None = Depends(doctor_fields)) -> list[DoctorORM]:
     """Retrieve a paginated list of doctors."""
-    return await get_doctors(db, page, size)
+    doctors = await get_doctors(db, page, size, fields)
+    if fields:
+        return sparse_response(DoctorItem, fields, doctors)
+    return doctors
+
+
+@app.get("/specializations", response_model=list[SpecializationItem], tags=["doctor"])
+async def read_specializations() -> Response:
+    """Specializations with the number of doctors, in total and per category."""
+    return Response(await specializations.counts.get(), media_type="application/json")
+
+
+@app.get("/doctors/batch", response_model=BatchResponse[DoctorItem], tags=["doctor"])
+async def read_doctors_batch(ids: Annotated[list[UUID], Depends(batch_ids)], db: Annotated[AsyncSession, Depends(get_session)]):
+    """Resolve many doctors in one query, e.g. for a page of appointments."""
+    return batch_response(ids, await crud.get_doctors_by_ids(db, ids))
 
 
 @app.get("/doctors/{doctor_id}", response_model=DoctorItem, tags=["doctor"])
-async def read_doctor(doctor_id: UUID, db: Annotated[AsyncSession, Depends(get_session)]):
-    doctor = await get_doctor(db, doctor_id)
+async def read_doctor(doctor_id: UUID, db: Annotated[AsyncSession, Depends(get_session)], fields: frozenset[str] | None = Depends(doctor_fields)):
+    doctor = await get_doctor(db, doctor_id, fields)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
+    if fields:
+        return sparse_response(DoctorItem, fields, doctor)
     return doctor
 
 
+@app.get("/doctors/{doctor_id}/appointments", response_model=list[DoctorCalendarItem], tags=["doctor"])
+async def read_doctor_calendar(
+        doctor_id: UUID,
+        db: Annotated[AsyncSession, Depends(get_session)],
+        date_from: date | None = Query(default=None, alias="from"),
+        date_to: date | None = Query(default=None, alias="to"),
+):
+    """Doctor's appointments between `from` and `to` inclusive (default: a week from today)."""
+    date_from = date_from or date.today()
+    date_to = date_to or date_from + timedelta(days=6)
+    if date_to < date_from:
+        raise HTTPException(status_code=422, detail="'to' must not be earlier than 'from'")
+    if (date_to - date_from).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"Date range is limited to {CALENDAR_MAX_DAYS} days")
+    return await get_doctor_calendar(db, doctor_id, date_from, date_to)
+
+
 @app.patch("/doctors/{doctor_id}", response_model=DoctorItemCreate, tags=["doctor"])
 async def doctor_update(doctor_id: UUID, doctor: DoctorItemUpdate, db: Annotated[AsyncSession, Depends(get_session)]) -> DoctorORM:
     """Retrieve details of a specific doctor by their ID."""
@@ -109,7 +309,7 @@ async def login(data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     if not verify_password(data.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный пароль")
 
-    access_token = create_access_token(subject=str(user.id), role= user.role, email= user.email)
+    access_token = create_access_token(subject=str(user.id), role= user.role, email= user.email, name=user.name, disabled=user.disabled)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -119,15 +319,56 @@ async def user_create(data: UserItemCreate, db: Annotated[AsyncSession, Depends(
 
 
 @app.get("/users/", response_model=list[UserItem], dependencies=[Depends(RoleChecker([UserRole.admin]))], tags=["user"])
-async def read_users(db: Annotated[AsyncSession, Depends(get_session)], page: int = Query(ge=0, default=1), size: int = Query(ge=1, le=100, default=10)) -> list:
-    return await get_users(db, page, size)
+async def read_users(db: Annotated[AsyncSession, Depends(get_session)], page: int = Query(ge=0, default=1), size: int = Query(ge=1, le=100, default=10), fields: frozenset[str] | None = Depends(user_fields)) -> list:
+    users = await get_users(db, page, size, fields)
+    if fields:
+        return sparse_response(UserItem, fields, users)
+    return users
+
+
+@app.get("/users/batch", response_model=BatchResponse[UserItem], dependencies=[Depends(RoleChecker([UserRole.admin]))], tags=["user"])
+async def read_users_batch(ids: Annotated[list[UUID], Depends(batch_ids)], db: Annotated[AsyncSession, Depends(get_session)]):
+    return batch_response(ids, await crud.get_users_by_ids(db, ids))
+
+
+@app.get("/users/by-phone/{phone}", response_model=UserItem, dependencies=[Depends(RoleChecker([UserRole.admin]))], tags=["user"])
+async def read_user_by_phone(phone: PhoneNumber, db: Annotated[AsyncSession, Depends(get_session)]):
+    """Find a user by phone number in any accepted format, e.g. for the reception desk."""
+    user = await get_user_by_phone(db, phone)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+@app.get("/users/me/appointments", response_model=AppointmentPage, tags=["user"])
+async def read_my_appointments(
+        db: Annotated[AsyncSession, Depends(get_session)],
+        current_user: Annotated[CurrentUser, Depends(get_current_user)],
+        scope: AppointmentScope = AppointmentScope.upcoming,
+        size: int = Query(ge=1, le=100, default=10),
+        cursor: str | None = None,
+):
+    """Current user's own appointments, paged with an opaque `cursor` from the previous page."""
+    try:
+        position = crud.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+
+    items = await get_user_appointments(db, current_user.id, scope, size + 1, position)
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = crud.encode_cursor(items[-1]["date"], items[-1]["id"])
+    return AppointmentPage(items=items, next_cursor=next_cursor)
 
 
 @app.get("/users/{user_id}", response_model=UserItem, tags=["user"])
-async def read_user(user_id: UUID, db: Annotated[AsyncSession, Depends(get_session)]):
-    user = await get_user(db, user_id)
+async def read_user(user_id: UUID, db: Annotated[AsyncSession, Depends(get_session)], fields: frozenset[str] | None = Depends(user_fields)):
+    user = await get_user(db, user_id, fields)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if fields:
+        return sparse_response(UserItem, fields, user)
     return user
 
 
@@ -148,7 +389,7 @@ async def user_delete(user_id: UUID, db: Annotated[AsyncSession, Depends(get_ses
 
 
 @app.post("/appointments", tags=["appointments"])
-async def create_appointment(appointment_data: AppointmentItemCreate, db: AsyncSession = Depends(get_session), current_user: UserORM = Depends(get_current_user)):
+async def create_appointment(appointment_data: AppointmentItemCreate, db: AsyncSession = Depends(get_session), current_user: UserORM = Depends(get_verified_user)):
     # Проверка существования врача
     doctor = await get_doctor(db, appointment_data.doctor_id)
     if not doctor:
@@ -158,11 +399,12 @@ async def create_appointment(appointment_data: AppointmentItemCreate, db: AsyncS
     new_appointment = AppointmentORM(
         doctor_id=appointment_data.doctor_id,
         user_id=current_user.id,
-        date=int(appointment_data.date.strftime('%Y%m%d')),
+        date=appointment_data.date,
         room_id=appointment_data.room_id
     )
 
     db.add(new_appointment)
+    await crud.record_appointment_change(db, new_appointment, AppointmentChangeOp.created)
     await db.commit()
     await db.refresh(new_appointment)
 
@@ -174,12 +416,44 @@ async def room_create(data: RoomItemCreate, db: Annotated[AsyncSession, Depends(
     return await create_room(db, data)
 
 
+@app.get("/rooms/batch", response_model=BatchResponse[RoomItem], tags=["room"])
+async def read_rooms_batch(ids: Annotated[list[UUID], Depends(batch_ids)], db: Annotated[AsyncSession, Depends(get_session)]):
+    return batch_response(ids, await crud.get_rooms_by_ids(db, ids))
+
+
 @app.get("/appointments/", response_model=list[AppointmentItem], tags=["appointments"])
 async def read_appointments(db: Annotated[AsyncSession, Depends(get_session)], page: int = Query(ge=0, default=1), size: int = Query(ge=1, le=100, default=10)) -> list[AppointmentORM]:
     """Retrieve a paginated list of doctors."""
     return await get_appointments(db, page, size)
 
 
+@app.get("/appointments/archive", response_model=list[ArchivedAppointment], dependencies=[Depends(RoleChecker([UserRole.admin]))], tags=["appointments"])
+async def read_appointment_archive(
+        date_from: date = Query(alias="from"),
+        date_to: date = Query(alias="to"),
+):
+    """Archived appointments between `from` and `to` inclusive; only overlapping segments are read."""
+    if date_to < date_from:
+        raise HTTPException(status_code=422, detail="'to' must not be earlier than 'from'")
+    if (date_to - date_from).days >= ARCHIVE_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"Date range is limited to {ARCHIVE_MAX_DAYS} days")
+    return await asyncio.to_thread(archive.store.read, date_from, date_to)
+
+
+@app.get("/appointments/changes", tags=["appointments"])
+async def appointment_changes(
+        since: int | None = Query(default=None, ge=0, description="Resume token: `id` of the last received event"),
+        doctor_id: UUID | None = None,
+        last_event_id: Annotated[int | None, Header(ge=0)] = None,
+) -> StreamingResponse:
+    """Server-Sent Events stream of appointment changes; replays changes after `since` first."""
+    return StreamingResponse(
+        changefeed.event_stream(since if since is not None else last_event_id, doctor_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/password-reset")
 async def request_password_reset(
         request: PasswordResetRequest,
@@ -209,7 +483,7 @@ async def confirm_password_reset(
     # Проверка токена
     try:
         email = verify_reset_token(form_data.token)
-    except JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(status_code=400, detail="Invalid token")
 
     user = await get_user_by_email(db, email)
@@ -0,0 +1,72 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+
+Each worker process has its own registry; scrape every worker (or sum in
+Prometheus) to get totals.
+"""
+from collections.abc import Callable
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self.values.get(label_values, 0)
+
+
+class Gauge(Counter):
+    """Gauge with either explicitly set values or a callback evaluated on scrape."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), callback: Callable[[], float] | None = None):
+        super().__init__(name, help, labels)
+        self.callback = callback
+
+    def set(self, value: float, *label_values: str) -> None:
+        self.values[label_values] = value
+
+
+REGISTRY: dict[str, Counter] = {}
+
+
+def _register(metric: Counter) -> Counter:
+    # Повторная регистрация (reload модуля в тестах) возвращает существующую метрику
+    return REGISTRY.setdefault(metric.name, metric)
+
+
+def counter(name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels: tuple[str, ...] = (), callback: Callable[[], float] | None = None) -> Gauge:
+    return _register(Gauge(name, help, labels, callback))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values, strict=True))
+    return "{" + pairs + "}"
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if isinstance(metric, Gauge) and metric.callback is not None:
+            lines.append(f"{metric.name} {metric.callback()}")
+            continue
+        for label_values, value in sorted(metric.values.items()):
+            lines.append(f"{metric.name}{_format_labels(metric.labels, label_values)} {value}")
+    return "\n".join(lines) + "\n"
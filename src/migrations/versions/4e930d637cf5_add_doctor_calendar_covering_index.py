@@ -0,0 +1,34 @@
+"""add covering index for doctor calendar
+
+Revision ID: 4e930d637cf5
+Revises: a59ae1bc08de
+Create Date: 2026-10-19 11:03:27.551860
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '4e930d637cf5'
+down_revision: Union[str, None] = 'a59ae1bc08de'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в appointments, но не работает в транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_appointments_doctor_id_date',
+            'appointments',
+            ['doctor_id', 'date'],
+            postgresql_include=['room_id', 'user_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_appointments_doctor_id_date', table_name='appointments', postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""add keyset index for user appointments
+
+Revision ID: 5ec0128d677e
+Revises: 4e930d637cf5
+Create Date: 2026-10-19 11:48:05.317742
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5ec0128d677e'
+down_revision: Union[str, None] = '4e930d637cf5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_appointments_user_id_date_id',
+            'appointments',
+            ['user_id', 'date', 'id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_appointments_user_id_date_id', table_name='appointments', postgresql_concurrently=True)
@@ -0,0 +1,85 @@
+"""add specialization catalog with per-category doctor counts
+
+Revision ID: 8c2f4a6d1e53
+Revises: d5f0b7a91c42
+Create Date: 2026-10-19 17:21:06.915342
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4a6d1e53'
+down_revision: Union[str, None] = 'd5f0b7a91c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Те же правила, что и specializations.normalize: любые пробельные символы схлопываются в один пробел
+# (до обрезки — иначе табуляция или перевод строки по краям станут пробелом), ключ в нижнем регистре
+NAME = r"btrim(regexp_replace(specialization, '\s+', ' ', 'g'))"
+
+# Из нескольких написаний одной специальности в каталог идет самое частое
+BACKFILL = (
+    f"""
+    INSERT INTO specializations (key, name)
+    SELECT DISTINCT ON (lower(name)) lower(name), name
+    FROM (SELECT {NAME} AS name, count(*) AS doctors FROM doctors GROUP BY 1) AS spellings
+    ORDER BY lower(name), doctors DESC, name
+    """,
+    f"""
+    UPDATE doctors
+    SET specialization_id = specializations.id
+    FROM specializations
+    WHERE specializations.key = lower({NAME})
+    """,
+    """
+    INSERT INTO specialization_counts (specialization_id, category, doctors)
+    SELECT specialization_id, category, count(*)
+    FROM doctors
+    WHERE deleted_at IS NULL
+    GROUP BY specialization_id, category
+    """,
+)
+
+
+def upgrade():
+    op.create_table(
+        'specializations',
+        sa.Column('id', sa.Integer(), sa.Identity(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('key'),
+    )
+    op.create_table(
+        'specialization_counts',
+        sa.Column('specialization_id', sa.Integer(), nullable=False),
+        sa.Column('category', postgresql.ENUM(name='categoryenum', create_type=False), nullable=False),
+        sa.Column('doctors', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['specialization_id'], ['specializations.id']),
+        sa.PrimaryKeyConstraint('specialization_id', 'category'),
+    )
+    op.add_column('doctors', sa.Column('specialization_id', sa.Integer(), nullable=True))
+
+    # Счетчики должны совпасть с doctors: запись врачей ждет конца миграции
+    op.execute('LOCK TABLE doctors IN SHARE ROW EXCLUSIVE MODE')
+    for statement in BACKFILL:
+        op.execute(statement)
+
+    op.alter_column('doctors', 'specialization_id', nullable=False)
+    op.create_foreign_key(
+        'doctors_specialization_id_fkey', 'doctors', 'specializations', ['specialization_id'], ['id']
+    )
+    op.create_index('ix_doctors_specialization_id', 'doctors', ['specialization_id'])
+
+
+def downgrade():
+    op.drop_index('ix_doctors_specialization_id', table_name='doctors')
+    op.drop_constraint('doctors_specialization_id_fkey', 'doctors', type_='foreignkey')
+    op.drop_column('doctors', 'specialization_id')
+    op.drop_table('specialization_counts')
+    op.drop_table('specializations')
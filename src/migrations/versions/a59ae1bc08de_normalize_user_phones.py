@@ -0,0 +1,50 @@
+"""normalize user phones to E.164
+
+Revision ID: a59ae1bc08de
+Revises: f3d6f88fea3a
+Create Date: 2026-10-19 10:12:41.208113
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a59ae1bc08de'
+down_revision: Union[str, None] = 'f3d6f88fea3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Те же правила, что и model.normalize_phone: необязательный префикс +375/80
+# и 9 цифр номера; все остальные символы — разделители
+NORMALIZED = r"'+375' || right(regexp_replace(phone, '\D', '', 'g'), 9)"
+CONVERTIBLE = r"regexp_replace(phone, '\D', '', 'g') ~ '^(375|80)?\d{9}$'"
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # Номера, совпадающие после нормализации, нарушат unique — разбираем их вручную
+    duplicates = conn.execute(sa.text(f"""
+        SELECT {NORMALIZED} AS normalized, array_agg(id) AS ids
+        FROM users
+        WHERE {CONVERTIBLE}
+        GROUP BY 1
+        HAVING count(*) > 1
+    """)).fetchall()
+    if duplicates:
+        details = "; ".join(f"{row.normalized}: {row.ids}" for row in duplicates)
+        raise RuntimeError(f"Duplicate phone numbers after normalization: {details}")
+
+    op.execute(f"""
+        UPDATE users
+        SET phone = {NORMALIZED}
+        WHERE {CONVERTIBLE} AND phone <> {NORMALIZED}
+    """)
+
+
+def downgrade():
+    # Исходное написание номеров не сохраняется, откатывать нечего
+    pass
@@ -0,0 +1,38 @@
+"""add appointment change log for the SSE feed
+
+Revision ID: c7d2e91a4b36
+Revises: 5ec0128d677e
+Create Date: 2026-10-19 13:05:22.640318
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e91a4b36'
+down_revision: Union[str, None] = '5ec0128d677e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # seq — токен возобновления ленты (since / Last-Event-ID)
+    op.create_table(
+        'appointment_changes',
+        sa.Column('seq', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('op', sa.String(length=16), nullable=False),
+        sa.Column('appointment_id', sa.UUID(), nullable=False),
+        sa.Column('doctor_id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=True),
+        sa.Column('room_id', sa.UUID(), nullable=True),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('seq'),
+    )
+
+
+def downgrade():
+    op.drop_table('appointment_changes')
@@ -0,0 +1,117 @@
+"""partition appointments by month and store native dates
+
+Revision ID: d5f0b7a91c42
+Revises: e4a8c1f73b25
+Create Date: 2026-10-19 16:02:11.384120
+
+"""
+from collections.abc import Sequence
+from datetime import date
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f0b7a91c42'
+down_revision: Union[str, None] = 'e4a8c1f73b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперед создать сразу (как APPOINTMENT_PARTITIONS_AHEAD по умолчанию)
+MONTHS_AHEAD = 3
+INDEXES = ('ix_appointments_doctor_id_date', 'ix_appointments_user_id_date_id')
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _appointment_columns() -> list[sa.Column]:
+    return [
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('doctor_id', sa.UUID(), nullable=True),
+        sa.Column('user_id', sa.UUID(), nullable=True),
+        sa.Column('room_id', sa.UUID(), nullable=True),
+        sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE', name='appointments_doctor_id_fkey'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE', name='appointments_user_id_fkey'),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='CASCADE', name='appointments_room_id_fkey'),
+    ]
+
+
+def _create_indexes() -> None:
+    # На партиционированной таблице CONCURRENTLY недоступен; индексы создаются в каждой партиции
+    op.create_index('ix_appointments_doctor_id_date', 'appointments', ['doctor_id', 'date'],
+                    postgresql_include=['room_id', 'user_id'])
+    op.create_index('ix_appointments_user_id_date_id', 'appointments', ['user_id', 'date', 'id'])
+
+
+def _rename_to_legacy() -> None:
+    op.rename_table('appointments', 'appointments_legacy')
+    # Имена PK и индексов занимают пространство имен схемы — освобождаем их для новой таблицы
+    op.execute('ALTER TABLE appointments_legacy RENAME CONSTRAINT appointments_pkey TO appointments_legacy_pkey')
+    for name in INDEXES:
+        op.execute(f'ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy')
+
+
+def upgrade():
+    bind = op.get_bind()
+    _rename_to_legacy()
+
+    op.create_table(
+        'appointments',
+        *_appointment_columns(),
+        sa.PrimaryKeyConstraint('id', 'date', name='appointments_pkey'),
+        postgresql_partition_by='RANGE (date)',
+    )
+    op.execute('CREATE TABLE appointments_default PARTITION OF appointments DEFAULT')
+
+    # Исходная схема хранила дату как integer YYYYMMDD — на старых базах она могла остаться такой
+    data_type = bind.execute(sa.text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'appointments_legacy' AND column_name = 'date'"
+    )).scalar()
+    date_expr = "to_date(date::text, 'YYYYMMDD')" if data_type == 'integer' else 'date'
+
+    # Партиции от первого месяца с данными до текущего + MONTHS_AHEAD; строки сразу ложатся по месяцам
+    first = bind.execute(sa.text(f'SELECT min({date_expr}) FROM appointments_legacy')).scalar()
+    current = date.today().replace(day=1)
+    month = min(first.replace(day=1), current) if first else current
+    last = _add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE appointments_y{month.year}m{month.month:02d} PARTITION OF appointments "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    op.execute(
+        f'INSERT INTO appointments (id, date, doctor_id, user_id, room_id) '
+        f'SELECT id, {date_expr}, doctor_id, user_id, room_id FROM appointments_legacy'
+    )
+    _create_indexes()
+    op.drop_table('appointments_legacy')
+
+
+def downgrade():
+    op.rename_table('appointments', 'appointments_partitioned')
+    op.execute('ALTER TABLE appointments_partitioned RENAME CONSTRAINT appointments_pkey TO appointments_partitioned_pkey')
+    for name in INDEXES:
+        op.execute(f'ALTER INDEX {name} RENAME TO {name}_partitioned')
+
+    # Возвращаем обычную таблицу с датой типа date — ее и ожидает модель до партиционирования
+    op.create_table(
+        'appointments',
+        *_appointment_columns(),
+        sa.PrimaryKeyConstraint('id', name='appointments_pkey'),
+    )
+    op.execute(
+        'INSERT INTO appointments (id, date, doctor_id, user_id, room_id) '
+        'SELECT id, date, doctor_id, user_id, room_id FROM appointments_partitioned'
+    )
+    _create_indexes()
+    # Партиции удаляются вместе с родительской таблицей
+    op.drop_table('appointments_partitioned')
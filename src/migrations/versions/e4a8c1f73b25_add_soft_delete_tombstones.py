@@ -0,0 +1,44 @@
+"""add soft delete tombstones to doctors and users
+
+Revision ID: e4a8c1f73b25
+Revises: 9b3f0d6e2a71
+Create Date: 2026-10-19 14:31:47.502916
+
+"""
+from collections.abc import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a8c1f73b25'
+down_revision: Union[str, None] = '9b3f0d6e2a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('doctors', 'users')
+
+
+def upgrade():
+    # Nullable-колонка без default — только изменение каталога, без перезаписи таблицы
+    for table in TABLES:
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f'ix_{table}_deleted_at',
+                table,
+                ['deleted_at'],
+                postgresql_where=sa.text('deleted_at IS NOT NULL'),
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(f'ix_{table}_deleted_at', table_name=table, postgresql_concurrently=True)
+    for table in TABLES:
+        op.drop_column(table, 'deleted_at')
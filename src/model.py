@@ -1,20 +1,50 @@
 import re
 from datetime import date
 from enum import StrEnum
-from typing import Optional
+from functools import cache
+from typing import Annotated, Generic, Optional, TypeVar
 from uuid import UUID
 
 from pydantic import (
+    AfterValidator,
     BaseModel,
     ConfigDict,
     EmailStr,
     Field,
     StrictInt,
     StrictStr,
+    TypeAdapter,
     computed_field,
+    create_model,
     field_validator,
 )
 
+PHONE_PATTERN = re.compile(
+    r"""
+    ^(\+375|80)?          # Код страны/оператора
+    [\s\-\(\)]*           # Допустимые разделители
+    (\d{2})               # Первые 2 цифры
+    [\s\-\(\)]*           # Разделители
+    (\d{3})               # Следующие 3 цифры
+    [\s\-\(\)]*           # Разделители
+    (\d{2})               # Предпоследние 2 цифры
+    [\s\-\(\)]*           # Разделители
+    (\d{2})$              # Последние 2 цифры
+    """,
+    re.VERBOSE,
+)
+
+
+def normalize_phone(value: str) -> str:
+    """Validate a phone number and return its canonical E.164 form (+375XXXXXXXXX)."""
+    match = PHONE_PATTERN.fullmatch(value)
+    if not match:
+        raise ValueError("Invalid phone number format")
+    return "+375" + "".join(match.groups()[1:])
+
+
+PhoneNumber = Annotated[str, AfterValidator(normalize_phone)]
+
 
 class CategoryEnum(StrEnum):
     """Medical doctor qualification categories"""
@@ -31,6 +61,12 @@ class UserRole(StrEnum):
     doctor = "doctor"
 
 
+class AppointmentScope(StrEnum):
+    """Which of the user's appointments to list"""
+    upcoming = "upcoming"
+    past = "past"
+
+
 class DoctorItemCreate(BaseModel):
     name: StrictStr = Field(min_length=3, max_length=10)
     surname: StrictStr = Field(min_length=3, max_length=10)
@@ -73,25 +109,9 @@ class BaseUser(BaseModel):
 
     @field_validator('phone')
     def validate_phone_number(cls, value: str | None):
-        pattern = r"""
-                ^(\+375|80)?          # Код страны/оператора
-                [\s\-\(\)]*          # Допустимые разделители
-                (\d{2})               # Первые 2 цифры
-                [\s\-\(\)]*           # Разделители
-                (\d{3})              # Следующие 3 цифры
-                [\s\-\(\)]*           # Разделители
-                (\d{2})              # Предпоследние 2 цифры
-                [\s\-\(\)]*           # Разделители
-                (\d{2})$             # Последние 2 цифры
-            """
         if value is None:
             return None
-        if not re.fullmatch(pattern, value, flags=re.VERBOSE):
-            raise ValueError("Invalid phone number format")
-        cleaned_value = re.sub(r'\D', '', value)
-        if not (7 <= len(cleaned_value) <= 15):
-            raise ValueError('Phone number must be between 7 and 15 digits.')
-        return value
+        return normalize_phone(value)
 
 
 class UserItemCreate(BaseUser):
@@ -158,26 +178,101 @@ class AppointmentItemCreate(BaseModel):
     doctor_id: UUID
     room_id: UUID
 
-    @field_validator('date', mode='before')
-    def parse_date(cls, value):
-        if isinstance(value, int):
-            # Преобразуем из формата YYYYMMDD в date
-            return date(
-                year=value // 10000,
-                month=(value % 10000) // 100,
-                day=value % 100
-            )
-        return value
 
 
 class AppointmentItem(AppointmentItemCreate):
     id: UUID
 
 
+class ArchivedAppointment(BaseModel):
+    """Appointment read back from the cold archive."""
+    id: UUID
+    date: date
+    doctor_id: UUID | None
+    user_id: UUID | None
+    room_id: UUID | None
+
+
+class AppointmentChangeOp(StrEnum):
+    created = "created"
+    deleted = "deleted"
+
+
+class AppointmentChange(BaseModel):
+    """One event of the appointment change feed; `seq` is the resume token."""
+    model_config = ConfigDict(from_attributes=True)
+
+    seq: int
+    op: AppointmentChangeOp
+    appointment_id: UUID
+    doctor_id: UUID
+    user_id: UUID | None = None
+    room_id: UUID | None = None
+    date: date
+
+
+class AppointmentPage(BaseModel):
+    """One keyset page; pass `next_cursor` back as `cursor` to get the next one."""
+    items: list[AppointmentItem]
+    next_cursor: str | None = None
+
+
+ItemT = TypeVar("ItemT")
+
+
+class BatchResponse(BaseModel, Generic[ItemT]):
+    """Batch lookup result in the requested order plus the ids that were not found."""
+    items: list[ItemT]
+    missing: list[UUID]
+
+
+class DoctorCalendarItem(BaseModel):
+    """Compact appointment row of a doctor's calendar."""
+    date: date
+    room_id: UUID
+    user_id: UUID
+
+
+class SpecializationItem(BaseModel):
+    """Catalog entry with the number of doctors, in total and per category."""
+    id: int
+    name: str
+    doctors: int
+    categories: dict[CategoryEnum, int]
+
+
 class PasswordResetRequest(BaseModel):
     email: EmailStr
 
 
 class PasswordResetConfirm(BaseModel):
     token: str
-    new_password: str
\ No newline at end of file
+    new_password: str
+
+
+@cache
+def partial_model(model: type[BaseModel], fields: frozenset[str]) -> type[BaseModel]:
+    """
+    Trimmed copy of `model` with only `fields` (plus `id`) for `?fields=` sparse fieldsets.
+
+    Built once per field combination.
+    """
+    names = [name for name in model.model_fields if name in fields or name == "id"]
+    return create_model(
+        f"{model.__name__}Partial",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (model.model_fields[name].annotation, ...) for name in names},
+    )
+
+
+@cache
+def _partial_list_adapter(model: type[BaseModel], fields: frozenset[str]) -> TypeAdapter:
+    return TypeAdapter(list[partial_model(model, fields)])
+
+
+def dump_partial(model: type[BaseModel], fields: frozenset[str], data) -> bytes:
+    """Serialize an ORM object or a list of them with only the selected fields."""
+    if isinstance(data, list):
+        adapter = _partial_list_adapter(model, fields)
+        return adapter.dump_json(adapter.validate_python(data))
+    return partial_model(model, fields).model_validate(data).model_dump_json().encode()
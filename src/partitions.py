@@ -0,0 +1,119 @@
+"""
+Monthly range partitions of the appointments table.
+
+`appointments` is partitioned by RANGE (date), one partition per calendar
+month (appointments_y2026m11) plus appointments_default for dates outside
+the created range. PartitionMaintainer creates the partitions for the
+current month and APPOINTMENT_PARTITIONS_AHEAD months ahead at startup and
+then every PARTITION_CHECK_INTERVAL_SECONDS. If the default partition already
+holds rows for a new month, those rows are moved into the new partition.
+"""
+import asyncio
+import contextlib
+import logging
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT = "appointments"
+DEFAULT_PARTITION = "appointments_default"
+# Один воркер создает партиции, остальные ждут и видят, что все уже есть
+LOCK_ID = 0x61707074
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_y{month.year}m{month.month:02d}"
+
+
+async def ensure_partition(conn: AsyncConnection, month: date) -> bool:
+    """Create the partition for `month` if missing; returns True when it was created."""
+    name = partition_name(month)
+    if (await conn.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar() is not None:
+        return False
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = {"lower": month, "upper": add_months(month, 1)}
+
+    # Запись в default ждет конца транзакции: строка этого месяца, вставленная после проверки,
+    # сорвала бы CREATE ... PARTITION OF или ATTACH PARTITION
+    await conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN SHARE ROW EXCLUSIVE MODE"))
+    stray = (await conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper)"), bounds
+    )).scalar()
+    if not stray:
+        await conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        return True
+
+    # В default уже есть строки этого месяца: переносим их и присоединяем таблицу как партицию
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    await conn.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    return True
+
+
+async def ensure_partitions(engine: AsyncEngine, today: date | None = None) -> list[str]:
+    """Make sure partitions exist from the current month up to APPOINTMENT_PARTITIONS_AHEAD months ahead."""
+    first = month_start(today or date.today())
+    created = []
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": LOCK_ID})
+        for offset in range(settings.APPOINTMENT_PARTITIONS_AHEAD + 1):
+            month = add_months(first, offset)
+            if await ensure_partition(conn, month):
+                created.append(partition_name(month))
+    if created:
+        logger.info("Created appointment partitions: %s", ", ".join(created))
+    return created
+
+
+class PartitionMaintainer:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self, engine: AsyncEngine) -> None:
+        try:
+            await ensure_partitions(engine)
+        except Exception:
+            # Как и прогрев, не мешаем старту: строки временно попадут в appointments_default
+            logger.warning("Failed to create appointment partitions at startup", exc_info=True)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run(engine))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def run(self, engine: AsyncEngine) -> None:
+        while True:
+            await asyncio.sleep(settings.PARTITION_CHECK_INTERVAL_SECONDS)
+            try:
+                await ensure_partitions(engine)
+            except Exception:
+                logger.exception("Failed to create appointment partitions")
+
+
+maintainer = PartitionMaintainer()
@@ -0,0 +1,109 @@
+"""
+On-demand sampling profiler for a running worker.
+
+A background thread reads the stack of the event loop thread from
+`sys._current_frames()` every PROFILE_SAMPLE_INTERVAL_MS. The profiled code
+is not instrumented, so the overhead is one stack walk per sample. Samples
+are aggregated by call stack and rendered as:
+
+- collapsed stacks, "frame;frame;frame count" per line, the input format of
+  flamegraph.pl and speedscope;
+- a speedscope "sampled" profile (https://www.speedscope.app).
+
+Only one profile runs per worker at a time; `profile()` raises
+ProfilerBusy while another one is in progress.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import settings
+
+# Кадр стека: (функция, файл, первая строка функции)
+Frame = tuple[str, str, int]
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class Profile:
+    def __init__(self, stacks: Counter[tuple[Frame, ...]], interval: float, started: float, duration: float):
+        self.stacks = stacks
+        self.interval = interval
+        self.started = started
+        self.duration = duration
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        lines = [
+            ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def speedscope(self, name: str = "worker") -> dict:
+        frames: dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name, "file": filename, "line": line}
+                                  for name, filename, line in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "exporter": __name__,
+        }
+
+
+def _stack(frame) -> tuple[Frame, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def sample(thread_id: int, seconds: float, interval: float) -> Profile:
+    """Sample the stack of `thread_id` every `interval` seconds for `seconds` (blocks the caller)."""
+    stacks: Counter[tuple[Frame, ...]] = Counter()
+    started = time.time()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        stacks[_stack(frame)] += 1
+        # Ссылку на кадр не держим: иначе его локальные переменные живут до следующего сэмпла
+        del frame
+        time.sleep(interval)
+    return Profile(stacks, interval, started, time.time() - started)
+
+
+async def profile(seconds: float) -> Profile:
+    """Profile the event loop thread of this worker for `seconds`."""
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this worker")
+    try:
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        return await asyncio.to_thread(sample, threading.get_ident(), seconds, interval)
+    finally:
+        _lock.release()
@@ -0,0 +1,174 @@
+"""
+Background purge of soft-deleted doctors and users.
+
+DELETE endpoints only set `deleted_at` (see database.SoftDeleteMixin). This
+worker removes the tombstoned rows for real: appointments first, in batches
+of PURGE_BATCH_SIZE rows per short transaction with PURGE_BATCH_DELAY_SECONDS
+between batches, so bookings are never blocked for long. The entity row goes
+last. Progress is logged and exported as metrics.
+
+Each entity is purged by one worker at a time: it is claimed with a
+session-level pg_try_advisory_lock, and other workers skip to the next
+tombstone. Every deleted appointment is written to the change feed as a
+`deleted` event in the same transaction as its batch.
+"""
+import asyncio
+import contextlib
+import logging
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import delete, func, select, text
+
+import crud
+import database
+import metrics
+from config import settings
+from database import AppointmentORM, DoctorORM, UserORM
+from model import AppointmentChangeOp
+
+logger = logging.getLogger(__name__)
+
+# Порядок обхода: таблица с надгробиями и FK записей на нее
+TARGETS = ((DoctorORM, AppointmentORM.doctor_id), (UserORM, AppointmentORM.user_id))
+# Ключ advisory-блокировки; второй ключ — hashtext(id) надгробия
+LOCK_ID = 0x61707067
+# Сколько старейших надгробий просматривать, если первые заняты другими воркерами
+CANDIDATES = 10
+
+purged_total = metrics.counter("purge_rows_total", "Rows physically deleted by the purger", ("table",))
+pending = metrics.gauge("purge_pending_tombstones", "Soft-deleted rows waiting to be purged", ("table",))
+
+
+class Purger:
+    def __init__(self):
+        self.progress: dict = {"state": "stopped"}
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()  # событие привязывается к текущему циклу
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self.progress = {"state": "stopped"}
+
+    async def run(self) -> None:
+        while True:
+            try:
+                purged = await self.purge_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Purge failed, retrying later")
+                purged = False
+            if purged:
+                continue
+            self.progress = {"state": "idle"}
+            self._wake.clear()
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), settings.PURGE_IDLE_SECONDS)
+
+    async def purge_next(self) -> bool:
+        """Purge the oldest tombstoned entity not taken by another worker; returns False when there is nothing to do."""
+        for orm, foreign_key in TARGETS:
+            async with database.async_session() as db:
+                result = await db.execute(
+                    select(orm.id, func.count().over())
+                    .where(orm.deleted_at.is_not(None))
+                    .order_by(orm.deleted_at.asc())
+                    .limit(CANDIDATES)
+                    .execution_options(include_deleted=True)
+                )
+                rows = result.all()
+            pending.set(rows[0][1] if rows else 0, orm.__tablename__)
+            for entity_id, _ in rows:
+                if await self.purge_claimed(orm, foreign_key, entity_id):
+                    return True
+        return False
+
+    async def purge_claimed(self, orm, foreign_key, entity_id: UUID) -> bool:
+        """Purge the entity under an advisory lock; returns False if another worker owns it or it is gone."""
+        lock = {"lock": LOCK_ID, "entity": str(entity_id)}
+        async with database.engine.connect() as conn:
+            claimed = (await conn.execute(text("SELECT pg_try_advisory_lock(:lock, hashtext(:entity))"), lock)).scalar()
+            # Блокировка сессионная и переживает commit; не держим транзакцию открытой на время чистки
+            await conn.commit()
+            if not claimed:
+                return False
+            try:
+                # Пока мы ждали, другой воркер мог успеть удалить надгробие целиком
+                async with database.async_session() as db:
+                    tombstoned = (await db.execute(
+                        select(orm.id)
+                        .where(orm.id == entity_id, orm.deleted_at.is_not(None))
+                        .execution_options(include_deleted=True)
+                    )).first() is not None
+                if tombstoned:
+                    await self.purge_entity(orm, foreign_key, entity_id)
+                return tombstoned
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:lock, hashtext(:entity))"), lock)
+                await conn.commit()
+
+    async def purge_entity(self, orm, foreign_key, entity_id: UUID) -> int:
+        """Delete the entity's appointments batch by batch, then the entity itself."""
+        table = orm.__tablename__
+        self.progress = {
+            "state": "purging",
+            "table": table,
+            "id": str(entity_id),
+            "appointments_deleted": 0,
+            "started_at": datetime.utcnow().isoformat(),
+        }
+        batch_size = settings.PURGE_BATCH_SIZE
+        while True:
+            batch = select(AppointmentORM.id).where(foreign_key == entity_id).limit(batch_size).scalar_subquery()
+            async with database.async_session() as db:
+                deleted = (await db.execute(
+                    delete(AppointmentORM)
+                    .where(AppointmentORM.id.in_(batch))
+                    .returning(AppointmentORM.id, AppointmentORM.doctor_id, AppointmentORM.user_id,
+                               AppointmentORM.room_id, AppointmentORM.date)
+                    .execution_options(synchronize_session=False)
+                )).all()
+                if deleted:
+                    await crud.record_appointment_changes(db, deleted, AppointmentChangeOp.deleted)
+                await db.commit()
+            purged_total.inc(AppointmentORM.__tablename__, amount=len(deleted))
+            self.progress["appointments_deleted"] += len(deleted)
+            if len(deleted) < batch_size:
+                break
+            logger.info("Purging %s %s: %d appointments deleted so far",
+                        table, entity_id, self.progress["appointments_deleted"])
+            # Пауза между пачками — даем пройти конкурирующим транзакциям
+            await asyncio.sleep(settings.PURGE_BATCH_DELAY_SECONDS)
+
+        async with database.async_session() as db:
+            result = await db.execute(
+                delete(orm)
+                .where(orm.id == entity_id, orm.deleted_at.is_not(None))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        purged_total.inc(table, amount=result.rowcount)
+        logger.info("Purged %s %s with %d appointments", table, entity_id, self.progress["appointments_deleted"])
+        return self.progress["appointments_deleted"]
+
+
+worker = Purger()
+
+
+def wake() -> None:
+    """Ask the purger to look for new tombstones now instead of after PURGE_IDLE_SECONDS."""
+    worker.wake()
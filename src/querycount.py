@@ -0,0 +1,130 @@
+"""
+Per-request SQL statement counting and an N+1 detector.
+
+`instrument(engine)` hooks before_cursor_execute; every statement is counted
+in the QueryStats of the current context. QueryCountMiddleware opens one per
+HTTP request and, when the request is done, exports the count per route and
+logs statements repeated QUERY_REPEAT_THRESHOLD or more times (the typical
+N+1: the same SELECT with different parameters in a loop).
+
+`track()` can be nested around any code, e.g. in tests (see the
+`max_queries` fixture in tests/conftest.py); statements counted in an inner
+scope are counted in the outer ones too.
+
+The request scope also carries the request id (X-Request-ID, generated when
+the client sends none, echoed in the response) and the route, which the
+slow-query log attaches to its records (see slowquery.py).
+"""
+import logging
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+queries_total = metrics.counter("db_queries_total", "SQL statements executed while serving a route", ("route",))
+n_plus_one_total = metrics.counter("db_n_plus_one_total", "Requests with a statement repeated QUERY_REPEAT_THRESHOLD+ times", ("route",))
+
+
+class QueryStats:
+    def __init__(self, parent: "QueryStats | None" = None, scope: Scope | None = None, request_id: str | None = None):
+        self.parent = parent
+        self.scope = scope if scope is not None else (parent.scope if parent else None)
+        self.request_id = request_id or (parent.request_id if parent else None)
+        self.count = 0
+        self.statements: Counter[str] = Counter()
+
+    @property
+    def route(self) -> str | None:
+        return route_name(self.scope) if self.scope is not None else None
+
+    def record(self, statement: str) -> None:
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.statements[statement] += 1
+            stats = stats.parent
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def current() -> QueryStats | None:
+    return _current.get()
+
+
+@contextmanager
+def track(scope: Scope | None = None, request_id: str | None = None) -> Iterator[QueryStats]:
+    """Count the statements executed inside the block (and in tasks started from it)."""
+    stats = QueryStats(_current.get(), scope, request_id)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement)
+
+
+def instrument(engine: AsyncEngine) -> None:
+    # Синхронное событие вызывается в greenlet с контекстом вызывающей корутины
+    event.listen(engine.sync_engine, "before_cursor_execute", _on_execute)
+
+
+def route_name(scope: Scope) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else '<unmatched>'}"
+
+
+class QueryCountMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.QUERY_COUNT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        request_id = Headers(scope=scope).get("x-request-id", "")
+        if not 0 < len(request_id) <= 128:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        with track(scope, request_id) as stats:
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                self._report(scope, stats)
+
+    def _report(self, scope: Scope, stats: QueryStats) -> None:
+        if not stats.count:
+            return
+        route = route_name(scope)
+        queries_total.inc(route, amount=stats.count)
+        repeated = stats.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        if repeated:
+            n_plus_one_total.inc(route)
+            for statement, count in repeated:
+                logger.warning("Possible N+1 in %s: statement executed %d times (%d total): %s",
+                               route, count, stats.count, " ".join(statement.split())[:300])
+        logger.debug("%s executed %d SQL statements", route, stats.count)
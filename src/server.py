@@ -0,0 +1,58 @@
+"""Production entrypoint: ``python server.py``.
+
+Runs ``main:app`` under uvicorn's multiprocess supervisor. The supervisor
+restarts workers that exit (e.g. after ``MAX_REQUESTS``), and on SIGHUP
+restarts all of them one by one without dropping the listening socket.
+"""
+import os
+
+import uvicorn
+
+from config import settings
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may actually use (affinity + cgroup quota)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # В контейнере лимит задается квотой cgroup v2, а не числом ядер хоста
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count() -> int:
+    """One async worker per usable CPU unless WEB_CONCURRENCY overrides it."""
+    if settings.WEB_CONCURRENCY:
+        return settings.WEB_CONCURRENCY
+    return max(1, min(available_cpus(), settings.MAX_WORKERS))
+
+
+def main() -> None:
+    uvicorn.run(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=worker_count(),
+        # "auto" выбирает uvloop и httptools, если они установлены
+        loop="auto",
+        http="auto",
+        limit_max_requests=settings.MAX_REQUESTS,
+        limit_max_requests_jitter=settings.MAX_REQUESTS_JITTER,
+        timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT,
+        timeout_keep_alive=settings.KEEPALIVE_TIMEOUT,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Graceful shutdown of a worker.
+
+uvicorn closes the listening socket as soon as it gets SIGTERM and then
+waits up to GRACEFUL_TIMEOUT for in-flight requests. A load balancer that
+still routes to the worker would see refused connections, so
+`install_signal_handler()` puts a drain phase first:
+
+1. /readyz switches to 503 (see health.py), and open SSE streams end so
+   their clients reconnect to another worker and catch up with
+   `Last-Event-ID`;
+2. for SHUTDOWN_DRAIN_DELAY_SECONDS the worker keeps serving while the
+   load balancer takes it out of rotation;
+3. then uvicorn's own handler runs and shuts the server down as usual.
+
+A second SIGTERM skips the delay. InFlightMiddleware counts running
+requests, so the lifespan shutdown waits for them (`wait_idle`) before
+stopping the background workers and disposing the engine.
+"""
+import asyncio
+import logging
+import signal
+import threading
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+import changefeed
+import health
+import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InFlight:
+    def __init__(self):
+        self.count = 0
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until no request is running; False when `timeout` expired first."""
+        deadline = time.monotonic() + timeout
+        while self.count and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.count:
+            logger.warning("Shutting down with %d requests still in flight", self.count)
+        return not self.count
+
+
+requests = InFlight()
+
+metrics.gauge("http_requests_in_flight", "HTTP requests being served by this worker", callback=lambda: requests.count)
+
+
+class InFlightMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requests.count += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            requests.count -= 1
+
+
+def begin_drain() -> None:
+    """Stop attracting traffic: not ready from now on, SSE clients move to other workers."""
+    logger.info("Draining: readiness off, closing %d change feed streams", len(changefeed.hub.subscribers))
+    health.mark_shutting_down()
+    changefeed.hub.close_subscribers()
+
+
+def install_signal_handler() -> None:
+    """Run the drain phase on SIGTERM before the server's own handler (see the module docstring)."""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    server_handler = signal.getsignal(signal.SIGTERM)
+    if not callable(server_handler):
+        # Сервер сигнал не перехватывает — завершение по умолчанию, дренировать нечего
+        return
+    loop = asyncio.get_running_loop()
+    draining = False
+
+    def on_sigterm(sig: int, frame) -> None:
+        nonlocal draining
+        if draining:
+            server_handler(sig, frame)
+            return
+        draining = True
+        loop.call_soon_threadsafe(begin_drain)
+        loop.call_soon_threadsafe(loop.call_later, settings.SHUTDOWN_DRAIN_DELAY_SECONDS, server_handler, sig, None)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
@@ -0,0 +1,137 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+While a lookup such as `get_doctor(db, doctor_id)` is in flight, other
+requests asking for the same function and arguments wait for it instead of
+sending their own query. The leader's rows are snapshotted into detached ORM
+instances and every waiter merges its own copy into its own session
+(`merge(load=False)`, no SQL), so objects are never shared between sessions.
+
+Only sessions without an open transaction take part: their read would be the
+first statement of a new snapshot anyway, so a result produced concurrently
+by another session is just as valid. Sessions that already read or wrote
+something run the query themselves to keep read-your-writes.
+"""
+import asyncio
+import functools
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+import metrics
+from config import settings
+
+T = TypeVar("T")
+
+calls_total = metrics.counter("singleflight_calls_total", "Coalescable read calls", ("function",))
+coalesced_total = metrics.counter(
+    "singleflight_coalesced_total", "Calls served by another request's in-flight query", ("function",)
+)
+
+_inflight: dict[tuple, asyncio.Future] = {}
+
+
+def _is_orm(value) -> bool:
+    return hasattr(value, "_sa_instance_state")
+
+
+def _snapshot(obj, memo: dict):
+    """Detached copy of a loaded ORM instance (loaded columns and relationships only)."""
+    if id(obj) in memo:
+        return memo[id(obj)]
+    state = inspect(obj)
+    copy = state.mapper.class_manager.new_instance()
+    memo[id(obj)] = copy
+    for key, value in state.dict.items():
+        if key not in state.mapper.attrs:
+            continue
+        if key in state.mapper.relationships:
+            if isinstance(value, list):
+                value = [_snapshot(item, memo) for item in value]
+            elif value is not None:
+                value = _snapshot(value, memo)
+        set_committed_value(copy, key, value)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def _snapshot_result(result):
+    memo: dict = {}
+    if _is_orm(result):
+        return _snapshot(result, memo)
+    if isinstance(result, (list, tuple)) and any(_is_orm(item) for item in result):
+        return [_snapshot(item, memo) for item in result]
+    # Строки mappings()/скаляры неизменяемы, их можно отдавать как есть
+    return result
+
+
+async def _attach(db: AsyncSession, snapshot):
+    if _is_orm(snapshot):
+        return await db.merge(snapshot, load=False)
+    if isinstance(snapshot, list) and any(_is_orm(item) for item in snapshot):
+        return [await db.merge(item, load=False) for item in snapshot]
+    return snapshot
+
+
+def coalesce(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Coalesce concurrent identical calls of an idempotent `func(db, *args, **kwargs)` read."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(db: AsyncSession, *args, **kwargs) -> T:
+        if not settings.SINGLEFLIGHT_ENABLED or db.in_transaction():
+            return await func(db, *args, **kwargs)
+        try:
+            key = (name, args, tuple(sorted(kwargs.items())))
+            hash(key)
+        except TypeError:
+            # Нехешируемые аргументы (списки id и т.п.) — без объединения
+            return await func(db, *args, **kwargs)
+
+        calls_total.inc(name)
+        leader = _inflight.get(key)
+        if leader is not None:
+            try:
+                snapshot = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise
+                # Лидера отменили — выполняем запрос сами
+                return await func(db, *args, **kwargs)
+            coalesced_total.inc(name)
+            return await _attach(db, snapshot)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            result = await func(db, *args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение получат ожидающие; если их нет, не шумим в логах
+            future.exception()
+            raise
+        else:
+            future.set_result(_snapshot_result(result))
+            return result
+        finally:
+            _inflight.pop(key, None)
+
+    return wrapper
+
+
+def coalescing_ratio(function: str | None = None) -> float:
+    """Share of calls that were served by someone else's query."""
+    functions = [function] if function else [labels[0] for labels in calls_total.values]
+    calls = sum(calls_total.get(name) for name in functions)
+    coalesced = sum(coalesced_total.get(name) for name in functions)
+    return coalesced / calls if calls else 0.0
+
+
+metrics.gauge("singleflight_coalescing_ratio", "Coalesced calls / all coalescable calls", callback=coalescing_ratio)
@@ -0,0 +1,126 @@
+"""
+Structured slow-query log.
+
+Statements that take SLOW_QUERY_MS or longer are logged to the "sql.slow"
+logger as one JSON object per line. Each record holds:
+
+- a fingerprint of the normalized statement, with literals and bind
+  placeholders replaced by `?` and IN lists collapsed;
+- the duration and row count;
+- the route and request id of the HTTP request (see querycount.py).
+
+Parameter values are never logged, only their types. Records go through a
+QueueHandler: the request only enqueues, and a QueueListener thread writes
+to SLOW_QUERY_LOG_FILE (stderr by default).
+"""
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import time
+from datetime import UTC, datetime
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import metrics
+import querycount
+from config import settings
+
+logger = logging.getLogger("sql.slow")
+
+slow_total = metrics.counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS")
+
+_PLACEHOLDER = re.compile(r"\$\d+(?:::[\w\[\]]+)?|%\(\w+\)s|%s")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def fingerprint(statement: str) -> tuple[str, str]:
+    """Normalized statement text and its short hash, equal for the same query with other values."""
+    normalized = _STRING.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _LIST.sub("(...)", normalized)
+    normalized = " ".join(normalized.split())
+    return normalized, hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def redact(parameters, executemany: bool) -> list[str]:
+    """Parameter types only; with executemany, those of the first row."""
+    if executemany and parameters:
+        parameters = parameters[0]
+    values = parameters.values() if isinstance(parameters, dict) else (parameters or ())
+    return [type(value).__name__ for value in values]
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = getattr(record, "payload", None) or {"message": record.getMessage()}
+        return json.dumps({"ts": datetime.fromtimestamp(record.created, UTC).isoformat(), **payload}, default=str)
+
+
+def start(handler: logging.Handler | None = None) -> None:
+    """Route "sql.slow" through a queue to `handler` (a file or stderr stream by default)."""
+    global _listener
+    stop()
+    if handler is None:
+        if settings.SLOW_QUERY_LOG_FILE:
+            handler = logging.FileHandler(settings.SLOW_QUERY_LOG_FILE)
+        else:
+            handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonLinesFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    logger.setLevel(logging.WARNING)
+    # Записи уже структурированы — в общий (текстовый) лог их не дублируем
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+
+
+def stop() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        logger.handlers = []
+        logger.propagate = True
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._slow_query_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    duration_ms = (time.perf_counter() - context._slow_query_started) * 1000
+    if duration_ms < settings.SLOW_QUERY_MS:
+        return
+    slow_total.inc()
+    normalized, digest = fingerprint(statement)
+    stats = querycount.current()
+    logger.warning("slow query", extra={"payload": {
+        "event": "slow_query",
+        "fingerprint": digest,
+        "statement": normalized[:2000],
+        "duration_ms": round(duration_ms, 2),
+        "rows": cursor.rowcount,
+        "route": stats.route if stats else None,
+        "request_id": stats.request_id if stats else None,
+        "params": redact(parameters, executemany),
+        "executemany": executemany,
+    }})
+
+
+def instrument(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
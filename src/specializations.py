@@ -0,0 +1,168 @@
+"""
+Specialization catalog and its doctor counts.
+
+Doctors keep the specialization as typed, but every write also links them
+to a row of the `specializations` catalog, matched by a normalized key
+(whitespace collapsed, lower case), so "Cardiologist" and " cardiologist"
+are one entry. `specialization_counts` holds live (not soft-deleted)
+doctors per specialization and category. The mapper events below adjust
+it by ±1 in the transaction of each doctor insert, update and delete, so
+the numbers are never recomputed from `doctors`.
+
+GET /specializations is served from an in-process copy of the counts
+(`counts`). A commit that changed doctors drops this worker's copy at
+once; other workers pick the change up within SPECIALIZATIONS_CACHE_SECONDS.
+"""
+import asyncio
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, object_session
+
+import database
+from config import settings
+from database import DoctorORM, SpecializationCountORM, SpecializationORM
+from model import CategoryEnum, SpecializationItem
+
+# Флаг в session.info: транзакция меняла врачей, после commit кэш устарел
+_CHANGED = "specializations_changed"
+
+_items = TypeAdapter(list[SpecializationItem])
+
+
+def normalize(specialization: str) -> tuple[str, str]:
+    """Catalog name and key; the migration backfill applies the same rules in SQL."""
+    name = " ".join(specialization.split())
+    return name, name.lower()
+
+
+def _resolve(connection: Connection, specialization: str) -> int:
+    name, key = normalize(specialization)
+    found = connection.execute(select(SpecializationORM.id).where(SpecializationORM.key == key)).scalar()
+    if found is not None:
+        return found
+    # DO UPDATE вместо DO NOTHING: при гонке RETURNING вернет строку, вставленную другой транзакцией
+    statement = insert(SpecializationORM).values(key=key, name=name)
+    statement = statement.on_conflict_do_update(index_elements=["key"], set_={"name": SpecializationORM.name})
+    return connection.execute(statement.returning(SpecializationORM.id)).scalar_one()
+
+
+def _adjust(connection: Connection, facet: tuple[int, CategoryEnum] | None, delta: int) -> None:
+    if facet is None:
+        return
+    specialization_id, category = facet
+    statement = insert(SpecializationCountORM).values(specialization_id=specialization_id, category=category, doctors=delta)
+    statement = statement.on_conflict_do_update(
+        index_elements=["specialization_id", "category"],
+        set_={"doctors": SpecializationCountORM.doctors + statement.excluded.doctors},
+    )
+    connection.execute(statement)
+
+
+def _mark_changed(doctor: DoctorORM) -> None:
+    session = object_session(doctor)
+    if session is not None:
+        session.info[_CHANGED] = True
+
+
+@event.listens_for(DoctorORM, "before_insert")
+def _on_insert(mapper, connection: Connection, doctor: DoctorORM) -> None:
+    doctor.specialization_id = _resolve(connection, doctor.specialization)
+    if doctor.deleted_at is None:
+        _adjust(connection, (doctor.specialization_id, doctor.category), 1)
+    _mark_changed(doctor)
+
+
+@event.listens_for(DoctorORM, "before_update")
+def _on_update(mapper, connection: Connection, doctor: DoctorORM) -> None:
+    attrs = inspect(doctor).attrs
+    if not any(attrs[key].history.has_changes() for key in ("specialization", "category", "deleted_at")):
+        return
+
+    def previous(key: str):
+        history = attrs[key].history
+        return history.deleted[0] if history.deleted else getattr(doctor, key)
+
+    old = (doctor.specialization_id, previous("category")) if previous("deleted_at") is None else None
+    if attrs.specialization.history.has_changes():
+        doctor.specialization_id = _resolve(connection, doctor.specialization)
+    new = (doctor.specialization_id, doctor.category) if doctor.deleted_at is None else None
+    if old != new:
+        _adjust(connection, old, -1)
+        _adjust(connection, new, 1)
+        _mark_changed(doctor)
+
+
+@event.listens_for(DoctorORM, "after_delete")
+def _on_delete(mapper, connection: Connection, doctor: DoctorORM) -> None:
+    # Мягко удаленный врач уже вычтен, когда получил deleted_at
+    if doctor.deleted_at is None:
+        _adjust(connection, (doctor.specialization_id, doctor.category), -1)
+        _mark_changed(doctor)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED, False):
+        counts.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED, None)
+
+
+async def load() -> list[SpecializationItem]:
+    """Specializations that have live doctors, with totals and per-category counts."""
+    query = (
+        select(SpecializationORM.id, SpecializationORM.name, SpecializationCountORM.category, SpecializationCountORM.doctors)
+        .join(SpecializationCountORM, SpecializationCountORM.specialization_id == SpecializationORM.id)
+        .where(SpecializationCountORM.doctors > 0)
+        .order_by(SpecializationORM.name, SpecializationCountORM.category)
+    )
+    async with database.async_session() as db:
+        rows = (await db.execute(query)).all()
+    items: dict[int, SpecializationItem] = {}
+    for row in rows:
+        item = items.setdefault(row.id, SpecializationItem(id=row.id, name=row.name, doctors=0, categories={}))
+        item.doctors += row.doctors
+        item.categories[row.category] = row.doctors
+    return list(items.values())
+
+
+class Counts:
+    def __init__(self):
+        self._body: bytes | None = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._inflight: asyncio.Task | None = None
+
+    def invalidate(self) -> None:
+        self._body = None
+        self._generation += 1
+
+    async def get(self) -> bytes:
+        """GET /specializations body as JSON; cached for SPECIALIZATIONS_CACHE_SECONDS."""
+        if self._body is not None and time.monotonic() - self._loaded_at < settings.SPECIALIZATIONS_CACHE_SECONDS:
+            return self._body
+        if self._inflight is None:
+            self._inflight = asyncio.get_running_loop().create_task(self._refresh())
+        # shield: отмена одного запроса не отменяет загрузку, которую ждут остальные
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self) -> bytes:
+        generation = self._generation
+        try:
+            body = _items.dump_json(await load())
+            # Commit во время загрузки: результат мог его не увидеть, в кэш не кладем
+            if generation == self._generation:
+                self._body, self._loaded_at = body, time.monotonic()
+            return body
+        finally:
+            self._inflight = None
+
+
+counts = Counts()
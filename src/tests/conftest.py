@@ -1,17 +1,20 @@
 import logging
 import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
 import jwt
+import pytest
 import pytest_asyncio
 from dotenv import load_dotenv
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
 
+import querycount
 from auth import AuthConfig
-from database import Base, UserORM
+from database import Base, UserORM, dispose_engine, init_engine
 from main import app, get_session
 from model import UserRole
 
@@ -21,15 +24,23 @@ load_dotenv()
 
 TEST_DATABASE_URL = os.getenv("DATABASE_URL")
 
+
+def pytest_addoption(parser):
+    parser.addini(
+        "import_time_budget_ms",
+        "Максимальное время `import main` в миллисекундах",
+        default="1000",
+    )
+
 @pytest_asyncio.fixture(scope="session")
 async def engine():
-    engine = create_async_engine(
+    engine = init_engine(
         TEST_DATABASE_URL,
         echo=True,
         poolclass=NullPool  # Для изоляции тестов
     )
     yield engine
-    await engine.dispose()
+    await dispose_engine()
 
 
 @pytest_asyncio.fixture(scope="function", autouse=True)
@@ -106,3 +117,17 @@ async def test_users(db_session: AsyncSession):
     db_session.add_all(users)
     await db_session.commit()
     return users
+
+
+@pytest.fixture
+def max_queries():
+    """`with max_queries(3): await client.get(...)` fails if the block runs more SQL statements."""
+    @contextmanager
+    def check(limit: int):
+        with querycount.track() as stats:
+            yield stats
+        statements = "\n".join(f"{count}x {statement}" for statement, count in stats.statements.most_common())
+        assert stats.count <= limit, f"Expected at most {limit} SQL statements, got {stats.count}:\n{statements}"
+
+    return check
+
@@ -0,0 +1,181 @@
+import asyncio
+from datetime import UTC, date, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import crud
+from auth import AuthConfig
+from changefeed import ChangeHub, event_stream, hub
+from database import AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import AppointmentChangeOp, CategoryEnum, UserRole
+
+
+async def _create_parties(db_session: AsyncSession) -> tuple:
+    doctor_id, user_id, room_id = uuid4(), uuid4(), uuid4()
+    db_session.add_all([
+        DoctorORM(id=doctor_id, name="Gregory", surname="House", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password"),
+        UserORM(id=user_id, name="Patient", surname="Zero", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        RoomORM(id=room_id, number=1),
+    ])
+    await db_session.commit()
+    return doctor_id, user_id, room_id
+
+
+async def _book(sessions, doctor_id, user_id, room_id, commit: bool = True) -> int:
+    async with sessions() as db:
+        appointment = AppointmentORM(doctor_id=doctor_id, user_id=user_id, room_id=room_id, date=date(2026, 11, 2))
+        db.add(appointment)
+        seq = await crud.record_appointment_change(db, appointment, AppointmentChangeOp.created)
+        if commit:
+            await db.commit()
+        else:
+            await db.rollback()
+    return seq
+
+
+async def _take(stream, count: int) -> list[str]:
+    return [await asyncio.wait_for(anext(stream), 5) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_notify_is_fanned_out_on_commit(engine, db_session: AsyncSession):
+    parties = await _create_parties(db_session)
+    sessions = async_sessionmaker(engine)
+    await hub.start(engine)
+    try:
+        first, second = hub.subscribe(), hub.subscribe()
+        seq = await _book(sessions, *parties)
+
+        for subscription in (first, second):
+            change = await asyncio.wait_for(subscription.queue.get(), 5)
+            assert change.seq == seq
+            assert change.op == AppointmentChangeOp.created
+            assert change.doctor_id == parties[0]
+    finally:
+        await hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_change_is_not_published(engine, db_session: AsyncSession):
+    parties = await _create_parties(db_session)
+    sessions = async_sessionmaker(engine)
+    await hub.start(engine)
+    try:
+        subscription = hub.subscribe()
+        await _book(sessions, *parties, commit=False)
+        committed = await _book(sessions, *parties)
+
+        change = await asyncio.wait_for(subscription.queue.get(), 5)
+        assert change.seq == committed
+    finally:
+        await hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_create_appointment_is_published(engine, client: AsyncClient, db_session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(hub, "last_seq", 0)  # таблица пересоздается, seq снова начинается с 1
+    doctor_id, user_id, room_id = await _create_parties(db_session)
+    token = jwt.encode(
+        {"sub": str(user_id), "role": UserRole.user.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+    await hub.start(engine)
+    try:
+        subscription = hub.subscribe()
+        response = await client.post(
+            "/appointments",
+            json={"date": "2026-11-02", "doctor_id": str(doctor_id), "room_id": str(room_id)},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+
+        change = await asyncio.wait_for(subscription.queue.get(), 5)
+        assert change.op == AppointmentChangeOp.created
+        assert str(change.appointment_id) == response.json()["id"]
+        assert (change.doctor_id, change.user_id, change.room_id) == (doctor_id, user_id, room_id)
+    finally:
+        await hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_start_survives_unavailable_database(engine, monkeypatch):
+    local_hub = ChangeHub()
+    listen = local_hub._listen
+    attempts = []
+
+    async def flaky_listen():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        await listen()
+
+    monkeypatch.setattr(local_hub, "_listen", flaky_listen)
+    await local_hub.start(engine)
+    try:
+        assert not local_hub.running
+        await asyncio.wait_for(local_hub._reconnect, 5)
+        assert local_hub.running
+        assert len(attempts) == 2
+    finally:
+        await local_hub.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped(monkeypatch):
+    from config import settings
+    from model import AppointmentChange
+
+    monkeypatch.setattr(settings, "CHANGEFEED_QUEUE_SIZE", 1)
+    monkeypatch.setattr(hub, "last_seq", 0)
+    subscription = hub.subscribe()
+    for seq in (1, 2):
+        hub.publish(AppointmentChange(seq=seq, op="created", appointment_id=uuid4(), doctor_id=uuid4(),
+                                      date=date(2026, 11, 2)))
+
+    assert subscription not in hub.subscribers
+    assert subscription.queue.get_nowait() is None
+
+
+@pytest.mark.asyncio
+async def test_event_stream_catch_up(engine, db_session: AsyncSession):
+    parties = await _create_parties(db_session)
+    sessions = async_sessionmaker(engine)
+    first = await _book(sessions, *parties)
+    second = await _book(sessions, *parties)
+
+    stream = event_stream(since=first)
+    try:
+        retry, event = await _take(stream, 2)
+        assert retry.startswith("retry:")
+        assert event.startswith(f"id: {second}\nevent: created\ndata: ")
+    finally:
+        await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_event_stream_filters_by_doctor(engine, db_session: AsyncSession):
+    parties = await _create_parties(db_session)
+    sessions = async_sessionmaker(engine)
+    await _book(sessions, *parties)
+
+    stream = event_stream(since=0, doctor_id=uuid4())
+    try:
+        await _take(stream, 1)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(anext(stream), 0.2)
+    finally:
+        await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_changes_rejects_negative_token(client: AsyncClient):
+    response = await client.get("/appointments/changes", params={"since": -1})
+
+    assert response.status_code == 422
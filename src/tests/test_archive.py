@@ -0,0 +1,110 @@
+import json
+from datetime import UTC, date, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import archive
+from auth import AuthConfig
+from config import settings
+from database import AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import CategoryEnum, UserRole
+from partitions import ensure_partitions
+
+
+async def _create_parties(db_session: AsyncSession) -> dict:
+    ids = {"doctor": uuid4(), "user": uuid4(), "room": uuid4()}
+    db_session.add_all([
+        DoctorORM(id=ids["doctor"], name="Gregory", surname="House", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password"),
+        UserORM(id=ids["user"], name="Patient", surname="Zero", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.admin, password="hashed_password", disabled=False),
+        RoomORM(id=ids["room"], number=1),
+    ])
+    await db_session.commit()
+    return ids
+
+
+def _book(db_session: AsyncSession, ids: dict, *days: date) -> None:
+    db_session.add_all([
+        AppointmentORM(doctor_id=ids["doctor"], user_id=ids["user"], room_id=ids["room"], date=day) for day in days
+    ])
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "ARCHIVE_AFTER_DAYS", 365)
+    return tmp_path
+
+
+def test_segment_round_trip_reads_date_slice():
+    rows = [
+        {"id": uuid4(), "date": date(2024, 3, day), "doctor_id": uuid4(), "user_id": None, "room_id": uuid4()}
+        for day in (20, 1, 10, 10)
+    ]
+
+    segment = archive.encode_segment(rows)
+
+    assert sorted(archive.decode_segment(segment), key=lambda row: row["id"]) == sorted(rows, key=lambda row: row["id"])
+    assert [row["date"] for row in archive.decode_segment(segment, date(2024, 3, 5), date(2024, 3, 10))] == [
+        date(2024, 3, 10), date(2024, 3, 10)
+    ]
+    assert archive.decode_segment(segment, date(2024, 4, 1), date(2024, 4, 30)) == []
+
+
+@pytest.mark.asyncio
+async def test_old_months_are_moved_to_segments(engine, db_session: AsyncSession, archive_dir):
+    # Партиции создаются до вставки и при закрытых транзакциях (см. test_partitions)
+    await ensure_partitions(engine, today=date(2024, 3, 1))
+    ids = await _create_parties(db_session)
+    _book(db_session, ids, date(2024, 3, 2), date(2024, 3, 30), date(2024, 4, 15), date(2026, 10, 1))
+    await db_session.commit()
+
+    archived = await archive.archive_old(engine, today=date(2025, 5, 20))
+
+    assert archived == ["appointments_y2024m03", "appointments_y2024m04"]
+    remaining = (await db_session.execute(text("SELECT date FROM appointments"))).scalars().all()
+    assert remaining == [date(2026, 10, 1)]
+    assert (await db_session.execute(text("SELECT to_regclass('appointments_y2024m03')"))).scalar() is None
+    await db_session.commit()
+
+    index = json.loads((archive_dir / archive.INDEX_FILE).read_text())["segments"]
+    assert [(segment["min_date"], segment["max_date"], segment["rows"]) for segment in index] == [
+        ("2024-03-02", "2024-03-30", 2), ("2024-04-15", "2024-04-15", 1)
+    ]
+    # Повторный запуск ничего не дублирует
+    assert await archive.archive_old(engine, today=date(2025, 5, 20)) == []
+
+
+@pytest.mark.asyncio
+async def test_archive_endpoint_reads_only_overlapping_segments(
+        engine, client: AsyncClient, db_session: AsyncSession, archive_dir):
+    ids = await _create_parties(db_session)
+    _book(db_session, ids, date(2024, 3, 2), date(2024, 4, 15), date(2024, 4, 16))
+    await db_session.commit()
+    await archive.archive_old(engine, today=date(2025, 6, 1))
+    token = jwt.encode(
+        {"sub": str(ids["user"]), "role": UserRole.admin.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    reads_before = archive.segments_read_total.get()
+
+    response = await client.get("/appointments/archive", params={"from": "2024-04-01", "to": "2024-04-15"},
+                                headers=headers)
+
+    assert response.status_code == 200
+    assert [(item["date"], item["doctor_id"]) for item in response.json()] == [("2024-04-15", str(ids["doctor"]))]
+    assert archive.segments_read_total.get() - reads_before == 1
+
+    response = await client.get("/appointments/archive", params={"from": "2024-04-15", "to": "2024-04-01"},
+                                headers=headers)
+    assert response.status_code == 422
+    response = await client.get("/appointments/archive", params={"from": "2024-04-01", "to": "2024-04-15"})
+    assert response.status_code == 401
@@ -0,0 +1,85 @@
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import create_access_token, get_current_user, get_token_claims
+from config import settings
+from database import UserORM
+from model import UserRole
+
+
+def _headers(user_id, role=UserRole.admin, **claims) -> dict:
+    token = create_access_token(subject=str(user_id), role=role, **claims)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _profile(name="Ghost", email="ghost@example.com", disabled=False) -> dict:
+    return {"name": name, "email": email, "disabled": disabled}
+
+
+async def _create_admin(db_session: AsyncSession) -> UserORM:
+    user_id = uuid4()
+    user = UserORM(id=user_id, name="Claims", surname=f"Admin{user_id.hex[:8]}", email=f"{user_id.hex}@example.com",
+                   age=40, phone=f"+37529{user_id.int % 10**7:07d}", role=UserRole.admin,
+                   password="hashed_password", disabled=False)
+    db_session.add(user)
+    await db_session.commit()
+    return user_id
+
+
+@pytest.fixture
+def claims_only(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_CLAIMS_ONLY", True)
+
+
+@pytest.mark.asyncio
+async def test_claims_only_authorizes_without_user_lookup(client: AsyncClient, claims_only, max_queries):
+    # Пользователя в БД нет: роль берется только из подписанного токена
+    headers = _headers(uuid4(), **_profile())
+
+    with max_queries(1):
+        response = await client.get("/users/by-phone/+375291112233", headers=headers)
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_verified_route_checks_database_in_claims_only_mode(client: AsyncClient, db_session: AsyncSession,
+                                                                  claims_only):
+    headers = _headers(uuid4(), **_profile())
+    response = await client.post("/debug/profile", params={"seconds": 0.01}, headers=headers)
+    assert response.status_code == 401
+
+    admin_id = await _create_admin(db_session)
+    response = await client.post("/debug/profile", params={"seconds": 0.01},
+                                 headers=_headers(admin_id, **_profile("Claims", "claims@example.com")))
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_tokens_without_profile_claims_fall_back_to_database(client: AsyncClient, claims_only):
+    # Токен, выданный до появления claim disabled, тоже проверяется по БД
+    headers = _headers(uuid4(), email="ghost@example.com", name="Ghost")
+    response = await client.get("/users/by-phone/+375291112233", headers=headers)
+
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_default_mode_checks_database(client: AsyncClient):
+    headers = _headers(uuid4(), **_profile())
+
+    response = await client.get("/users/by-phone/+375291112233", headers=headers)
+
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_claims_only_user_carries_disabled_flag(claims_only):
+    token = create_access_token(subject=str(uuid4()), role=UserRole.user, **_profile(disabled=True))
+
+    user = await get_current_user(token, await get_token_claims(token), db=None)
+
+    assert user.disabled is True
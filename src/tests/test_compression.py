@@ -0,0 +1,132 @@
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from compression import CompressionMiddleware, available_codecs, negotiate
+
+PAYLOAD = [{"name": "Doctor", "surname": "House", "specialization": "therapist"}] * 100
+
+
+async def big_json(request):
+    return JSONResponse(PAYLOAD)
+
+
+async def small_json(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def stream(request):
+    async def chunks():
+        for _ in range(5):
+            yield json.dumps(PAYLOAD[:20]).encode()
+
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+async def events(request):
+    async def chunks():
+        yield b"data: " + json.dumps(PAYLOAD).encode() + b"\n\n"
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+async def image(request):
+    return PlainTextResponse(b"\x89PNG" * 1000, media_type="image/png")
+
+
+app = Starlette(routes=[
+    Route("/big", big_json),
+    Route("/small", small_json),
+    Route("/stream", stream),
+    Route("/events", events),
+    Route("/image", image),
+])
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+
+@pytest.fixture
+async def raw_client():
+    # httpx сам распаковывает gzip/br/zstd по Content-Encoding
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def test_negotiate_prefers_server_order_on_ties():
+    codecs = {"zstd": None, "br": None, "gzip": None}
+    assert negotiate("gzip, br, zstd", codecs) == "zstd"
+    assert negotiate("gzip;q=1.0, br;q=0.5", codecs) == "gzip"
+    assert negotiate("*", codecs) == "zstd"
+    assert negotiate("gzip;q=0, identity", codecs) is None
+    assert negotiate("", codecs) is None
+
+
+def test_available_codecs_respects_settings(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "COMPRESSION_CODECS", "gzip")
+    assert list(available_codecs()) == ["gzip"]
+
+
+@pytest.mark.asyncio
+async def test_gzip_large_json(raw_client: AsyncClient):
+    response = await raw_client.get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(json.dumps(PAYLOAD))
+    assert response.json() == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_small_json_not_compressed(raw_client: AsyncClient):
+    response = await raw_client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"status": "ok"}
+
+
+@pytest.mark.asyncio
+async def test_no_accept_encoding(raw_client: AsyncClient):
+    response = await raw_client.get("/big", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == PAYLOAD
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/events", "/image"])
+async def test_excluded_content_types(raw_client: AsyncClient, path):
+    response = await raw_client.get(path, headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_streaming_body_gzip(raw_client: AsyncClient):
+    response = await raw_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == json.dumps(PAYLOAD[:20]).encode() * 5
+
+
+@pytest.mark.asyncio
+async def test_brotli(raw_client: AsyncClient):
+    pytest.importorskip("brotli")
+    response = await raw_client.get("/big", headers={"Accept-Encoding": "br"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == PAYLOAD
+
+
+@pytest.mark.asyncio
+async def test_zstd_streaming(raw_client: AsyncClient):
+    pytest.importorskip("zstandard")
+    response = await raw_client.get("/stream", headers={"Accept-Encoding": "zstd, gzip"})
+
+    assert response.headers["content-encoding"] == "zstd"
+    assert response.content == json.dumps(PAYLOAD[:20]).encode() * 5
@@ -0,0 +1,83 @@
+from datetime import date
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import UserRole
+from partitions import ensure_partitions
+
+
+async def _create_calendar(db_session: AsyncSession) -> dict:
+    ids = {"doctor": uuid4(), "other_doctor": uuid4(), "user": uuid4(), "room": uuid4()}
+    db_session.add_all([
+        DoctorORM(id=ids["doctor"], name="Doctor", surname="Calendar", age=40,
+                  specialization="General", category="first", password="password"),
+        DoctorORM(id=ids["other_doctor"], name="Doctor", surname="Other", age=41,
+                  specialization="General", category="first", password="password"),
+        UserORM(id=ids["user"], name="Patient", surname="Test", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        RoomORM(id=ids["room"], number=1),
+    ])
+    await db_session.flush()
+    for doctor_id, day in [
+        (ids["doctor"], date(2026, 3, 2)),
+        (ids["doctor"], date(2026, 3, 4)),
+        (ids["doctor"], date(2026, 3, 9)),
+        (ids["other_doctor"], date(2026, 3, 3)),
+    ]:
+        db_session.add(AppointmentORM(date=day, doctor_id=doctor_id, user_id=ids["user"], room_id=ids["room"]))
+    await db_session.commit()
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_get_doctor_calendar(client: AsyncClient, db_session: AsyncSession):
+    ids = await _create_calendar(db_session)
+
+    response = await client.get(f"/doctors/{ids['doctor']}/appointments?from=2026-03-02&to=2026-03-08")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"date": "2026-03-02", "room_id": str(ids["room"]), "user_id": str(ids["user"])},
+        {"date": "2026-03-04", "room_id": str(ids["room"]), "user_id": str(ids["user"])},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_doctor_calendar_unknown_doctor(client: AsyncClient):
+    response = await client.get(f"/doctors/{uuid4()}/appointments?from=2026-03-02&to=2026-03-08")
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_get_doctor_calendar_invalid_range(client: AsyncClient):
+    doctor_id = uuid4()
+
+    response = await client.get(f"/doctors/{doctor_id}/appointments?from=2026-03-08&to=2026-03-02")
+    assert response.status_code == 422
+
+    response = await client.get(f"/doctors/{doctor_id}/appointments?from=2026-01-01&to=2026-12-31")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_doctor_calendar_uses_index_only_scan(engine, db_session: AsyncSession):
+    await ensure_partitions(engine, today=date(2026, 2, 1))
+    ids = await _create_calendar(db_session)
+
+    await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    await db_session.execute(text("ANALYZE appointments"))
+    plan = (await db_session.execute(text(
+        "EXPLAIN SELECT date, room_id, user_id FROM appointments "
+        "WHERE doctor_id = :doctor_id AND date BETWEEN '2026-03-02' AND '2026-03-08' ORDER BY date"
+    ), {"doctor_id": ids["doctor"]})).scalars().all()
+
+    # Индекс ix_appointments_doctor_id_date на партиции марта; остальные партиции отсечены
+    assert any("Index Only Scan using appointments_y2026m03_doctor_id_date" in line for line in plan)
+    assert not any("appointments_y2026m02" in line or "appointments_default" in line for line in plan)
@@ -0,0 +1,95 @@
+from datetime import UTC, date, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import AuthConfig
+from database import AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import UserRole
+
+
+async def _create_user_with_appointments(db_session: AsyncSession) -> dict:
+    ids = {"user": uuid4(), "other_user": uuid4(), "doctor": uuid4(), "room": uuid4()}
+    db_session.add_all([
+        UserORM(id=ids["user"], name="Patient", surname="Test", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        UserORM(id=ids["other_user"], name="Other", surname="Test", email="other@example.com", age=31,
+                phone="+375291234568", role=UserRole.user, password="hashed_password", disabled=False),
+        DoctorORM(id=ids["doctor"], name="Doctor", surname="Test", age=40,
+                  specialization="General", category="first", password="password"),
+        RoomORM(id=ids["room"], number=1),
+    ])
+    await db_session.flush()
+
+    today = date.today()
+    for offset in (-3, -1, 0, 2, 5):
+        db_session.add(AppointmentORM(date=today + timedelta(days=offset), doctor_id=ids["doctor"],
+                                      user_id=ids["user"], room_id=ids["room"]))
+    db_session.add(AppointmentORM(date=today + timedelta(days=1), doctor_id=ids["doctor"],
+                                  user_id=ids["other_user"], room_id=ids["room"]))
+    await db_session.commit()
+
+    token = jwt.encode(
+        {
+            "sub": str(ids["user"]),
+            "role": UserRole.user.value,
+            "exp": datetime.now(UTC) + timedelta(minutes=30)
+        },
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+    ids["headers"] = {"Authorization": f"Bearer {token}"}
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_my_upcoming_appointments_keyset_paging(client: AsyncClient, db_session: AsyncSession):
+    ids = await _create_user_with_appointments(db_session)
+    today = date.today()
+
+    response = await client.get("/users/me/appointments?size=2", headers=ids["headers"])
+    assert response.status_code == 200
+    first_page = response.json()
+    assert [item["date"] for item in first_page["items"]] == [
+        today.isoformat(), (today + timedelta(days=2)).isoformat()
+    ]
+    assert first_page["next_cursor"]
+
+    response = await client.get(
+        f"/users/me/appointments?size=2&cursor={first_page['next_cursor']}", headers=ids["headers"]
+    )
+    second_page = response.json()
+    assert [item["date"] for item in second_page["items"]] == [(today + timedelta(days=5)).isoformat()]
+    assert second_page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_my_past_appointments(client: AsyncClient, db_session: AsyncSession):
+    ids = await _create_user_with_appointments(db_session)
+    today = date.today()
+
+    response = await client.get("/users/me/appointments?scope=past", headers=ids["headers"])
+
+    assert response.status_code == 200
+    assert [item["date"] for item in response.json()["items"]] == [
+        (today - timedelta(days=1)).isoformat(), (today - timedelta(days=3)).isoformat()
+    ]
+
+
+@pytest.mark.asyncio
+async def test_my_appointments_invalid_cursor(client: AsyncClient, db_session: AsyncSession):
+    ids = await _create_user_with_appointments(db_session)
+
+    response = await client.get("/users/me/appointments?cursor=not-a-cursor", headers=ids["headers"])
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_my_appointments_unauthenticated(client: AsyncClient):
+    response = await client.get("/users/me/appointments")
+
+    assert response.status_code == 401
@@ -0,0 +1,128 @@
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import AuthConfig
+from database import UserORM
+from model import UserRole, normalize_phone
+
+
+async def _admin_headers(db_session: AsyncSession) -> dict:
+    admin_id = uuid4()
+    admin = UserORM(
+        id=admin_id,
+        email="admin@test.com",
+        name="admin",
+        surname="admin",
+        age=39,
+        phone="+375292342323",
+        role=UserRole.admin,
+        password="hashed_admin_pass",
+        disabled=False
+    )
+    db_session.add(admin)
+    await db_session.commit()
+    token = jwt.encode(
+        {
+            "sub": str(admin_id),
+            "role": UserRole.admin.value,
+            "exp": datetime.now(UTC) + timedelta(minutes=30)
+        },
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("raw", [
+    "+375 29 123-45-67",
+    "80291234567",
+    "8029 123 45 67",
+    "(29) 123-45-67",
+    "291234567",
+])
+def test_normalize_phone(raw):
+    assert normalize_phone(raw) == "+375291234567"
+
+
+@pytest.mark.parametrize("raw", ["12345", "+7 999 123-45-67", "29-123-45-6a"])
+def test_normalize_phone_invalid(raw):
+    with pytest.raises(ValueError):
+        normalize_phone(raw)
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_phone(client: AsyncClient, db_session: AsyncSession):
+    user_id = uuid4()
+    user = UserORM(
+        id=user_id,
+        name="Reception",
+        surname="Test",
+        email="phone@example.com",
+        age=30,
+        phone="+375291234567",
+        role=UserRole.user,
+        password="hashed_password",
+        disabled=False
+    )
+    db_session.add(user)
+    await db_session.commit()
+
+    response = await client.get(
+        "/users/by-phone/8029 123-45-67",
+        headers=await _admin_headers(db_session)
+    )
+
+    assert response.status_code == 200
+    assert response.json()["id"] == str(user_id)
+    assert response.json()["phone"] == "+375291234567"
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_phone_not_found(client: AsyncClient, db_session: AsyncSession):
+    response = await client.get(
+        "/users/by-phone/291111111",
+        headers=await _admin_headers(db_session)
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_phone_invalid(client: AsyncClient, db_session: AsyncSession):
+    response = await client.get(
+        "/users/by-phone/12345",
+        headers=await _admin_headers(db_session)
+    )
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_phone_requires_admin(client: AsyncClient):
+    response = await client.get("/users/by-phone/291234567")
+
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_create_user_duplicate_phone_in_other_format(client: AsyncClient):
+    user_data = {
+        "name": "First",
+        "surname": "User",
+        "email": "first@example.com",
+        "age": 30,
+        "phone": "+375 29 123-45-67",
+        "password": "password123"
+    }
+    response = await client.post("/users/", json=user_data)
+    assert response.status_code == 200
+    assert response.json()["phone"] == "+375291234567"
+
+    duplicate = {**user_data, "email": "second@example.com", "phone": "80291234567"}
+    response = await client.post("/users/", json=duplicate)
+    assert response.status_code == 409
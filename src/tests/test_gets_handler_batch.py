@@ -0,0 +1,92 @@
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import AuthConfig
+from database import DoctorORM, RoomORM, UserORM
+from main import BATCH_MAX_IDS
+from model import UserRole
+
+
+@pytest.mark.asyncio
+async def test_get_doctors_batch(client: AsyncClient, db_session: AsyncSession):
+    doctor_ids = [uuid4() for _ in range(3)]
+    for i, doctor_id in enumerate(doctor_ids):
+        db_session.add(DoctorORM(id=doctor_id, name=f"Doctor_{i}", surname=f"Test_{i}", age=30 + i,
+                                 specialization="General", category="first", password="password"))
+    await db_session.commit()
+    missing_id = uuid4()
+
+    requested = [doctor_ids[2], missing_id, doctor_ids[0]]
+    response = await client.get(f"/doctors/batch?ids={','.join(map(str, requested))}")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data["items"]] == [str(doctor_ids[2]), str(doctor_ids[0])]
+    assert data["missing"] == [str(missing_id)]
+    assert "password" not in data["items"][0]
+
+
+@pytest.mark.asyncio
+async def test_get_rooms_batch_repeated_param(client: AsyncClient, db_session: AsyncSession):
+    room_ids = [uuid4(), uuid4()]
+    for number, room_id in enumerate(room_ids, start=1):
+        db_session.add(RoomORM(id=room_id, number=number))
+    await db_session.commit()
+
+    response = await client.get(f"/rooms/batch?ids={room_ids[1]}&ids={room_ids[0]}&ids={room_ids[1]}")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "items": [{"id": str(room_ids[1]), "number": 2}, {"id": str(room_ids[0]), "number": 1}],
+        "missing": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_users_batch_admin_only(client: AsyncClient, db_session: AsyncSession):
+    admin_id = uuid4()
+    db_session.add(UserORM(id=admin_id, email="admin@test.com", name="admin", surname="admin", age=39,
+                           phone="+375292342323", role=UserRole.admin, password="hashed", disabled=False))
+    await db_session.commit()
+    token = jwt.encode(
+        {"sub": str(admin_id), "role": UserRole.admin.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+
+    response = await client.get(f"/users/batch?ids={admin_id}")
+    assert response.status_code == 401
+
+    response = await client.get(f"/users/batch?ids={admin_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [str(admin_id)]
+
+
+@pytest.mark.asyncio
+async def test_get_batch_invalid_ids(client: AsyncClient):
+    test_cases = [
+        "/doctors/batch?ids=not-a-uuid",
+        "/doctors/batch?ids=",
+        "/doctors/batch",
+        "/rooms/batch?ids=" + ",".join(str(uuid4()) for _ in range(BATCH_MAX_IDS + 1)),
+    ]
+
+    for url in test_cases:
+        response = await client.get(url)
+        assert response.status_code == 422, url
+
+
+@pytest.mark.asyncio
+async def test_slashless_list_still_redirects(client: AsyncClient):
+    # Пакетный поиск живет на /batch: /doctors?page=2 по-прежнему ведет на постраничный список
+    response = await client.get("/doctors?page=2")
+    assert response.status_code == 307
+    assert response.headers["location"].endswith("/doctors/?page=2")
+
+    response = await client.get("/doctors?page=2", follow_redirects=True)
+    assert response.status_code == 200
@@ -0,0 +1,57 @@
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import DoctorORM, UserORM
+from model import UserRole
+
+
+@pytest.mark.asyncio
+async def test_get_doctors_sparse_fields(client: AsyncClient, db_session: AsyncSession):
+    for i in range(1, 4):
+        db_session.add(DoctorORM(name=f"Doctor_{i}", surname=f"Test_{i}", age=30 + i,
+                                 specialization="General", category="first", password="password"))
+    await db_session.commit()
+
+    response = await client.get("/doctors/?fields=name,surname")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 3
+    assert set(data[0]) == {"id", "name", "surname"}
+    assert data[0]["name"] == "Doctor_1"
+
+
+@pytest.mark.asyncio
+async def test_get_doctor_sparse_fields(client: AsyncClient, db_session: AsyncSession):
+    doctor_id = uuid4()
+    db_session.add(DoctorORM(id=doctor_id, name="Doctor", surname="Test", age=30,
+                             specialization="General", category="first", password="password"))
+    await db_session.commit()
+
+    response = await client.get(f"/doctors/{doctor_id}?fields=specialization")
+
+    assert response.status_code == 200
+    assert response.json() == {"id": str(doctor_id), "specialization": "General"}
+
+
+@pytest.mark.asyncio
+async def test_get_user_sparse_fields(client: AsyncClient, db_session: AsyncSession):
+    user_id = uuid4()
+    db_session.add(UserORM(id=user_id, name="TestUser", surname="Test", email="test@example.com", age=34,
+                           phone="+375298888888", role=UserRole.user, password="password", disabled=False))
+    await db_session.commit()
+
+    response = await client.get(f"/users/{user_id}?fields=name,role")
+
+    assert response.status_code == 200
+    assert response.json() == {"id": str(user_id), "name": "TestUser", "role": "user"}
+
+
+@pytest.mark.asyncio
+async def test_get_doctors_unknown_fields(client: AsyncClient):
+    for fields in ("password", "name,unknown"):
+        response = await client.get(f"/doctors/?fields={fields}")
+        assert response.status_code == 422
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+import health
+import looplag
+from config import settings
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    health.readiness.reset()
+    checks = []
+    check_database = health._check_database
+
+    async def counted():
+        checks.append(1)
+        return await check_database()
+
+    monkeypatch.setattr(health, "_check_database", counted)
+    yield checks
+    health.readiness.reset()
+
+
+@pytest.mark.asyncio
+async def test_ready_result_is_cached(client: AsyncClient, readiness):
+    assert (await client.get("/livez")).json() == {"status": "ok"}
+
+    responses = await asyncio.gather(*(client.get("/readyz") for _ in range(5)))
+    responses.append(await client.get("/readyz"))
+
+    assert {response.status_code for response in responses} == {200}
+    assert responses[0].json()["checks"]["database"] == "ok"
+    # Параллельные и последующие пробы в пределах READY_CACHE_SECONDS — одна проверка БД
+    assert len(readiness) == 1
+
+
+@pytest.mark.asyncio
+async def test_not_ready_when_pool_is_saturated_or_loop_lags(client: AsyncClient, readiness, monkeypatch):
+    monkeypatch.setattr(health, "pool_usage", lambda: (10, 10))
+
+    response = await client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.json()["checks"]["pool"]["status"] == "saturated"
+    assert response.json()["checks"]["database"] == "skipped"
+    assert readiness == []
+
+    monkeypatch.setattr(health, "pool_usage", lambda: (1, 10))
+    monkeypatch.setattr(looplag.monitor, "lag", 1.0)
+    health.readiness.reset()
+    response = await client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["checks"]["loop_lag"]["status"] == "lagging"
+
+
+@pytest.mark.asyncio
+async def test_not_ready_during_shutdown(client: AsyncClient, readiness):
+    assert (await client.get("/readyz")).status_code == 200
+
+    health.mark_shutting_down()
+
+    response = await client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["checks"] == {"shutdown": True}
+    assert (await client.get("/livez")).status_code == 200
+
+
+def test_pool_capacity_comes_from_settings(monkeypatch):
+    engine = create_async_engine("postgresql+asyncpg://user@localhost/db", pool_size=4, max_overflow=6)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 4)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 6)
+    assert health.pool_usage() == (0, 10)
+
+    # Неограниченный overflow: пул не насыщается, сколько бы соединений ни было занято
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", -1)
+    assert health.pool_usage() is None
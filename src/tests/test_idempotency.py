@@ -0,0 +1,124 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from auth import AuthConfig
+from database import AppointmentChangeORM, AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import UserRole
+
+DOCTOR_DATA = {
+    "name": "TestDoctor",
+    "surname": "Test",
+    "age": 34,
+    "specialization": "travm",
+    "category": "first",
+    "password": "password"
+}
+
+
+@pytest.fixture
+def hash_calls(monkeypatch):
+    calls = []
+    original = crud.get_password_hash
+
+    def counting_hash(password):
+        calls.append(password)
+        return original(password)
+
+    monkeypatch.setattr(crud, "get_password_hash", counting_hash)
+    return calls
+
+
+async def _doctor_count(db_session: AsyncSession) -> int:
+    return (await db_session.execute(select(func.count()).select_from(DoctorORM))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_retry_replays_stored_response(client: AsyncClient, db_session: AsyncSession, hash_calls):
+    headers = {"Idempotency-Key": "create-doctor-1"}
+
+    first = await client.post("/doctors/", json=DOCTOR_DATA, headers=headers)
+    retry = await client.post("/doctors/", json=DOCTOR_DATA, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(hash_calls) == 1
+    assert await _doctor_count(db_session) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_first(client: AsyncClient, db_session: AsyncSession, hash_calls):
+    headers = {"Idempotency-Key": "create-doctor-2"}
+
+    responses = await asyncio.gather(*(client.post("/doctors/", json=DOCTOR_DATA, headers=headers) for _ in range(3)))
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert len(hash_calls) == 1
+    assert await _doctor_count(db_session) == 1
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_different_body(client: AsyncClient):
+    headers = {"Idempotency-Key": "create-doctor-3"}
+
+    await client.post("/doctors/", json=DOCTOR_DATA, headers=headers)
+    response = await client.post("/doctors/", json={**DOCTOR_DATA, "surname": "Other"}, headers=headers)
+
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_independent(client: AsyncClient, hash_calls):
+    first = await client.post("/doctors/", json=DOCTOR_DATA, headers={"Idempotency-Key": "a"})
+    second = await client.post("/doctors/", json=DOCTOR_DATA, headers={"Idempotency-Key": "b"})
+
+    assert first.status_code == 200
+    # Второй ключ — новый запрос: дубликат фамилии дает 409 как и без ключа
+    assert second.status_code == 409
+    assert len(hash_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_without_key_is_not_stored(client: AsyncClient, hash_calls):
+    await client.post("/doctors/", json=DOCTOR_DATA)
+    response = await client.post("/doctors/", json=DOCTOR_DATA)
+
+    assert response.status_code == 409
+    assert len(hash_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_appointment_retry_is_booked_once(client: AsyncClient, db_session: AsyncSession):
+    doctor_id, user_id, room_id = uuid4(), uuid4(), uuid4()
+    db_session.add_all([
+        DoctorORM(id=doctor_id, **{**DOCTOR_DATA, "password": "hashed"}),
+        UserORM(id=user_id, email="patient@test.com", name="Patient", surname="Zero", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed", disabled=False),
+        RoomORM(id=room_id, number=1),
+    ])
+    await db_session.commit()
+    token = jwt.encode(
+        {"sub": str(user_id), "role": UserRole.user.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "book-1"}
+    payload = {"date": "2026-11-20", "doctor_id": str(doctor_id), "room_id": str(room_id)}
+
+    first = await client.post("/appointments", json=payload, headers=headers)
+    retry = await client.post("/appointments", json=payload, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    for orm in (AppointmentORM, AppointmentChangeORM):
+        assert (await db_session.execute(select(func.count()).select_from(orm))).scalar_one() == 1
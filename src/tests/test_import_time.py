@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+# Зависимости, которые не должны загружаться при импорте приложения
+LAZY_MODULES = ("fastapi_mail", "jose", "passlib")
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=SRC_DIR,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _import_main_ms() -> float:
+    """Cumulative `import main` time as reported by `python -X importtime`."""
+    stderr = _run("import main", "-X", "importtime").stderr
+    for line in reversed(stderr.splitlines()):
+        _, cumulative, name = line.split("|")
+        if name.strip() == "main":
+            return int(cumulative) / 1000
+    raise AssertionError("main not found in -X importtime output")
+
+
+def test_import_main_within_budget(pytestconfig):
+    budget_ms = float(pytestconfig.getini("import_time_budget_ms"))
+    # Лучший из нескольких запусков, чтобы не ловить шум планировщика
+    elapsed_ms = min(_import_main_ms() for _ in range(3))
+    assert elapsed_ms <= budget_ms, f"import main took {elapsed_ms:.0f} ms, budget {budget_ms:.0f} ms"
+
+
+def test_heavy_dependencies_are_lazy():
+    code = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    assert _run(code).stdout.strip() == ""
@@ -0,0 +1,84 @@
+from uuid import uuid4
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from httpx import AsyncClient
+
+import jwks
+from auth import AuthConfig, create_access_token, decode_token
+from config import settings
+
+
+def _write_key(path, private_key) -> str:
+    path.write_bytes(private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                               serialization.NoEncryption()))
+    return str(path)
+
+
+@pytest.fixture
+def key_files(tmp_path, monkeypatch):
+    files = [_write_key(tmp_path / "ed25519.pem", ed25519.Ed25519PrivateKey.generate()),
+             _write_key(tmp_path / "rsa.pem", rsa.generate_private_key(public_exponent=65537, key_size=2048))]
+
+    def use(*paths):
+        monkeypatch.setattr(settings, "JWT_SIGNING_KEY_FILES", list(paths))
+        jwks.keyring.cache_clear()
+
+    use(*files)
+    yield files, use
+    jwks.keyring.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_tokens_verify_with_published_jwks(client: AsyncClient, key_files):
+    token = create_access_token(subject=str(uuid4()), role="admin")
+    header = jwt.get_unverified_header(token)
+
+    response = await client.get("/.well-known/jwks.json")
+
+    assert response.headers["cache-control"] == f"public, max-age={settings.JWKS_CACHE_SECONDS}"
+    published = jwt.PyJWKSet.from_dict(response.json())
+    assert [key.key_id for key in published.keys] == list(jwks.keyring().keys)
+    # Проверка как в стороннем сервисе: только публичный JWKS, без SECRET_KEY
+    assert header["alg"] == "EdDSA"
+    assert jwt.decode(token, published[header["kid"]], algorithms=["EdDSA"])["role"] == "admin"
+    assert decode_token(token)["role"] == "admin"
+
+
+def test_rotation_keeps_tokens_of_verify_only_keys(key_files):
+    (ed25519_file, rsa_file), use = key_files
+    use(rsa_file, ed25519_file)
+    token = create_access_token(subject="1")
+    assert jwt.get_unverified_header(token)["alg"] == "RS256"
+
+    # Новый ключ первым, старый еще проверяет
+    use(ed25519_file, rsa_file)
+    assert decode_token(token)["sub"] == "1"
+
+    use(ed25519_file)
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_token(token)
+
+
+def test_kid_is_stable_and_pins_the_algorithm(key_files):
+    (ed25519_file, _), use = key_files
+    kid = jwks.keyring().active.kid
+    use(ed25519_file)
+    assert jwks.keyring().active.kid == kid
+
+    # HS256 с публичным ключом в качестве секрета не проходит: алгоритм задан ключом
+    public = jwks.keyring().active.public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    forged = jwt.encode({"sub": "1"}, public, algorithm="HS256", headers={"kid": kid})
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_token(forged)
+
+
+def test_shared_secret_tokens_during_migration(key_files, monkeypatch):
+    legacy = jwt.encode({"sub": "1"}, AuthConfig.SECRET_KEY, algorithm=AuthConfig.ALGORITHM)
+    assert decode_token(legacy)["sub"] == "1"
+
+    monkeypatch.setattr(settings, "JWT_ACCEPT_SHARED_SECRET", False)
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_token(legacy)
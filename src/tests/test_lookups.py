@@ -0,0 +1,81 @@
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import database
+from config import settings
+from database import DoctorORM, UserORM
+from model import CategoryEnum, UserRole
+
+
+async def _create(db_session: AsyncSession) -> tuple[list[dict], list[dict]]:
+    doctors = [
+        DoctorORM(id=uuid4(), name=f"Doctor{i}", surname=f"House{i}", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password")
+        for i in range(2)
+    ]
+    users = [
+        UserORM(id=uuid4(), name=f"User{i}", surname=f"Zero{i}", email=f"user{i}@example.com", age=30,
+                phone=f"+37529123456{i}", role=UserRole.user, password="hashed_password", disabled=False)
+        for i in range(2)
+    ]
+    created = ([{"id": doctor.id, "name": doctor.name} for doctor in doctors],
+               [{"id": user.id, "email": user.email} for user in users])
+    db_session.add_all(doctors + users)
+    await db_session.commit()
+    return created
+
+
+@pytest.mark.asyncio
+async def test_cached_lookups_bind_each_call_arguments(db_session: AsyncSession):
+    doctors, users = await _create(db_session)
+    db_session.expunge_all()
+
+    # Один и тот же закэшированный lambda-запрос, разные значения параметра
+    for doctor in doctors:
+        assert (await crud.get_doctor(db_session, doctor["id"])).name == doctor["name"]
+    for user in users:
+        assert (await crud.get_user(db_session, user["id"])).email == user["email"]
+        assert (await crud.get_user_by_email(db_session, user["email"])).id == user["id"]
+    assert await crud.get_doctor(db_session, uuid4()) is None
+    assert await crud.get_user_by_email(db_session, "nobody@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_lookup_hides_soft_deleted(db_session: AsyncSession):
+    doctors, _ = await _create(db_session)
+    await crud.delete_doctor(db_session, doctors[0]["id"])
+    db_session.expunge_all()
+
+    assert await crud.get_doctor(db_session, doctors[0]["id"]) is None
+    assert (await crud.get_doctor(db_session, doctors[1]["id"])).id == doctors[1]["id"]
+
+
+@pytest.mark.asyncio
+async def test_malformed_subject_is_unauthorized(client: AsyncClient):
+    from main import create_access_token
+
+    response = await client.get("/users/me/appointments",
+                                headers={"Authorization": f"Bearer {create_access_token('not-a-uuid')}"})
+
+    assert response.status_code == 401
+
+
+def test_prepared_statement_cache_size_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PREPARED_STATEMENT_CACHE_SIZE", 42)
+    engine = database.create_async_engine
+    captured = {}
+    monkeypatch.setattr(database, "create_async_engine", lambda url, **kwargs: captured.update(kwargs) or engine(url, **kwargs))
+    previous = database.engine
+
+    try:
+        database.init_engine("postgresql+asyncpg://user@localhost/db")
+    finally:
+        database.engine = previous
+        database.async_session.configure(bind=previous)
+
+    assert captured["connect_args"] == {"prepared_statement_cache_size": 42}
+    assert captured["pool_size"] == settings.DB_POOL_SIZE
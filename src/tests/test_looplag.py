@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+import looplag
+from config import settings
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    monkeypatch.setattr(settings, "LOOP_LAG_INTERVAL_MS", 10)
+    monkeypatch.setattr(settings, "LOOP_LAG_THRESHOLD_MS", 100)
+    handler = ListHandler()
+    looplag.logger.addHandler(handler)
+    yield handler.messages
+    looplag.logger.removeHandler(handler)
+
+
+@asynccontextmanager
+async def running_monitor():
+    # Монитор запускается в цикле самого теста, а не в цикле фикстур
+    monitor = looplag.LoopMonitor()
+    monitor.start()
+    await asyncio.sleep(0.05)
+    try:
+        yield monitor
+    finally:
+        await monitor.stop()
+
+
+def _hash_password_synchronously():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_blocking_handler_is_logged_with_route(messages):
+    app = FastAPI()
+
+    @app.get("/block")
+    async def block():
+        _hash_password_synchronously()
+        return {}
+
+    blocked_before = looplag.blocked_total.get("GET /block")
+    async with running_monitor() as monitor, AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/block")).status_code == 200
+        await asyncio.sleep(0.05)
+        lag, max_lag = monitor.lag, monitor.take_max()
+
+    assert len(messages) == 1
+    assert "while serving GET /block" in messages[0]
+    assert "_hash_password_synchronously" in messages[0]
+    assert looplag.blocked_total.get("GET /block") - blocked_before == 1
+    assert lag < 0.1
+    assert max_lag >= 0.25
+
+
+@pytest.mark.asyncio
+async def test_short_pauses_are_measured_but_not_logged(messages):
+    async with running_monitor() as monitor:
+        monitor.take_max()
+        time.sleep(0.05)
+        await asyncio.sleep(0.05)
+        max_lag = monitor.take_max()
+
+    assert messages == []
+    assert 0.03 <= max_lag < 0.1
@@ -0,0 +1,86 @@
+from datetime import UTC, date, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import AuthConfig
+from database import AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import CategoryEnum, UserRole
+from partitions import add_months, ensure_partitions, partition_name
+
+
+async def _create_parties(db_session: AsyncSession) -> dict:
+    ids = {"doctor": uuid4(), "user": uuid4(), "room": uuid4()}
+    db_session.add_all([
+        DoctorORM(id=ids["doctor"], name="Gregory", surname="House", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password"),
+        UserORM(id=ids["user"], name="Patient", surname="Zero", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        RoomORM(id=ids["room"], number=1),
+    ])
+    await db_session.commit()
+    return ids
+
+
+async def _partition_of(db_session: AsyncSession, appointment_date: date) -> str:
+    return (await db_session.execute(
+        text("SELECT tableoid::regclass::text FROM appointments WHERE date = :date"), {"date": appointment_date}
+    )).scalar_one()
+
+
+def test_add_months_and_names():
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partition_name(date(2026, 3, 1)) == "appointments_y2026m03"
+
+
+@pytest.mark.asyncio
+async def test_ensure_partitions_is_idempotent(engine, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "APPOINTMENT_PARTITIONS_AHEAD", 2)
+
+    created = await ensure_partitions(engine, today=date(2026, 11, 15))
+
+    assert created == ["appointments_y2026m11", "appointments_y2026m12", "appointments_y2027m01"]
+    assert await ensure_partitions(engine, today=date(2026, 11, 15)) == []
+
+
+@pytest.mark.asyncio
+async def test_rows_are_moved_out_of_default_partition(engine, db_session: AsyncSession):
+    ids = await _create_parties(db_session)
+    db_session.add(AppointmentORM(doctor_id=ids["doctor"], user_id=ids["user"], room_id=ids["room"],
+                                  date=date(2027, 6, 10)))
+    await db_session.commit()
+    assert await _partition_of(db_session, date(2027, 6, 10)) == "appointments_default"
+    await db_session.commit()  # ATTACH PARTITION ждет завершения конкурирующих транзакций
+
+    await ensure_partitions(engine, today=date(2027, 6, 1))
+
+    assert await _partition_of(db_session, date(2027, 6, 10)) == "appointments_y2027m06"
+
+
+@pytest.mark.asyncio
+async def test_create_appointment_stores_native_date(client: AsyncClient, db_session: AsyncSession):
+    ids = await _create_parties(db_session)
+    token = jwt.encode(
+        {"sub": str(ids["user"]), "role": UserRole.user.value,
+         "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+
+    response = await client.post(
+        "/appointments",
+        json={"date": "2026-11-20", "doctor_id": str(ids["doctor"]), "room_id": str(ids["room"])},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["date"] == "2026-11-20"
+    stored = (await db_session.execute(text("SELECT date FROM appointments"))).scalar_one()
+    assert stored == date(2026, 11, 20)
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import profiler
+from auth import AuthConfig
+from database import UserORM
+from model import UserRole
+
+
+def _spin(seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+async def _token(db_session: AsyncSession, role: UserRole) -> str:
+    user_id = uuid4()
+    db_session.add(UserORM(id=user_id, name="Admin", surname="Root", email=f"{user_id}@example.com", age=40,
+                           phone=f"+37529{user_id.int % 10**7:07d}", role=role, password="hashed_password", disabled=False))
+    await db_session.commit()
+    return jwt.encode(
+        {"sub": str(user_id), "role": role.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+
+
+def test_sample_aggregates_stacks_of_thread():
+    busy = threading.Thread(target=_spin, args=(0.3,))
+    busy.start()
+
+    result = profiler.sample(busy.ident, 0.1, 0.005)
+    busy.join()
+
+    assert result.samples > 5
+    (top, _), = result.stacks.most_common(1)
+    assert top[-1][0] == "_spin"
+    assert result.collapsed().splitlines()[0].endswith(f" {result.stacks[top]}")
+    speedscope = result.speedscope()
+    frames = speedscope["shared"]["frames"]
+    (profile,) = speedscope["profiles"]
+    assert len(profile["samples"]) == len(profile["weights"]) == len(result.stacks)
+    assert all(0 <= index < len(frames) for stack in profile["samples"] for index in stack)
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_sees_blocking_code(client: AsyncClient, db_session: AsyncSession):
+    headers = {"Authorization": f"Bearer {await _token(db_session, UserRole.admin)}"}
+
+    async def block_loop():
+        await asyncio.sleep(0.05)
+        _spin(0.15)
+
+    response, _ = await asyncio.gather(
+        client.post("/debug/profile", params={"seconds": 0.3}, headers=headers), block_loop()
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert any("_spin (" in line.split(";")[-1] for line in response.text.splitlines())
+
+    response = await client.post("/debug/profile", params={"seconds": 0.05, "format": "speedscope"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["profiles"][0]["type"] == "sampled"
+
+
+@pytest.mark.asyncio
+async def test_one_profile_per_worker(client: AsyncClient, db_session: AsyncSession):
+    headers = {"Authorization": f"Bearer {await _token(db_session, UserRole.admin)}"}
+
+    running = asyncio.create_task(profiler.profile(0.3))
+    await asyncio.sleep(0)
+
+    response = await client.post("/debug/profile", params={"seconds": 0.1}, headers=headers)
+    assert response.status_code == 409
+    await running
+    assert (await client.post("/debug/profile", params={"seconds": 0.05}, headers=headers)).status_code == 200
+    user_headers = {"Authorization": f"Bearer {await _token(db_session, UserRole.user)}"}
+    assert (await client.post("/debug/profile", params={"seconds": 0.1}, headers=user_headers)).status_code == 403
+    assert (await client.post("/debug/profile", params={"seconds": 600}, headers=headers)).status_code == 422
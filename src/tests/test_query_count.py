@@ -0,0 +1,91 @@
+from datetime import UTC, datetime, timedelta
+from typing import Annotated
+from uuid import uuid4
+
+import jwt
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import AuthConfig
+from database import DoctorORM, RoomORM, UserORM, get_session
+from model import CategoryEnum, UserRole
+from querycount import QueryCountMiddleware, n_plus_one_total, queries_total
+
+
+async def _create_parties(db_session: AsyncSession) -> dict:
+    ids = {"doctor": uuid4(), "user": uuid4(), "room": uuid4()}
+    db_session.add_all([
+        DoctorORM(id=ids["doctor"], name="Gregory", surname="House", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password"),
+        UserORM(id=ids["user"], name="Patient", surname="Zero", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        RoomORM(id=ids["room"], number=1),
+    ])
+    await db_session.commit()
+    return ids
+
+
+def _token(user_id) -> str:
+    return jwt.encode(
+        {"sub": str(user_id), "role": UserRole.user.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+
+
+@pytest.mark.asyncio
+async def test_read_endpoints_query_budget(client: AsyncClient, db_session: AsyncSession, max_queries):
+    ids = await _create_parties(db_session)
+    headers = {"Authorization": f"Bearer {_token(ids['user'])}"}
+
+    budgets = [
+        ("/doctors/", {}, 1),
+        (f"/doctors/{ids['doctor']}", {}, 1),
+        (f"/doctors/{ids['doctor']}/appointments", {}, 1),
+        ("/users/me/appointments", headers, 2),
+    ]
+    for url, request_headers, limit in budgets:
+        with max_queries(limit):
+            response = await client.get(url, headers=request_headers)
+        assert response.status_code == 200, url
+
+
+@pytest.mark.asyncio
+async def test_create_appointment_query_budget(client: AsyncClient, db_session: AsyncSession, max_queries):
+    ids = await _create_parties(db_session)
+
+    # Пользователь, врач, блокировка журнала, две вставки, NOTIFY и refresh
+    with max_queries(7):
+        response = await client.post(
+            "/appointments",
+            json={"date": "2026-11-02", "doctor_id": str(ids["doctor"]), "room_id": str(ids["room"])},
+            headers={"Authorization": f"Bearer {_token(ids['user'])}"}
+        )
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_repeated_statement_is_reported_per_route(db_session: AsyncSession):
+    loop_app = FastAPI()
+    loop_app.add_middleware(QueryCountMiddleware)
+
+    @loop_app.get("/loop/{count}")
+    async def loop(count: int, db: Annotated[AsyncSession, Depends(get_session)]):
+        for _ in range(count):
+            await db.execute(select(DoctorORM).where(DoctorORM.id == uuid4()))
+        return {}
+
+    loop_app.dependency_overrides[get_session] = lambda: db_session
+    route = "GET /loop/{count}"
+    reported_before, queries_before = n_plus_one_total.get(route), queries_total.get(route)
+
+    async with AsyncClient(transport=ASGITransport(app=loop_app), base_url="http://test") as client:
+        await client.get("/loop/2")
+        assert n_plus_one_total.get(route) == reported_before
+        await client.get("/loop/5")
+
+    assert n_plus_one_total.get(route) - reported_before == 1
+    assert queries_total.get(route) - queries_before == 7
@@ -0,0 +1,62 @@
+import asyncio
+import signal
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+import changefeed
+import health
+import shutdown
+from config import settings
+
+
+@pytest.fixture
+def server_handler(monkeypatch):
+    monkeypatch.setattr(settings, "SHUTDOWN_DRAIN_DELAY_SECONDS", 0.1)
+    calls = []
+    previous = signal.signal(signal.SIGTERM, lambda sig, frame: calls.append(sig))
+    health.readiness.reset()
+    yield calls
+    signal.signal(signal.SIGTERM, previous)
+    health.readiness.reset()
+
+
+@pytest.mark.asyncio
+async def test_sigterm_drains_before_server_shutdown(server_handler):
+    subscription = changefeed.hub.subscribe()
+    shutdown.install_signal_handler()
+
+    signal.raise_signal(signal.SIGTERM)
+    await asyncio.sleep(0.02)
+
+    # Воркер уже не готов, SSE-поток закрыт, но сервер еще работает
+    assert health.readiness.shutting_down
+    assert subscription.queue.get_nowait() is None
+    assert server_handler == []
+    await asyncio.sleep(0.15)
+    assert server_handler == [signal.SIGTERM]
+
+    signal.raise_signal(signal.SIGTERM)
+    assert server_handler == [signal.SIGTERM, signal.SIGTERM]
+
+
+@pytest.mark.asyncio
+async def test_wait_idle_waits_for_in_flight_requests():
+    app = FastAPI()
+    app.add_middleware(shutdown.InFlightMiddleware)
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.2)
+        return {}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        request = asyncio.create_task(client.get("/slow"))
+        await asyncio.sleep(0.05)
+        assert shutdown.requests.count == 1
+        assert not await shutdown.requests.wait_idle(0.01)
+
+        assert await shutdown.requests.wait_idle(1)
+        assert (await request).status_code == 200
+    assert shutdown.requests.count == 0
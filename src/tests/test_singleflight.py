@@ -0,0 +1,86 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import crud
+from database import DoctorORM
+from model import CategoryEnum
+from singleflight import calls_total, coalesced_total
+
+
+async def _create_doctor(db_session: AsyncSession):
+    doctor_id = uuid4()
+    db_session.add(DoctorORM(
+        id=doctor_id,
+        name="Gregory",
+        surname="House",
+        age=45,
+        specialization="therapist",
+        category=CategoryEnum.HIGHEST,
+        password="hashed_password"
+    ))
+    await db_session.commit()
+    return doctor_id
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_doctor_is_coalesced(engine, db_session: AsyncSession):
+    doctor_id = await _create_doctor(db_session)
+    sessions = async_sessionmaker(engine)
+    coalesced_before = coalesced_total.get("get_doctor")
+    calls_before = calls_total.get("get_doctor")
+
+    async with sessions() as first, sessions() as second, sessions() as third:
+        doctors = await asyncio.gather(
+            crud.get_doctor(first, doctor_id),
+            crud.get_doctor(second, doctor_id),
+            crud.get_doctor(third, doctor_id),
+        )
+
+        assert calls_total.get("get_doctor") - calls_before == 3
+        assert coalesced_total.get("get_doctor") - coalesced_before == 2
+        # Каждый запрос получает свой объект в своей сессии
+        assert len({id(doctor) for doctor in doctors}) == 3
+        for session, doctor in zip((first, second, third), doctors, strict=True):
+            assert doctor in session
+            assert doctor.id == doctor_id
+            assert doctor.surname == "House"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_object_is_usable_for_updates(engine, db_session: AsyncSession):
+    doctor_id = await _create_doctor(db_session)
+    sessions = async_sessionmaker(engine)
+
+    async with sessions() as first, sessions() as second:
+        _, doctor = await asyncio.gather(crud.get_doctor(first, doctor_id), crud.get_doctor(second, doctor_id))
+        doctor.age = 50
+        await second.commit()
+
+    async with sessions() as check:
+        assert (await check.get(DoctorORM, doctor_id)).age == 50
+
+
+@pytest.mark.asyncio
+async def test_session_in_transaction_is_not_coalesced(engine, db_session: AsyncSession):
+    doctor_id = await _create_doctor(db_session)
+    sessions = async_sessionmaker(engine)
+    calls_before = calls_total.get("get_doctor")
+
+    async with sessions() as session:
+        await session.get(DoctorORM, uuid4())
+        assert session.in_transaction()
+        await crud.get_doctor(session, doctor_id)
+
+    assert calls_total.get("get_doctor") == calls_before
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client: AsyncClient):
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "singleflight_coalescing_ratio" in response.text
@@ -0,0 +1,75 @@
+import io
+import json
+import logging
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import querycount
+import slowquery
+from config import settings
+from database import DoctorORM
+from model import CategoryEnum
+
+
+@pytest.fixture
+def slow_log():
+    stream = io.StringIO()
+    slowquery.start(logging.StreamHandler(stream))
+    records = []
+
+    def collect() -> list[dict]:
+        slowquery.stop()
+        records.extend(json.loads(line) for line in stream.getvalue().splitlines())
+        return records
+
+    yield collect
+    slowquery.stop()
+
+
+def test_fingerprint_ignores_values():
+    first = "SELECT * FROM doctors WHERE id IN ($1::UUID, $2::UUID) AND age > 30 AND name = 'House'"
+    second = "SELECT * FROM doctors WHERE id IN ($1::UUID, $2::UUID, $3::UUID) AND age > 45 AND name = 'O''Neil'"
+
+    normalized, digest = slowquery.fingerprint(first)
+
+    assert normalized == "SELECT * FROM doctors WHERE id IN (...) AND age > ? AND name = ?"
+    assert slowquery.fingerprint(second)[1] == digest
+
+
+@pytest.mark.asyncio
+async def test_request_context_and_redacted_params(client: AsyncClient, db_session: AsyncSession, slow_log, monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+    doctor_id = uuid4()
+    db_session.add(DoctorORM(id=doctor_id, name="Gregory", surname="House", age=45, specialization="therapist",
+                             category=CategoryEnum.HIGHEST, password="hashed_password"))
+    await db_session.commit()
+
+    response = await client.get(f"/doctors/{doctor_id}", headers={"X-Request-ID": "req-42"})
+
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "req-42"
+    records = [record for record in slow_log() if record["request_id"] == "req-42"]
+    assert len(records) == 1
+    assert records[0]["route"] == "GET /doctors/{doctor_id}"
+    assert records[0]["params"] == ["UUID"]
+    assert records[0]["rows"] == 1
+    assert str(doctor_id) not in json.dumps(records)
+
+
+@pytest.mark.asyncio
+async def test_only_statements_above_threshold_are_logged(db_session: AsyncSession, slow_log, monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 50)
+
+    with querycount.track(request_id="job-1"):
+        await db_session.execute(text("SELECT 1"))
+        await db_session.execute(text("SELECT pg_sleep(0.1)"))
+
+    records = slow_log()
+    assert [record["statement"] for record in records] == ["SELECT pg_sleep(?)"]
+    assert records[0]["duration_ms"] >= 50
+    assert records[0]["request_id"] == "job-1"
+    assert records[0]["route"] is None
@@ -0,0 +1,115 @@
+from datetime import date
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import crud
+from config import settings
+from database import AppointmentChangeORM, AppointmentORM, DoctorORM, RoomORM, UserORM
+from model import AppointmentChangeOp, CategoryEnum, UserRole
+from purger import LOCK_ID, Purger, purged_total
+
+
+async def _create_doctor_with_appointments(db_session: AsyncSession, count: int) -> tuple:
+    doctor_id, user_id, room_id = uuid4(), uuid4(), uuid4()
+    db_session.add_all([
+        DoctorORM(id=doctor_id, name="Gregory", surname="House", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password"),
+        UserORM(id=user_id, name="Patient", surname="Zero", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        RoomORM(id=room_id, number=1),
+    ])
+    await db_session.flush()
+    db_session.add_all([
+        AppointmentORM(doctor_id=doctor_id, user_id=user_id, room_id=room_id, date=date(2026, 11, 1 + i % 28))
+        for i in range(count)
+    ])
+    await db_session.commit()
+    return doctor_id, user_id
+
+
+async def _raw_count(db_session: AsyncSession, table: str) -> int:
+    # Core-запрос по тексту: фильтр надгробий его не касается
+    return (await db_session.execute(text(f"SELECT count(*) FROM {table}"))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_deleted_doctor_is_hidden_immediately(client: AsyncClient, db_session: AsyncSession):
+    doctor_id, user_id = await _create_doctor_with_appointments(db_session, 3)
+
+    response = await client.delete(f"/doctors/{doctor_id}")
+    assert response.status_code == 200
+
+    assert (await client.get(f"/doctors/{doctor_id}")).status_code == 404
+    assert await crud.get_appointments(db_session, 1, 10) == []
+    assert await crud.get_user_appointments(db_session, user_id, "upcoming", 10, today=date(2026, 1, 1)) == []
+    # Физически строки еще на месте — их удалит purger
+    assert await _raw_count(db_session, "doctors") == 1
+    assert await _raw_count(db_session, "appointments") == 3
+
+
+@pytest.mark.asyncio
+async def test_deleted_user_cannot_be_found_by_email(client: AsyncClient, db_session: AsyncSession):
+    _, user_id = await _create_doctor_with_appointments(db_session, 1)
+
+    await client.delete(f"/users/{user_id}")
+
+    assert await crud.get_user_by_email(db_session, "patient@example.com") is None
+    assert (await db_session.execute(
+        select(func.count()).select_from(UserORM).execution_options(include_deleted=True)
+    )).scalar_one() == 1
+
+
+@pytest.mark.asyncio
+async def test_purger_deletes_in_batches(engine, client: AsyncClient, db_session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(settings, "PURGE_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "PURGE_BATCH_DELAY_SECONDS", 0)
+    doctor_id, _ = await _create_doctor_with_appointments(db_session, 5)
+    await client.delete(f"/doctors/{doctor_id}")
+    purged_before = purged_total.get("appointments")
+
+    purger = Purger()
+    assert await purger.purge_next() is True
+
+    assert purger.progress["table"] == "doctors"
+    assert purger.progress["appointments_deleted"] == 5
+    assert purged_total.get("appointments") - purged_before == 5
+    async with async_sessionmaker(engine)() as check:
+        assert await _raw_count(check, "appointments") == 0
+        assert await _raw_count(check, "doctors") == 0
+    assert await purger.purge_next() is False
+
+
+@pytest.mark.asyncio
+async def test_purger_records_deleted_changes(engine, client: AsyncClient, db_session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(settings, "PURGE_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "PURGE_BATCH_DELAY_SECONDS", 0)
+    doctor_id, user_id = await _create_doctor_with_appointments(db_session, 3)
+    await client.delete(f"/doctors/{doctor_id}")
+
+    assert await Purger().purge_next() is True
+
+    async with async_sessionmaker(engine)() as check:
+        changes = (await check.execute(select(AppointmentChangeORM).order_by(AppointmentChangeORM.seq))).scalars().all()
+    assert [change.op for change in changes] == [AppointmentChangeOp.deleted] * 3
+    assert {(change.doctor_id, change.user_id) for change in changes} == {(doctor_id, user_id)}
+    assert len({change.appointment_id for change in changes}) == 3
+
+
+@pytest.mark.asyncio
+async def test_purger_skips_entity_claimed_by_another_worker(engine, client: AsyncClient, db_session: AsyncSession):
+    doctor_id, _ = await _create_doctor_with_appointments(db_session, 2)
+    await client.delete(f"/doctors/{doctor_id}")
+    lock = {"lock": LOCK_ID, "entity": str(doctor_id)}
+
+    async with engine.connect() as other_worker:
+        await other_worker.execute(text("SELECT pg_advisory_lock(:lock, hashtext(:entity))"), lock)
+        assert await Purger().purge_next() is False
+        assert await _raw_count(db_session, "appointments") == 2
+        await other_worker.execute(text("SELECT pg_advisory_unlock(:lock, hashtext(:entity))"), lock)
+
+    assert await Purger().purge_next() is True
+    assert await _raw_count(db_session, "appointments") == 0
@@ -0,0 +1,112 @@
+import importlib.util
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import specializations
+from database import DoctorORM, SpecializationCountORM
+
+MIGRATION = Path(__file__).parent.parent / "migrations" / "versions" / "8c2f4a6d1e53_add_specialization_catalog.py"
+
+
+def _migration():
+    spec = importlib.util.spec_from_file_location("specialization_catalog_migration", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(autouse=True)
+def fresh_counts():
+    specializations.counts.invalidate()
+    yield
+    specializations.counts.invalidate()
+
+
+async def _create(client: AsyncClient, surname: str, specialization: str, category: str) -> str:
+    response = await client.post("/doctors/", json={"name": "Doctor", "surname": surname, "age": 40,
+                                                    "specialization": specialization, "category": category,
+                                                    "password": "secret"})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+async def _catalog(client: AsyncClient) -> dict:
+    response = await client.get("/specializations")
+    assert response.status_code == 200
+    return {item["name"]: (item["doctors"], item["categories"]) for item in response.json()}
+
+
+@pytest.mark.asyncio
+async def test_counts_follow_doctor_writes(client: AsyncClient):
+    house = await _create(client, "House", "Cardiologist", "first")
+    await _create(client, "Wilson", "  cardiologist ", "highest")
+    cuddy = await _create(client, "Cuddy", "Surgeon", "second")
+
+    # Разные написания — одна запись каталога
+    assert await _catalog(client) == {
+        "Cardiologist": (2, {"first": 1, "highest": 1}),
+        "Surgeon": (1, {"second": 1}),
+    }
+
+    assert (await client.patch(f"/doctors/{house}", json={"category": "second"})).status_code == 200
+    assert (await client.patch(f"/doctors/{cuddy}", json={"specialization": "Dean of medicine"})).status_code == 200
+    assert await _catalog(client) == {
+        "Cardiologist": (2, {"second": 1, "highest": 1}),
+        "Dean of medicine": (1, {"second": 1}),
+    }
+
+    assert (await client.delete(f"/doctors/{house}")).status_code == 200
+    assert await _catalog(client) == {
+        "Cardiologist": (1, {"highest": 1}),
+        "Dean of medicine": (1, {"second": 1}),
+    }
+
+
+@pytest.mark.asyncio
+async def test_counts_match_aggregate_over_doctors(client: AsyncClient, db_session: AsyncSession):
+    ids = [await _create(client, f"Doc{i}", ("Therapist", "Dentist")[i % 2], ("first", "second")[i % 3 % 2])
+           for i in range(6)]
+    await client.patch(f"/doctors/{ids[0]}", json={"specialization": "Dentist", "category": "highest"})
+    await client.delete(f"/doctors/{ids[1]}")
+
+    aggregate = (await db_session.execute(
+        select(DoctorORM.specialization_id, DoctorORM.category, func.count())
+        .group_by(DoctorORM.specialization_id, DoctorORM.category)
+    )).all()
+    maintained = (await db_session.execute(
+        select(SpecializationCountORM.specialization_id, SpecializationCountORM.category, SpecializationCountORM.doctors)
+        .where(SpecializationCountORM.doctors > 0)
+    )).all()
+    assert sorted(maintained) == sorted(aggregate)
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_served_from_cache(client: AsyncClient, max_queries):
+    await _create(client, "House", "Cardiologist", "first")
+    first = await client.get("/specializations")
+
+    with max_queries(0):
+        assert (await client.get("/specializations")).json() == first.json()
+
+
+@pytest.mark.asyncio
+async def test_backfill_normalizes_like_new_doctors(client: AsyncClient, db_session: AsyncSession):
+    # Врач, записанный до миграции: specialization_id еще нет, значение с табуляцией и переводом строки
+    await db_session.execute(text("ALTER TABLE doctors ALTER COLUMN specialization_id DROP NOT NULL"))
+    await db_session.execute(
+        text("INSERT INTO doctors (id, name, surname, age, specialization, category, password) "
+             "VALUES (:id, 'Doctor', 'Legacy', 40, :specialization, 'FIRST', 'x')"),
+        {"id": uuid4(), "specialization": "\tCardiologist\n"},
+    )
+    for statement in _migration().BACKFILL:
+        await db_session.execute(text(statement))
+    await db_session.commit()
+
+    await _create(client, "House", "Cardiologist", "first")
+
+    assert await _catalog(client) == {"Cardiologist": (2, {"first": 2})}
@@ -0,0 +1,121 @@
+import json
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+import jwt
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import tracing
+from auth import AuthConfig
+from config import settings
+from database import DoctorORM, RoomORM, UserORM
+from model import CategoryEnum, UserRole
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATIO", 1.0)
+    monkeypatch.setattr(settings, "TRACING_EXPORT_INTERVAL_SECONDS", 0.01)
+    exporter = ListExporter()
+    tracing.start(exporter)
+    yield exporter.spans
+    tracing.stop()
+
+
+async def _create_parties(db_session: AsyncSession) -> dict:
+    ids = {"doctor": uuid4(), "user": uuid4(), "room": uuid4()}
+    db_session.add_all([
+        DoctorORM(id=ids["doctor"], name="Gregory", surname="House", age=45, specialization="therapist",
+                  category=CategoryEnum.HIGHEST, password="hashed_password"),
+        UserORM(id=ids["user"], name="Patient", surname="Zero", email="patient@example.com", age=30,
+                phone="+375291234567", role=UserRole.user, password="hashed_password", disabled=False),
+        RoomORM(id=ids["room"], number=1),
+    ])
+    await db_session.commit()
+    return ids
+
+
+def _token(user_id) -> str:
+    return jwt.encode(
+        {"sub": str(user_id), "role": UserRole.user.value, "exp": datetime.now(UTC) + timedelta(minutes=30)},
+        AuthConfig.SECRET_KEY,
+        algorithm=AuthConfig.ALGORITHM
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_appointment_trace_tree(client: AsyncClient, db_session: AsyncSession, exported):
+    ids = await _create_parties(db_session)
+
+    response = await client.post(
+        "/appointments",
+        json={"date": "2026-11-02", "doctor_id": str(ids["doctor"]), "room_id": str(ids["room"])},
+        headers={"Authorization": f"Bearer {_token(ids['user'])}"}
+    )
+    assert response.status_code == 200
+    tracing.stop()
+
+    by_id = {span.span_id: span for span in exported}
+    (server,) = [span for span in exported if span.kind == tracing.SERVER]
+    assert server.name == "POST /appointments"
+    assert server.attributes["http.response.status_code"] == 200
+    assert {span.trace_id for span in exported} == {server.trace_id}
+
+    def children(parent):
+        return [span.name for span in exported if span.parent_id == parent.span_id]
+
+    assert {"auth.jwt_decode", "auth.user_lookup", "crud.get_doctor", "crud.record_appointment_change"} <= set(children(server))
+    (get_doctor,) = [span for span in exported if span.name == "crud.get_doctor"]
+    assert children(get_doctor) == ["SELECT"]
+    (lookup,) = [span for span in exported if span.name == "auth.user_lookup"]
+    assert children(lookup) == ["SELECT"]
+    inserts = [span for span in exported if span.name == "INSERT"]
+    assert inserts and all(by_id[span.parent_id].name == "crud.record_appointment_changes" for span in inserts)
+    # Значения параметров в спан не попадают
+    assert all(str(ids["doctor"]) not in span.attributes.get("db.query.text", "") for span in exported)
+    assert all(span.end_ns >= span.start_ns > 0 for span in exported)
+
+
+@pytest.mark.asyncio
+async def test_sample_ratio_and_traceparent(client: AsyncClient, exported, monkeypatch):
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATIO", 0.0)
+
+    assert (await client.get("/doctors/")).status_code == 200
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    response = await client.get("/doctors/", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    assert response.status_code == 200
+    tracing.stop()
+
+    # Непросемплированный запрос не записан, входящий sampled-флаг соблюдается
+    assert exported and {span.trace_id for span in exported} == {trace_id}
+    (server,) = [span for span in exported if span.kind == tracing.SERVER]
+    assert server.parent_id == parent_id
+    assert server.name == "GET /doctors/"
+
+
+def test_file_exporter_writes_otlp_json(tmp_path):
+    span = tracing.Span("crud.get_doctor", tracing.INTERNAL, "ab" * 16, "cd" * 8, True)
+    span.set("db.response.returned_rows", 1)
+    span.end_ns = span.start_ns + 1000
+
+    tracing.FileExporter(str(tmp_path / "traces.jsonl")).export([span])
+
+    (line,) = (tmp_path / "traces.jsonl").read_text().splitlines()
+    (resource,) = json.loads(line)["resourceSpans"]
+    assert resource["resource"]["attributes"] == [
+        {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}}
+    ]
+    (exported,) = resource["scopeSpans"][0]["spans"]
+    assert exported["traceId"] == "ab" * 16 and exported["parentSpanId"] == "cd" * 8
+    assert exported["attributes"] == [{"key": "db.response.returned_rows", "value": {"intValue": "1"}}]
+    assert int(exported["endTimeUnixNano"]) - int(exported["startTimeUnixNano"]) == 1000
@@ -0,0 +1,29 @@
+import pytest
+
+import server
+from config import settings
+from main import app
+from warmup import warm_pool, warm_up
+
+
+def test_worker_count_override(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 3)
+    assert server.worker_count() == 3
+
+
+def test_worker_count_from_cpus(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", None)
+    monkeypatch.setattr(server, "available_cpus", lambda: 64)
+    assert server.worker_count() == settings.MAX_WORKERS
+
+
+@pytest.mark.asyncio
+async def test_warm_pool_opens_connections(engine):
+    assert await warm_pool(engine) >= 1
+
+
+@pytest.mark.asyncio
+async def test_warm_up_builds_openapi_schema(engine):
+    app.openapi_schema = None
+    await warm_up(app, engine)
+    assert app.openapi_schema is not None
@@ -0,0 +1,341 @@
+"""
+Request tracing with OpenTelemetry-compatible spans.
+
+Spans follow the OpenTelemetry data model (128-bit trace id, 64-bit span
+id, W3C `traceparent` propagation). They are exported in the OTLP/JSON
+encoding, so the OpenTelemetry SDK is not needed:
+
+- "file": one ExportTraceServiceRequest per line in TRACING_FILE. This is
+  the format of the collector's otlpjsonfile receiver and works fully
+  offline.
+- "otlp": POST to an OTLP/HTTP endpoint such as a local collector on
+  :4318.
+
+Spans are recorded for TracingMiddleware (one server span per request),
+`@traced` functions (crud.py), `span()` blocks (JWT decode, user lookup,
+bcrypt) and every SQL statement (`instrument(engine)`).
+
+Sampling is decided once per trace, at its root, with probability
+TRACING_SAMPLE_RATIO. A sampled incoming `traceparent` is always honoured.
+Unsampled traces cost one ContextVar lookup per span. Finished spans are
+queued and exported in batches by a background thread.
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+import slowquery
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# SpanKind из OTLP
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+exported_total = metrics.counter("tracing_spans_exported_total", "Spans handed to the trace exporter")
+dropped_total = metrics.counter("tracing_spans_dropped_total", "Spans lost because the exporter failed")
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled", "attributes",
+                 "start_ns", "end_ns", "status", "status_message")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: str | None, sampled: bool):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes: dict = {}
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = 0
+        self.status_message = ""
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def fail(self, error: BaseException) -> None:
+        self.status, self.status_message = STATUS_ERROR, f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message} if self.status else {},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def _should_sample(trace_id: str) -> bool:
+    # Как TraceIdRatioBased в OpenTelemetry: решение зависит только от trace id
+    return int(trace_id[16:], 16) < settings.TRACING_SAMPLE_RATIO * (1 << 64)
+
+
+def start_span(name: str, kind: int = INTERNAL, parent: Span | None = None, traceparent: str | None = None) -> Span:
+    """Create a span under `parent` (the current span by default) or a remote `traceparent`."""
+    parent = parent or _current.get()
+    if parent is not None:
+        return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled)
+    match = _TRACEPARENT.match(traceparent or "")
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        return Span(name, kind, trace_id, parent_id, int(flags, 16) & 1 == 1 or _should_sample(trace_id))
+    trace_id = os.urandom(16).hex()
+    return Span(name, kind, trace_id, None, _should_sample(trace_id))
+
+
+def end_span(span: Span) -> None:
+    if not span.sampled:
+        return
+    span.end_ns = time.time_ns()
+    if _processor is not None:
+        _processor.enqueue(span)
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes) -> Iterator[Span | None]:
+    """Record the block as a child of the current span; yields None when the trace is not sampled."""
+    parent = _current.get()
+    if parent is not None and not parent.sampled:
+        yield None
+        return
+    current = start_span(name, kind, parent)
+    if not current.sampled:
+        yield None
+        return
+    current.attributes.update(attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.fail(error)
+        raise
+    finally:
+        _current.reset(token)
+        end_span(current)
+
+
+def traced(func: Callable) -> Callable:
+    """Decorator: record every call of the coroutine function as a "<module>.<name>" span."""
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    """Server span per HTTP request, named after the matched route."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (settings.TRACING_SAMPLE_RATIO <= 0 and _processor is None):
+            await self.app(scope, receive, send)
+            return
+        server = start_span(scope["method"], SERVER, traceparent=Headers(scope=scope).get("traceparent"))
+        server.set("http.request.method", scope["method"])
+        server.set("url.path", scope["path"])
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                server.set("http.response.status_code", message["status"])
+                if message["status"] >= 500:
+                    server.status = STATUS_ERROR
+            await send(message)
+
+        token = _current.set(server)
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as error:
+            server.fail(error)
+            raise
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                server.name = f"{scope['method']} {route.path}"
+                server.set("http.route", route.path)
+            end_span(server)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    normalized, _ = slowquery.fingerprint(statement)
+    operation = normalized.split(" ", 1)[0].upper()
+    sql = Span(operation, CLIENT, parent.trace_id, parent.span_id, True)
+    sql.set("db.system", "postgresql")
+    sql.set("db.operation.name", operation)
+    # Текст без значений параметров — как в логе медленных запросов
+    sql.set("db.query.text", normalized[:2000])
+    context._trace_span = sql
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    sql = getattr(context, "_trace_span", None)
+    if sql is not None:
+        sql.set("db.response.returned_rows", cursor.rowcount)
+        end_span(sql)
+
+
+def _on_error(exception_context) -> None:
+    context = exception_context.execution_context
+    sql = getattr(context, "_trace_span", None) if context is not None else None
+    if sql is not None:
+        sql.fail(exception_context.original_exception)
+        end_span(sql)
+
+
+def instrument(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(engine.sync_engine, "handle_error", _on_error)
+
+
+def export_request(spans: list[Span]) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of spans."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", settings.TRACING_SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+    }]}
+
+
+class FileExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: list[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(export_request(spans), separators=(",", ":")) + "\n")
+
+
+class OtlpHttpExporter:
+    def __init__(self, endpoint: str):
+        import httpx
+
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=5)
+
+    def export(self, spans: list[Span]) -> None:
+        response = self._client.post(self.endpoint, json=export_request(spans))
+        response.raise_for_status()
+
+
+class BatchProcessor:
+    """Collects finished spans and exports them from a daemon thread."""
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + settings.TRACING_EXPORT_INTERVAL_SECONDS
+            while len(batch) < settings.TRACING_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.001))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._export(batch)
+
+    def _export(self, batch: list[Span]) -> None:
+        try:
+            self.exporter.export(batch)
+            exported_total.inc(amount=len(batch))
+        except Exception:
+            dropped_total.inc(amount=len(batch))
+            logger.warning("Failed to export %d spans", len(batch), exc_info=True)
+
+
+_processor: BatchProcessor | None = None
+
+
+def start(exporter=None) -> None:
+    """Start exporting sampled spans (no-op when TRACING_SAMPLE_RATIO is 0 and no exporter is given)."""
+    global _processor
+    stop()
+    if exporter is None:
+        if settings.TRACING_SAMPLE_RATIO <= 0:
+            return
+        if settings.TRACING_EXPORTER == "otlp":
+            exporter = OtlpHttpExporter(settings.TRACING_OTLP_ENDPOINT)
+        else:
+            exporter = FileExporter(settings.TRACING_FILE)
+    _processor = BatchProcessor(exporter)
+
+
+def stop() -> None:
+    """Flush queued spans and stop the exporter thread."""
+    global _processor
+    if _processor is not None:
+        processor, _processor = _processor, None
+        processor.shutdown()
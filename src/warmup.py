@@ -0,0 +1,57 @@
+"""Per-worker warm-up, executed from the application lifespan before serving."""
+import asyncio
+import logging
+import time
+from uuid import UUID
+
+from fastapi import FastAPI
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import configure_mappers
+
+from auth import pwd_context
+from database import DoctorORM, UserORM, async_session
+
+logger = logging.getLogger(__name__)
+
+# Несуществующий id: запросы прогрева ничего не находят, но проходят весь путь
+_WARMUP_ID = UUID(int=0)
+
+
+async def warm_pool(engine: AsyncEngine) -> int:
+    """Open the pool's base connections up front instead of on the first requests."""
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    connections = [engine.connect() for _ in range(size)]
+    try:
+        await asyncio.gather(*(conn.start() for conn in connections))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in connections))
+    return size
+
+
+async def prime_queries() -> None:
+    """Compile the hot lookups once so they land in SQLAlchemy's statement cache."""
+    async with async_session() as session:
+        await session.execute(select(DoctorORM).filter(DoctorORM.id == _WARMUP_ID))
+        await session.execute(select(UserORM).filter(UserORM.id == _WARMUP_ID))
+
+
+def prime_schemas(app: FastAPI) -> None:
+    """Build mapper configuration, OpenAPI/JSON schemas and the bcrypt backend."""
+    configure_mappers()
+    app.openapi()
+    pwd_context().handler().get_backend()
+
+
+async def warm_up(app: FastAPI, engine: AsyncEngine) -> None:
+    """Best effort: a worker that failed to warm up still starts and serves."""
+    started = time.perf_counter()
+    prime_schemas(app)
+    try:
+        connections = await warm_pool(engine)
+        await prime_queries()
+    except Exception as e:
+        logger.warning("Worker warm-up incomplete: %s", e)
+        return
+    logger.info("Worker warmed up in %.0f ms (%d pooled connections)",
+                (time.perf_counter() - started) * 1000, connections)